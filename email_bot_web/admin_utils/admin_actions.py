@@ -1,8 +1,17 @@
+from email_service.models import EmailBox
+from infrastructure.control_channel import (
+    COMMAND_RELOAD_FILTERS,
+    COMMAND_RESTART,
+    COMMAND_START,
+    COMMAND_STOP,
+    publish_command,
+)
 from infrastructure.tools import CACHE_PREFIX, redis_client
 
 
 def delete_email_boxes_and_clear_cache(modeladmin, request, queryset):
     for obj in queryset:
+        publish_command(COMMAND_STOP, obj.user_id.telegram_id, obj.email_username)
         user_key = f'user:{obj.email_username}'
         redis_client.delete_key(user_key)
         filter_key = f'{CACHE_PREFIX}filters_for_{obj.user_id.telegram_id}_{obj.email_username}'
@@ -18,16 +27,43 @@ def delete_email_boxes_and_clear_cache(modeladmin, request, queryset):
 delete_email_boxes_and_clear_cache.short_description = 'Удалить выбранные и очистить кеш'  # type: ignore
 
 
+def publish_listening_change(box) -> None:
+    """Запускает или останавливает слушатель ящика по флагу listening."""
+
+    publish_command(COMMAND_START if box.listening else COMMAND_STOP, box.user_id.telegram_id, box.email_username)
+
+
+def restart_box(box) -> None:
+    """Переподключает слушатель прослушиваемого ящика (после смены папок)."""
+
+    if box.listening:
+        publish_command(COMMAND_RESTART, box.user_id.telegram_id, box.email_username)
+
+
+def restart_service_boxes(email_service) -> None:
+    """Переподключает слушатели всех прослушиваемых ящиков почтового сервиса (после смены адреса)."""
+
+    boxes = EmailBox.objects.filter(email_service=email_service, listening=True).select_related('user_id')
+    for box in boxes:
+        publish_command(COMMAND_RESTART, box.user_id.telegram_id, box.email_username)
+
+
+def clear_filters_cache_and_reload(box) -> None:
+    """Очищает кеш фильтров ящика и просит слушателей перестроить индекс фильтров."""
+
+    filter_key = f'{CACHE_PREFIX}filters_for_{box.user_id.telegram_id}_{box.email_username}'
+    redis_client.delete_key(filter_key)
+    email_boxes_key = f'{CACHE_PREFIX}email_boxes_for_user_{box.user_id.telegram_id}'
+    redis_client.delete_key(email_boxes_key)
+    email_box_key = f'{CACHE_PREFIX}email_box_{box.user_id.telegram_id}_{box.email_username}'
+    redis_client.delete_key(email_box_key)
+    publish_command(COMMAND_RELOAD_FILTERS, box.user_id.telegram_id, box.email_username)
+
+
 def delete_filters_and_clear_chache(modeladmin, request, queryset):
     for obj in queryset:
-        filter_key = f'{CACHE_PREFIX}filters_for_{obj.box_id.user_id.telegram_id}_{obj.box_id.email_username}'
-        redis_client.delete_key(filter_key)
-        email_boxes_key = f'{CACHE_PREFIX}email_boxes_for_user_{obj.box_id.user_id.telegram_id}'
-        redis_client.delete_key(email_boxes_key)
-        email_box_key = f'{CACHE_PREFIX}email_box_{obj.box_id.user_id.telegram_id}_{obj.box_id.email_username}'
-        redis_client.delete_key(email_box_key)
-
         obj.delete()
+        clear_filters_cache_and_reload(obj.box_id)
 
 
 delete_filters_and_clear_chache.short_description = 'Удалить выбранные и очистить кеш'  # type: ignore
@@ -17,6 +17,7 @@ from infrastructure.exceptions import (
     EmailBoxWithFiltersCreationError,
     EmailCredentialsError,
     EmailListeningError,
+    EmailLoginUnavailableError,
     EmailServiceSlugDoesNotExist,
     EmailServicesNotFoundError,
     UserDataNotFoundError,
@@ -46,6 +47,8 @@ async def create_emailbox(request: HttpRequest, data: EmailBoxCreateSchema):
         return JsonResponse({'detail': str(e)}, status=HTTPStatus.BAD_REQUEST)
     except EmailCredentialsError as e:
         return JsonResponse({'detail': str(e)}, status=HTTPStatus.UNAUTHORIZED)
+    except EmailLoginUnavailableError as e:
+        return JsonResponse({'detail': str(e)}, status=HTTPStatus.SERVICE_UNAVAILABLE)
     except EmailServiceSlugDoesNotExist as e:
         return JsonResponse({'detail': str(e)}, status=HTTPStatus.NOT_FOUND)
     except TimeoutError as e:
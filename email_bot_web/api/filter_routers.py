@@ -34,7 +34,8 @@ router_filter = Router(tags=['Фильтры'])
 async def create_filter_for_box(request: HttpRequest, data: CreateBoxFilterRequest):
     try:
         await filters.create_box_filter(data.telegram_id, data.email_username,
-                                        data.filter_data.filter_value, data.filter_data.filter_name)
+                                        data.filter_data.filter_value, data.filter_data.filter_name,
+                                        data.filter_data.filter_type)
         return JsonResponse({'success': 'Filter created successfully'}, status=HTTPStatus.CREATED)
     except BoxFilterCreationError as e:
         return JsonResponse({'detail': str(e)}, status=HTTPStatus.BAD_REQUEST)
@@ -1,4 +1,6 @@
-from email_service.models import BoxFilter, EmailBox, EmailService
+from typing import AsyncIterator
+
+from email_service.models import BoxFilter, EmailBox, EmailService, WatchedFolder
 from user.models import BotUser
 
 
@@ -52,6 +54,20 @@ class EmailBoxRepository:
         return [box async for box in EmailBox.objects.select_related(
             'email_service', 'user_id').prefetch_related('filters').all()]
 
+    @staticmethod
+    async def iter_all_boxes(chunk_size: int = 500) -> AsyncIterator[EmailBox]:
+        """Потоковое получение всех почтовых ящиков порциями по chunk_size без загрузки таблицы в память"""
+
+        async for box in EmailBox.objects.select_related('email_service', 'user_id').aiterator(chunk_size=chunk_size):
+            yield box
+
+    @staticmethod
+    async def get_listening_box_keys() -> list[tuple[int, str]]:
+        """Получение пар (telegram_id, email_username) всех ящиков, которые нужно прослушивать"""
+
+        return [key async for key in EmailBox.objects.filter(listening=True).values_list(
+            'user_id__telegram_id', 'email_username')]
+
     @staticmethod
     def sync_get_all_boxes() -> list[EmailBox]:
         """Синхронный метод получения списка почтовых ящиков"""
@@ -79,14 +95,53 @@ class EmailBoxRepository:
 
         await EmailBox.objects.filter(id=email_box_id).aupdate(listening=status)
 
+    @staticmethod
+    async def get_uid_state(telegram_id: int, email_username: str) -> tuple[int | None, int]:
+        """Получение сохраненных UIDVALIDITY и последнего обработанного UID почтового ящика"""
+
+        state = await EmailBox.objects.filter(
+            user_id__telegram_id=telegram_id,
+            email_username=email_username
+        ).values_list('uid_validity', 'last_uid').afirst()
+        return state if state else (None, 0)
+
+    @staticmethod
+    async def set_uid_state(telegram_id: int, email_username: str, uid_validity: int | None, last_uid: int) -> None:
+        """Сохраняет UIDVALIDITY и последний обработанный UID почтового ящика"""
+
+        await EmailBox.objects.filter(
+            user_id__telegram_id=telegram_id,
+            email_username=email_username
+        ).aupdate(uid_validity=uid_validity, last_uid=last_uid)
+
+
+class WatchedFolderRepository:
+
+    @staticmethod
+    async def get_for_box(telegram_id: int, email_username: str) -> list[WatchedFolder]:
+        """Получение дополнительных папок почтового ящика"""
+
+        return [folder async for folder in WatchedFolder.objects.filter(
+            box_id__user_id__telegram_id=telegram_id,
+            box_id__email_username=email_username
+        ).order_by('name')]
+
+    @staticmethod
+    async def set_uid_state(folder_id: int, uid_validity: int | None, last_uid: int) -> None:
+        """Сохраняет UIDVALIDITY и последний обработанный UID папки"""
+
+        await WatchedFolder.objects.filter(id=folder_id).aupdate(uid_validity=uid_validity, last_uid=last_uid)
+
 
 class BoxFilterRepository:
 
     @staticmethod
-    async def create(email_box: EmailBox, filter_value: str, filter_name: str | None = None) -> BoxFilter:
+    async def create(email_box: EmailBox, filter_value: str, filter_name: str | None = None,
+                     filter_type: str = BoxFilter.FilterType.SENDER) -> BoxFilter:
         """Создание фильтра для определенного почтового ящика"""
 
-        return await BoxFilter.objects.acreate(box_id=email_box, filter_value=filter_value, filter_name=filter_name)
+        return await BoxFilter.objects.acreate(box_id=email_box, filter_value=filter_value, filter_name=filter_name,
+                                               filter_type=filter_type)
 
     @staticmethod
     async def get_by_box_id(box_id: int) -> list[BoxFilter]:
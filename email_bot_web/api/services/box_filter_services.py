@@ -17,17 +17,24 @@ email_repo = EmailBoxRepository
 class BoxFilterService:
 
     @staticmethod
-    async def create_box_filter(telegram_id: int, email_username: str, filter_value: str, filter_name: str | None = None) -> BoxFilter:
+    async def create_box_filter(telegram_id: int, email_username: str, filter_value: str, filter_name: str | None = None,
+                                filter_type: str = BoxFilter.FilterType.SENDER) -> BoxFilter:
         """Создает фильтр для почтового ящика"""
 
         try:
             email_box = await email_repo.get_by_email_username_for_user(telegram_id, email_username)
-            filter_obj = await box_filter_repo.create(email_box, filter_value, filter_name)
+            filter_obj = await box_filter_repo.create(email_box, filter_value, filter_name, filter_type)
 
             user_key_email = f'{CACHE_PREFIX}email_box_{telegram_id}_{email_username}'
             user_key_filters = f'{CACHE_PREFIX}filters_for_{email_box.user_id.telegram_id}_{email_box.email_username}'
             redis_client.delete_key(user_key_filters)
             redis_client.delete_key(user_key_email)
+            # Импорт здесь: управляющий канал через слушатели почты сам зависит от этого сервиса
+            from infrastructure.control_channel import (
+                COMMAND_RELOAD_FILTERS,
+                publish_command,
+            )
+            publish_command(COMMAND_RELOAD_FILTERS, telegram_id, email_username)
 
             return filter_obj
         except ValidationError as e:
@@ -9,6 +9,7 @@ from api.repositories.repositories import (
     EmailServiceRepository,
 )
 from crypto.crypto_utils import PasswordCipher
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from email_service.models import EmailBox
 from email_service.schema import (
@@ -16,7 +17,11 @@ from email_service.schema import (
     EmailBoxOutputSchema,
     EmailServiceSchema,
 )
-from infrastructure.email_processor import process_email
+from infrastructure.control_channel import (
+    COMMAND_STOP,
+    publish_command,
+    request_listening_start,
+)
 from infrastructure.exceptions import (
     EmailAlreadyListeningError,
     EmailBoxByUsernameNotFoundError,
@@ -24,6 +29,7 @@ from infrastructure.exceptions import (
     EmailBoxesNotFoundError,
     EmailBoxWithFiltersAlreadyExist,
     EmailBoxWithFiltersCreationError,
+    EmailCredentialsError,
     EmailListeningError,
     EmailServiceSlugDoesNotExist,
     EmailServicesNotFoundError,
@@ -77,26 +83,35 @@ class EmailBoxService:
             cipher = PasswordCipher(key=os.getenv('ENCRYPTION_KEY'))
             decrypted_password = cipher.decrypt_password(data.email_password)
 
-            await IMAPListener.create_and_start(host=email_domain.address,
-                                                user=data.email_username,
-                                                password=decrypted_password,
-                                                telegram_id=data.user_id,
-                                                callback=process_email)
+            listener = IMAPListener(host=email_domain.address,
+                                    user=data.email_username,
+                                    password=decrypted_password,
+                                    telegram_id=data.user_id)
+            # Слушатель, встроенный в этот процесс, продолжит проверенную сессию без повторной авторизации
+            if not await listener.test_connection(keep_session=settings.EMBEDDED_LISTENERS):
+                raise EmailCredentialsError('Error with authorisation, check email or password!')
 
-            email_box = await email_repo.create(data.user_id, data.email_service_slug,
-                                                data.email_username, data.email_password)
+            try:
+                email_box = await email_repo.create(data.user_id, data.email_service_slug,
+                                                    data.email_username, data.email_password)
 
-            user_key = f'user:{data.email_username}'
+                user_key = f'user:{data.email_username}'
 
-            user_data = {
-                'telegram_id': data.user_id,
-                'email_username': data.email_username,
-                'listening': True
-            }
-            redis_client.set_key(user_key, json.dumps(user_data))
+                user_data = {
+                    'telegram_id': data.user_id,
+                    'email_username': data.email_username,
+                    'listening': True
+                }
+                redis_client.set_key(user_key, json.dumps(user_data))
+
+                for filter_data in data.filters:
+                    await box_filter_repo.create(email_box, filter_data.filter_value, filter_data.filter_name,
+                                                 filter_data.filter_type)
 
-            for filter_data in data.filters:
-                await box_filter_repo.create(email_box, filter_data.filter_value, filter_data.filter_name)
+                await request_listening_start(data.user_id, data.email_username, listener.imap_client)
+            finally:
+                # Сессия не передана слушателю: ящик запущен другим процессом или создание не удалось
+                await listener.imap_client.discard_verified_session()
 
             redis_client.delete_key(f'{CACHE_PREFIX}email_boxes_for_user_{data.user_id}')
 
@@ -153,7 +168,8 @@ class EmailBoxService:
         if user_data['listening']:
             user_data['listening'] = False
             redis_client.set_key(user_key, json.dumps(user_data))
-            return {'detail': f'Listening for {email_username} will be stopped in 2 minutes!'}
+            publish_command(COMMAND_STOP, telegram_id, email_username)
+            return {'detail': f'Listening for {email_username} was stopped!'}
         raise EmailListeningError(f'Listening for {email_username} was not started!')
 
     @staticmethod
@@ -173,19 +189,7 @@ class EmailBoxService:
             if user_data['listening']:
                 raise EmailAlreadyListeningError(f'Listening for {email_username} was already started!')
 
-        cipher = PasswordCipher(key=os.getenv('ENCRYPTION_KEY'))
-
-        decrypted_password = cipher.decrypt_password(email_box.email_password.encode())
-
-        listener = IMAPListener(
-            host=email_domain.address,
-            user=email_box.email_username,
-            password=decrypted_password,
-            telegram_id=email_box.user_id.telegram_id,
-            callback=process_email
-        )
-
-        await listener.start()
+        await request_listening_start(telegram_id, email_username)
 
         await email_repo.set_listening_status(email_box.id, True)
 
@@ -41,6 +41,50 @@ class TestFilters:
         ).exists()
         assert filter_exists
 
+    @pytest.mark.django_db
+    def test_create_subject_filter(self, api_client: Client,
+                                   create_email_box: Callable[..., EmailBox]
+                                   ) -> None:
+        """Тест создания фильтра по ключевому слову в теме письма."""
+
+        email_box = create_email_box()
+
+        filter_data = {
+            'telegram_id': email_box.user_id.telegram_id,
+            'email_username': email_box.email_username,
+            'filter_data': {
+                'filter_value': 'скидк',
+                'filter_type': 'subject'
+            }
+        }
+
+        response = api_client.post(f'{BASE_URL}/create', json.dumps(filter_data), content_type='application/json')
+
+        assert response.status_code == 201
+        assert BoxFilter.objects.filter(box_id=email_box, filter_type='subject', filter_value='скидк').exists()
+
+    @pytest.mark.django_db
+    def test_create_header_regex_filter_forbidden(self, api_client: Client,
+                                                  create_email_box: Callable[..., EmailBox]
+                                                  ) -> None:
+        """Тест создания фильтра с регулярным выражением: через API не разрешено."""
+
+        email_box = create_email_box()
+
+        filter_data = {
+            'telegram_id': email_box.user_id.telegram_id,
+            'email_username': email_box.email_username,
+            'filter_data': {
+                'filter_value': r'^From: (\w+\s?)+$',
+                'filter_type': 'header_regex'
+            }
+        }
+
+        response = api_client.post(f'{BASE_URL}/create', json.dumps(filter_data), content_type='application/json')
+
+        assert response.status_code == 422
+        assert not BoxFilter.objects.filter(box_id=email_box).exists()
+
     @pytest.mark.django_db
     def test_get_filters_for_box_success(self, api_client: Client,
                                          create_email_box: Callable[..., EmailBox],
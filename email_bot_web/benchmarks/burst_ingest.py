@@ -0,0 +1,66 @@
+"""
+Бенчмарк пакетной обработки новых писем.
+
+Измеряет задержку на письмо для пачек из 1, 10 и 1000 писем: пакетный путь
+(UID FETCH по набору UID) против загрузки каждого письма отдельной командой.
+
+Запуск из каталога email_bot_web:
+    python -m benchmarks.burst_ingest [--rtt 0.03]
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.utils import (
+    FakeIMAPClient,
+    make_listener_client,
+    make_message,
+    setup_django,
+)
+
+BURST_SIZES = (1, 10, 1000)
+
+
+async def run_burst(size: int, rtt: float, batched: bool) -> tuple[float, int]:
+    from infrastructure.imap_listener import ID_HEADER_SET
+
+    processed = []
+
+    async def callback(email_object, **kwargs) -> None:
+        processed.append(kwargs['uid'])
+
+    client = make_listener_client(callback)
+    fake_imap = FakeIMAPClient({uid: make_message(uid) for uid in range(1, size + 1)}, rtt=rtt)
+
+    started_at = time.perf_counter()
+    if batched:
+        await client.fetch_messages_headers(fake_imap, 0)
+    else:
+        await fake_imap.uid('fetch', '1:*', '(UID FLAGS BODY.PEEK[HEADER.FIELDS (%s)])' % ' '.join(ID_HEADER_SET))
+        for uid in range(1, size + 1):
+            message = await client.fetch_message(fake_imap, uid)
+            client.get_cleaned_email_details(message)
+            processed.append(uid)
+    elapsed = time.perf_counter() - started_at
+
+    assert len(processed) == size
+    return elapsed / size, fake_imap.round_trips
+
+
+async def main(rtt: float) -> None:
+    print(f'RTT: {rtt * 1000:.0f} мс')
+    print(f'{"пачка":>6} | {"режим":>10} | {"мс/письмо":>10} | {"команд":>7}')
+    for size in BURST_SIZES:
+        for batched in (False, True):
+            per_message, round_trips = await run_burst(size, rtt, batched)
+            mode = 'пакетный' if batched else 'по одному'
+            print(f'{size:>6} | {mode:>10} | {per_message * 1000:>10.2f} | {round_trips:>7}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rtt', type=float, default=0.03, help='имитируемая сетевая задержка, секунд')
+    args = parser.parse_args()
+
+    setup_django()
+    asyncio.run(main(args.rtt))
@@ -0,0 +1,104 @@
+"""
+Бенчмарк сжатия IMAP трафика (COMPRESS=DEFLATE, RFC 4978).
+
+Загружает письма через IMAPClient.fetch_messages_headers с локального IMAP сервера
+(отдельный процесс, настоящий сокет) со сжатием и без него и выводит байты на проводе
+и процессорное время клиента на письмо. Текст писем случайный, чтобы сжатие не было
+завышено повторяющимся абзацем.
+
+Запуск из каталога email_bot_web:
+    python -m benchmarks.compress_fetch [--messages 500] [--body-size 20000]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import time
+
+import aioimaplib
+from benchmarks.utils import (
+    LocalIMAPServer,
+    make_listener_client,
+    make_message,
+    setup_django,
+)
+
+WORDS = ('скидка', 'заказ', 'доставка', 'новости', 'подписка', 'акция', 'товар', 'magazine', 'offer',
+         'update', 'account', 'weekly', 'digest', 'price', 'delivery', 'store', 'новинки', 'неделя')
+
+
+def make_varied_message(number: int, body_size: int) -> bytes:
+    """Письмо как make_message, но со случайными абзацами и ссылками."""
+
+    rnd = random.Random(number)
+    paragraphs, size = [], 0
+    while size < body_size:
+        text = ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(8, 30)))
+        paragraph = f'<p>{text} <a href="https://example.com/{rnd.getrandbits(64):x}">{rnd.choice(WORDS)}</a></p>\r\n'
+        paragraphs.append(paragraph)
+        size += len(paragraph.encode())
+    message = make_message(number, body_size=0)
+    return message.replace(b'<body>', b'<body>' + ''.join(paragraphs).encode(), 1)
+
+
+async def run_fetch(port: int, compress: bool, count: int) -> tuple[float, float]:
+    from infrastructure.imap_compression import enable_compression
+
+    processed = []
+
+    async def callback(email_object, **kwargs) -> None:
+        processed.append(kwargs['uid'])
+
+    client = make_listener_client(callback)
+    imap_client = aioimaplib.IMAP4(host='127.0.0.1', port=port, timeout=60)
+    await imap_client.wait_hello_from_server()
+    await imap_client.login('user@example.com', 'password')
+    if compress:
+        assert await enable_compression(imap_client)
+    await imap_client.select('INBOX')
+
+    cpu_started_at, started_at = time.process_time(), time.perf_counter()
+    await client.fetch_messages_headers(imap_client, 0)
+    cpu_time, elapsed = time.process_time() - cpu_started_at, time.perf_counter() - started_at
+    await imap_client.logout()
+
+    assert len(processed) == count
+    return cpu_time / count, elapsed / count
+
+
+def measure(messages: dict[int, bytes], compress: bool) -> tuple[int, float, float]:
+    port_queue, results = multiprocessing.Queue(), multiprocessing.Queue()
+    server = LocalIMAPServer(messages, compress=compress, results=results)
+    process = multiprocessing.Process(target=server.serve, args=(port_queue,), daemon=True)
+    process.start()
+    try:
+        cpu_per_message, time_per_message = asyncio.run(run_fetch(port_queue.get(timeout=10), compress, len(messages)))
+        return results.get(timeout=10), cpu_per_message, time_per_message
+    finally:
+        process.terminate()
+
+
+def main(count: int, body_size: int) -> None:
+    messages = {uid: make_varied_message(uid, body_size) for uid in range(1, count + 1)}
+    raw_size = sum(len(message) for message in messages.values())
+    print(f'Писем: {count}, размер писем: {raw_size / 1024:.0f} КБ')
+    print(f'{"режим":>10} | {"КБ на проводе":>13} | {"байт/письмо":>11} | {"CPU мс/письмо":>13} | {"мс/письмо":>9}')
+
+    baseline = None
+    for compress in (False, True):
+        bytes_sent, cpu_per_message, time_per_message = measure(messages, compress)
+        baseline = baseline or bytes_sent
+        mode = 'deflate' if compress else 'без сжатия'
+        print(f'{mode:>10} | {bytes_sent / 1024:>13.0f} | {bytes_sent / count:>11.0f} | '
+              f'{cpu_per_message * 1000:>13.3f} | {time_per_message * 1000:>9.3f}')
+    print(f'Трафик уменьшен в {baseline / bytes_sent:.1f} раза')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=500, help='количество писем')
+    parser.add_argument('--body-size', type=int, default=20_000, help='размер HTML тела письма, байт')
+    args = parser.parse_args()
+
+    setup_django()
+    main(args.messages, args.body_size)
@@ -0,0 +1,99 @@
+"""
+Бенчмарк разбора ответа UID FETCH с заголовками писем.
+
+Сравнивает прежний разбор (шаг в три строки и регулярное выражение по склеенным строкам)
+с потоковым разбором iter_fetch_messages на ответе из 10000 писем. Второй вариант ответа
+присылает атрибуты в другом порядке (UID и FLAGS после литерала), третий - уведомление EXISTS
+посреди ответа, как делают некоторые серверы.
+
+Запуск из каталога email_bot_web:
+    python -m benchmarks.fetch_parse [--messages 10000]
+"""
+import argparse
+import asyncio
+import re
+import time
+from email.parser import BytesHeaderParser
+
+from benchmarks.utils import FakeIMAPClient, make_message, setup_django
+
+LEGACY_FETCH_UID = re.compile(rb'.*UID (?P<uid>\d+).*')
+REPEATS = 5
+
+
+def parse_legacy(lines: list) -> dict[int, bytes]:
+    headers = {}
+    for i in range(0, len(lines) - 1, 3):
+        match_result = LEGACY_FETCH_UID.match(b'%s %s' % (lines[i], lines[i + 2]))
+        if match_result:
+            headers[int(match_result.group('uid'))] = lines[i + 1]
+    return headers
+
+
+def parse_streaming(lines: list) -> dict[int, bytes]:
+    from infrastructure.imap_utils import iter_fetch_messages
+
+    return {message.uid: message.data for message in iter_fetch_messages(lines)}
+
+
+def reorder_attributes(lines: list) -> list:
+    """Переставляет UID и FLAGS за литерал: '1 FETCH (BODY[...] {n}', литерал, ' UID 1 FLAGS ())'."""
+
+    reordered = []
+    for i in range(0, len(lines) - 1, 3):
+        head, attributes = lines[i].split(b' (', 1)
+        uid_flags, section = attributes.split(b' BODY[', 1)
+        reordered += [b'%s (BODY[%s' % (head, section), lines[i + 1], b' %s)' % uid_flags]
+    return reordered + lines[-1:]
+
+
+def insert_exists(lines: list) -> list:
+    """Добавляет после первого письма уведомление о новом письме: '10001 EXISTS'."""
+
+    return lines[:3] + [b'%d EXISTS' % ((len(lines) - 1) // 3 + 1)] + lines[3:]
+
+
+def measure(parse, lines: list) -> tuple[float, int]:
+    best, headers = float('inf'), {}
+    for _ in range(REPEATS):
+        started_at = time.perf_counter()
+        headers = parse(lines)
+        best = min(best, time.perf_counter() - started_at)
+    return best, len(headers)
+
+
+async def main(count: int) -> None:
+    from infrastructure.imap_listener import ID_HEADER_SET
+
+    fake_imap = FakeIMAPClient({uid: make_message(uid, body_size=0) for uid in range(1, count + 1)})
+    response = await fake_imap.uid('fetch', '1:*', '(UID FLAGS BODY.PEEK[HEADER.FIELDS (%s)])' % ' '.join(ID_HEADER_SET))
+    variants = {
+        'UID FLAGS BODY': response.lines,
+        'BODY UID FLAGS': reorder_attributes(response.lines),
+        'с EXISTS': insert_exists(response.lines),
+    }
+
+    started_at = time.perf_counter()
+    for line in response.lines[1:-1:3]:
+        BytesHeaderParser().parsebytes(line)
+    header_parsing = time.perf_counter() - started_at
+
+    print(f'Писем в ответе: {count}, разбор заголовков BytesHeaderParser: {header_parsing * 1000:.0f} мс')
+    print(f'{"ответ":>17} | {"разбор":>9} | {"мс":>7} | {"мкс/письмо":>10} | {"найдено":>7}')
+    for order, lines in variants.items():
+        for name, parse in (('шаг 3', parse_legacy), ('потоковый', parse_streaming)):
+            try:
+                elapsed, found = measure(parse, lines)
+            except IndexError as e:
+                print(f'{order:>17} | {name:>9} | {"-":>7} | {"-":>10} | {type(e).__name__}')
+                continue
+            print(f'{order:>17} | {name:>9} | {elapsed * 1000:>7.1f} | {elapsed / count * 1e6:>10.2f} | {found:>7}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=10_000, help='количество писем в ответе')
+    args = parser.parse_args()
+
+    setup_django()
+    asyncio.run(main(args.messages))
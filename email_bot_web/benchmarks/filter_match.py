@@ -0,0 +1,166 @@
+"""
+Бенчмарк проверки письма по фильтрам ящика с сотнями правил.
+
+Сравнивает последовательную проверку правил (каждое правило - отдельная проверка
+или отдельное регулярное выражение) со скомпилированным FilterIndex, где адреса
+и домены лежат в множествах, шаблоны, ключевые слова темы и регулярные выражения
+объединены в одно выражение, а ключевые слова текста - в префиксное дерево.
+Проверяет, что оба способа отбирают одни и те же письма.
+
+Запуск из каталога email_bot_web:
+    python -m benchmarks.filter_match [--rules 500] [--messages 500] [--body-size 5000]
+"""
+import argparse
+import random
+import re
+import time
+
+from benchmarks.utils import setup_django
+
+WORDS = ('скидка', 'заказ', 'доставка', 'новости', 'подписка', 'акция', 'товар', 'offer', 'update',
+         'weekly', 'digest', 'price', 'store', 'неделя', 'отчет', 'счет', 'оплата', 'встреча')
+DOMAINS = tuple(f'shop{number}.com' for number in range(200)) + ('bank.ru', 'mail.example.com', 'corp.net')
+REPEATS = 3
+
+
+def make_word(rnd: random.Random) -> str:
+    return ''.join(rnd.choice('абвгдеиклмнопрстуxyzwqv') for _ in range(rnd.randint(5, 9)))
+
+
+def make_rules(rnd: random.Random, count: int) -> list[tuple[str, str]]:
+    """Правила ящика в пропорциях: адреса, домены, шаблоны, ключевые слова, регулярные выражения."""
+
+    rules = []
+    for number in range(count):
+        kind = number % 20
+        if kind < 9:
+            rules.append(('sender', f'user{rnd.randrange(2000)}@{rnd.choice(DOMAINS)}'))
+        elif kind < 11:
+            rules.append(('sender', rnd.choice(('@', '*.', '')) + rnd.choice(DOMAINS)))
+        elif kind < 12:
+            rules.append(('sender_glob', f'news{rnd.randrange(100)}*@*.{rnd.choice(DOMAINS)}'))
+        elif kind < 16:
+            rules.append(('subject', make_word(rnd)))
+        elif kind < 19:
+            rules.append(('body', make_word(rnd)))
+        else:
+            rules.append(('header_regex', rf'^Subject: .*\b{make_word(rnd)}\d+'))
+    return rules
+
+
+def make_messages(rnd: random.Random, rules: list[tuple[str, str]], count: int,
+                  body_size: int) -> list[tuple[str, str, str, str]]:
+    """Письма (From, To, Subject, текст), примерно десятая часть подходит под одно из правил."""
+
+    messages = []
+    for _ in range(count):
+        sender = f'user{rnd.randrange(4000)}@{rnd.choice(DOMAINS)}'
+        subject = ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(3, 8)))
+        body_words = []
+        while sum(len(word) + 1 for word in body_words) < body_size:
+            body_words.append(rnd.choice(WORDS))
+        if rnd.random() < 0.1:
+            filter_type, value = rnd.choice(rules)
+            if filter_type == 'subject':
+                subject = f'{subject} {value.upper()}'
+            elif filter_type == 'body':
+                body_words.insert(rnd.randrange(len(body_words)), value)
+            elif filter_type == 'sender' and '@' in value.strip('@'):
+                sender = value
+        messages.append((f'Sender Name <{sender}>', 'me@example.com', subject, ' '.join(body_words)))
+    return messages
+
+
+class SequentialMatcher:
+    """Проверка правил по одному, как при добавлении их в код последовательными if."""
+
+    def __init__(self, rules: list[tuple[str, str]]):
+        from infrastructure.filter_rules import glob_to_regex, keywords_to_regex
+
+        self.checks = []
+        for filter_type, value in rules:
+            value = value.lower()
+            if filter_type == 'sender':
+                local, at, domain = value.rpartition('@')
+                if at and local not in ('', '*'):
+                    self.checks.append(('address', value))
+                elif domain.startswith('*.'):
+                    self.checks.append(('subdomain', '.' + domain[2:]))
+                else:
+                    self.checks.append(('domain', domain))
+            elif filter_type == 'sender_glob':
+                self.checks.append(('glob', re.compile(glob_to_regex(value))))
+            elif filter_type in ('subject', 'body'):
+                self.checks.append((filter_type, re.compile(keywords_to_regex([value]))))
+            else:
+                self.checks.append(('header', re.compile(f'^(?:{value})', re.IGNORECASE | re.MULTILINE)))
+
+    def match(self, from_: str, to: str, subject: str, body: str) -> bool:
+        from infrastructure.filter_index import parse_sender
+        from infrastructure.filter_rules import HEADER_MATCH_LENGTH
+
+        sender = parse_sender.__wrapped__(from_)
+        address = sender.normalized if sender else ''
+        domain = sender.domain if sender else ''
+        headers = '\n'.join(f'{name}: {value[:HEADER_MATCH_LENGTH]}' for name, value in
+                            (('Sender', address), ('From', from_), ('To', to), ('Subject', subject)))
+        for kind, check in self.checks:
+            if kind == 'address' and address == check:
+                return True
+            if kind == 'domain' and domain == check:
+                return True
+            if kind == 'subdomain' and domain.endswith(check):
+                return True
+            if kind == 'glob' and address and check.fullmatch(address):
+                return True
+            if kind == 'subject' and check.search(subject.lower()):
+                return True
+            if kind == 'body' and check.search(body.lower()):
+                return True
+            if kind == 'header' and check.search(headers):
+                return True
+        return False
+
+
+def main(rules_count: int, messages_count: int, body_size: int) -> None:
+    from infrastructure.filter_index import FilterIndex
+
+    rnd = random.Random(rules_count)
+    rules = make_rules(rnd, rules_count)
+    messages = make_messages(rnd, rules, messages_count, body_size)
+
+    started_at = time.perf_counter()
+    index = FilterIndex(rules)
+    compile_ms = (time.perf_counter() - started_at) * 1000
+    sequential = SequentialMatcher(rules)
+
+    matchers = (('последовательно', sequential.match),
+                ('FilterIndex', lambda *message: index.match(*message) is not None))
+    results = {}
+    print(f'Правил: {len(rules)}, писем: {len(messages)}, текст письма: {body_size} символов, '
+          f'компиляция индекса: {compile_ms:.1f} мс')
+    print(f'{"проверка":>15} | {"мкс/письмо":>10} | {"подходит":>8}')
+    baseline = None
+    for name, match in matchers:
+        best = float('inf')
+        for _ in range(REPEATS):
+            started_at = time.perf_counter()
+            results[name] = [match(*message) for message in messages]
+            best = min(best, time.perf_counter() - started_at)
+        baseline = baseline or best
+        print(f'{name:>15} | {best / len(messages) * 1_000_000:>10.1f} | {sum(results[name]):>8} '
+              f'({baseline / best:.1f}x)')
+
+    mismatches = sum(a != b for a, b in zip(*results.values()))
+    print(f'Расхождений: {mismatches}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rules', type=int, default=500, help='количество правил ящика')
+    parser.add_argument('--messages', type=int, default=500, help='количество писем')
+    parser.add_argument('--body-size', type=int, default=5000, help='размер текста письма, символов')
+    args = parser.parse_args()
+
+    setup_django()
+    main(args.rules, args.messages, args.body_size)
@@ -0,0 +1,97 @@
+"""
+Бенчмарк извлечения текста из HTML писем (EMAIL_HTML_EXTRACTOR).
+
+Прогоняет корпус HTML рассылок через все извлекатели из infrastructure.html_extractors,
+проверяет, что результат совпадает с BeautifulSoup, и выводит время на письмо и скорость.
+Корпус генерируется (таблицы, стили, MSO комментарии, ссылки с картинками, сущности,
+незакрытые теги) или читается из каталога с .html файлами.
+
+Запуск из каталога email_bot_web:
+    python -m benchmarks.html_extract [--documents 200] [--size 60000] [--corpus path/to/html]
+"""
+import argparse
+import random
+import time
+from pathlib import Path
+
+from benchmarks.utils import setup_django
+
+WORDS = ('скидка', 'заказ', 'доставка', 'новости', 'подписка', 'акция', 'товар', 'offer', 'update',
+         'weekly', 'digest', 'price', 'store', 'неделя', '&nbsp;', '&amp;', '&laquo;', '&raquo;', '&#8212;')
+HEAD = ('<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN">\r\n<html><head>'
+        '<meta http-equiv="Content-Type" content="text/html; charset=utf-8">'
+        '<style type="text/css">body {margin: 0;} .btn a {color: #fff;} @media (max-width: 600px) {td {display: block;}}</style>'
+        '<!--[if mso]><xml><o:OfficeDocumentSettings><o:AllowPNG/></o:OfficeDocumentSettings></xml><![endif]-->'
+        '</head><body style="margin:0;padding:0">\r\n')
+REPEATS = 3
+
+
+def make_text(rnd: random.Random) -> str:
+    return ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(3, 25)))
+
+
+def make_block(rnd: random.Random) -> str:
+    kind = rnd.randrange(6)
+    if kind == 0:
+        return (f'<table role="presentation" width="100%" cellpadding="0" cellspacing="0"><tr>'
+                f'<td style="padding:10px;font-family:Arial">{make_text(rnd)}</td>\r\n'
+                f'<td align="right"><a href="https://example.com/{rnd.getrandbits(48):x}">'
+                f'<img src="https://cdn.example.com/{rnd.getrandbits(32):x}.png" width="120" alt=""></a></td></tr></table>\r\n')
+    if kind == 1:
+        return f'<p style="font-size:14px">{make_text(rnd)} <b>{make_text(rnd)}</b><br>{make_text(rnd)}</p>\r\n'
+    if kind == 2:
+        return (f'<div class="btn"><a href="https://example.com/track?id={rnd.getrandbits(64):x}" '
+                f'style="background:#e00;padding:8px">{make_text(rnd)}</a></div>\r\n')
+    if kind == 3:
+        return f'<!-- {make_text(rnd)} --><span>{make_text(rnd)}</span>\r\n'
+    if kind == 4:
+        # Незакрытые теги, как в письмах из старых редакторов
+        return f'<div><font color="#333">{make_text(rnd)}<p>{make_text(rnd)}</div>\r\n'
+    return f'<ul><li>{make_text(rnd)}<li>{make_text(rnd)}</ul><img src="spacer.gif"> \r\n'
+
+
+def make_document(number: int, size: int) -> str:
+    rnd = random.Random(number)
+    blocks = [HEAD]
+    length = len(HEAD)
+    while length < size:
+        blocks.append(make_block(rnd))
+        length += len(blocks[-1])
+    blocks.append('</body></html>')
+    return ''.join(blocks)
+
+
+def load_corpus(path: Path) -> list[str]:
+    return [file.read_text(encoding='utf-8', errors='replace') for file in sorted(path.rglob('*.htm*'))]
+
+
+def main(documents: list[str]) -> None:
+    from infrastructure.html_extractors import HTML_EXTRACTORS, extract_text_soup
+
+    expected = [extract_text_soup(document) for document in documents]
+    total_size = sum(len(document) for document in documents)
+    print(f'Писем: {len(documents)}, объем HTML: {total_size / 1_000_000:.1f} млн символов')
+    print(f'{"извлекатель":>11} | {"мс/письмо":>9} | {"МБ/с":>6} | {"совпадает":>9}')
+
+    baseline = None
+    for name, extract in HTML_EXTRACTORS.items():
+        best = float('inf')
+        for _ in range(REPEATS):
+            started_at = time.perf_counter()
+            results = [extract(document) for document in documents]
+            best = min(best, time.perf_counter() - started_at)
+        matches = sum(result == text for result, text in zip(results, expected))
+        baseline = baseline or best
+        print(f'{name:>11} | {best / len(documents) * 1000:>9.2f} | {total_size / best / 1_000_000:>6.1f} | '
+              f'{matches:>4}/{len(documents):<4} ({baseline / best:.1f}x)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=200, help='количество сгенерированных писем')
+    parser.add_argument('--size', type=int, default=60_000, help='размер сгенерированного письма, символов')
+    parser.add_argument('--corpus', type=Path, help='каталог с .html файлами вместо сгенерированного корпуса')
+    args = parser.parse_args()
+
+    setup_django()
+    main(load_corpus(args.corpus) if args.corpus else [make_document(i, args.size) for i in range(args.documents)])
@@ -0,0 +1,85 @@
+"""
+Бенчмарк задержки event loop при разборе больших писем.
+
+Обрабатывает пачку писем, среди которых есть HTML рассылки по 5 МБ, через
+IMAPClient.process_new_messages и одновременно измеряет задержку event loop, которую
+почувствовали бы остальные слушатели. Сравнивает разбор в event loop, в пуле потоков
+и в пуле процессов (IMAP_DECODE_WORKERS, IMAP_DECODE_PROCESSES).
+
+Запуск из каталога email_bot_web:
+    python -m benchmarks.loop_lag [--small 50] [--large 4] [--large-size 5000000]
+"""
+import argparse
+import asyncio
+import time
+from email.parser import BytesHeaderParser
+
+from benchmarks.utils import (
+    FakeIMAPClient,
+    make_listener_client,
+    make_message,
+    setup_django,
+)
+
+LAG_SAMPLE_INTERVAL = 0.005
+MODES = (('event loop', 0, False), ('потоки', 2, False), ('процессы', 2, True))
+
+
+async def run_mode(messages: dict[int, bytes], workers: int, processes: bool) -> tuple[float, dict[str, float]]:
+    from django.conf import settings
+    from infrastructure.decode_pool import decode_pool
+    from infrastructure.loop_monitor import LoopLagMonitor
+
+    settings.IMAP_DECODE_WORKERS, settings.IMAP_DECODE_PROCESSES = workers, processes
+    processed = []
+
+    async def callback(email_object, **kwargs) -> None:
+        processed.append(kwargs['uid'])
+
+    client = make_listener_client(callback)
+    fake_imap = FakeIMAPClient(messages)
+    headers = {uid: BytesHeaderParser().parsebytes(raw) for uid, raw in messages.items()}
+    if workers:
+        # Пул создается заранее, чтобы запуск процессов не попал в замер
+        await asyncio.gather(*(asyncio.get_running_loop().run_in_executor(decode_pool.executor, int)
+                               for _ in range(workers)))
+
+    monitor = LoopLagMonitor(interval=LAG_SAMPLE_INTERVAL)
+    monitor_task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(LAG_SAMPLE_INTERVAL * 2)
+    started_at = time.perf_counter()
+    await client.process_new_messages(fake_imap, headers)
+    elapsed = time.perf_counter() - started_at
+    # Замер, начатый до долгой синхронной обработки, завершается только после нее
+    await asyncio.sleep(LAG_SAMPLE_INTERVAL * 2)
+    monitor_task.cancel()
+    decode_pool.shutdown()
+
+    assert len(processed) == len(messages)
+    return elapsed, monitor.stats()
+
+
+async def main(small: int, large: int, large_size: int) -> None:
+    messages = {uid: make_message(uid, body_size=5_000) for uid in range(1, small + 1)}
+    step = max(small // max(large, 1), 1)
+    for number in range(large):
+        uid = min(number * step + 1, small) if small else number + 1
+        messages[uid] = make_message(uid, body_size=large_size)
+
+    print(f'Писем: {len(messages)}, из них по {large_size / 1_000_000:.0f} МБ: {large}')
+    print(f'{"разбор":>10} | {"время, с":>8} | {"p50 задержки, мс":>16} | '
+          f'{"p99 задержки, мс":>16} | {"макс. задержка, мс":>18}')
+    for name, workers, processes in MODES:
+        elapsed, lag = await run_mode(messages, workers, processes)
+        print(f'{name:>10} | {elapsed:>8.2f} | {lag["p50_ms"]:>16.1f} | {lag["p99_ms"]:>16.1f} | {lag["max_ms"]:>18.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--small', type=int, default=50, help='количество обычных писем')
+    parser.add_argument('--large', type=int, default=4, help='количество больших рассылок')
+    parser.add_argument('--large-size', type=int, default=5_000_000, help='размер HTML большой рассылки, байт')
+    args = parser.parse_args()
+
+    setup_django()
+    asyncio.run(main(args.small, args.large, args.large_size))
@@ -0,0 +1,191 @@
+import asyncio
+import os
+import re
+import zlib
+from email.parser import BytesHeaderParser
+from typing import TYPE_CHECKING, Callable
+
+import aioimaplib
+
+if TYPE_CHECKING:
+    from infrastructure.imap_listener import IMAPClient
+
+FETCH_UID_SET = re.compile(r'(?P<start>\d+|\*)(?::(?P<end>\d+|\*))?')
+HEADER_FIELDS = re.compile(r'BODY\.PEEK\[HEADER\.FIELDS \((?P<fields>[^)]*)\)\]')
+
+
+def setup_django() -> None:
+    """Настраивает Django для запуска бенчмарков вне manage.py."""
+
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    django.setup()
+
+
+def make_listener_client(callback: Callable | None = None) -> 'IMAPClient':
+    """IMAPClient для бенчмарков: последний обработанный UID не сохраняется в базу."""
+
+    from infrastructure.imap_listener import IMAPClient
+
+    async def skip_save() -> None:
+        pass
+
+    client = IMAPClient(host='localhost', user='user@example.com', password='', telegram_id=1, callback=callback)
+    client.save_uid_state = skip_save
+    return client
+
+
+def make_message(number: int, sender: str = 'news@example.com', body_size: int = 20_000) -> bytes:
+    """Формирует типовое HTML письмо для бенчмарков."""
+
+    paragraph = '<p>Lorem ipsum dolor sit amet, <a href="https://example.com">consectetur</a> adipiscing elit.</p>\r\n'
+    body = paragraph * (body_size // len(paragraph) + 1)
+    return (f'From: Sender <{sender}>\r\n'
+            f'To: user@example.com\r\n'
+            f'Subject: Message {number}\r\n'
+            f'Date: Mon, 1 Jan 2024 10:00:00 +0000\r\n'
+            f'Message-ID: <{number}.{sender}>\r\n'
+            f'Content-Type: text/html; charset="utf-8"\r\n\r\n'
+            f'<html><body>{body}</body></html>\r\n').encode()
+
+
+class FakeIMAPClient:
+    """
+    IMAP клиент в памяти, формирующий ответы в формате aioimaplib.
+
+    Считает количество команд (round trips) и имитирует сетевую задержку rtt.
+    """
+
+    def __init__(self, messages: dict[int, bytes], rtt: float = 0.0):
+        self.messages = messages
+        self.rtt = rtt
+        self.round_trips = 0
+
+    def resolve_uid_set(self, uid_set: str) -> list[int]:
+        max_uid = max(self.messages, default=0)
+        uids: set[int] = set()
+        for part in uid_set.split(','):
+            match_result = FETCH_UID_SET.fullmatch(part)
+            start = max_uid if match_result.group('start') == '*' else int(match_result.group('start'))
+            end = match_result.group('end')
+            end = start if end is None else (max_uid if end == '*' else int(end))
+            low, high = min(start, end), max(start, end)
+            uids.update(uid for uid in self.messages if low <= uid <= high)
+        return sorted(uids)
+
+    async def uid(self, command: str, *criteria: str) -> aioimaplib.Response:
+        self.round_trips += 1
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+        if command.lower() != 'fetch':
+            return aioimaplib.Response('OK', [b'Success'])
+
+        uid_set, items = criteria
+        header_fields = HEADER_FIELDS.search(items)
+        lines: list[bytes] = []
+        for sequence_number, uid in enumerate(self.resolve_uid_set(uid_set), start=1):
+            raw = self.messages[uid]
+            if header_fields:
+                fields = header_fields.group('fields').split()
+                headers = BytesHeaderParser().parsebytes(raw)
+                literal = ''.join(f'{name}: {headers[name]}\r\n' for name in fields if headers[name]).encode() + b'\r\n'
+                attribute = f'BODY[HEADER.FIELDS ({header_fields.group("fields")})]'
+            elif 'BODY.PEEK[]' in items:
+                literal, attribute = raw, 'BODY[]'
+            else:
+                lines.append(f'{sequence_number} FETCH (UID {uid})'.encode())
+                continue
+            lines.append(f'{sequence_number} FETCH (UID {uid} FLAGS () {attribute} {{{len(literal)}}}'.encode())
+            lines.append(bytearray(literal))
+            lines.append(b')')
+        lines.append(b'Success')
+        return aioimaplib.Response('OK', lines)
+
+
+class LocalIMAPServer:
+    """
+    Минимальный IMAP сервер на localhost для бенчмарков через настоящий сокет.
+
+    Поддерживает CAPABILITY, LOGIN, COMPRESS DEFLATE, SELECT, UID FETCH (как FakeIMAPClient) и LOGOUT.
+    Считает байты, отправленные клиенту, и после закрытия соединения кладет их в очередь results.
+    """
+
+    def __init__(self, messages: dict[int, bytes], compress: bool, results=None):
+        self.fetcher = FakeIMAPClient(messages)
+        self.capabilities = 'IMAP4rev1 IDLE' + (' COMPRESS=DEFLATE' if compress else '')
+        self.results = results
+
+    @staticmethod
+    def render(response: aioimaplib.Response, tag: str) -> bytes:
+        data = []
+        for line in response.lines[:-1]:
+            if isinstance(line, bytearray):
+                data.append(bytes(line))
+            elif line == b')':
+                data.append(b')\r\n')
+            else:
+                data.append(b'* ' + line + b'\r\n')
+        data.append(f'{tag} {response.result} {response.lines[-1].decode()}\r\n'.encode())
+        return b''.join(data)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        inflater = deflater = None
+        bytes_sent = 0
+        buffer = b''
+
+        def send(data: bytes) -> None:
+            nonlocal bytes_sent
+            if deflater:
+                data = deflater.compress(data) + deflater.flush(zlib.Z_SYNC_FLUSH)
+            bytes_sent += len(data)
+            writer.write(data)
+
+        send(f'* OK [CAPABILITY {self.capabilities}] ready\r\n'.encode())
+        logged_out = False
+        while not logged_out and (data := await reader.read(65536)):
+            buffer += inflater.decompress(data) if inflater else data
+            while b'\r\n' in buffer:
+                line, buffer = buffer.split(b'\r\n', 1)
+                tag, _, rest = line.decode().partition(' ')
+                command, _, args = rest.partition(' ')
+                command = command.upper()
+                if command == 'CAPABILITY':
+                    send(f'* CAPABILITY {self.capabilities}\r\n{tag} OK done\r\n'.encode())
+                elif command == 'LOGIN':
+                    send(f'{tag} OK logged in\r\n'.encode())
+                elif command == 'COMPRESS' and 'COMPRESS' in self.capabilities:
+                    send(f'{tag} OK DEFLATE active\r\n'.encode())
+                    inflater = zlib.decompressobj(-15)
+                    deflater = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+                    buffer = inflater.decompress(buffer)
+                elif command == 'SELECT':
+                    send((f'* {len(self.fetcher.messages)} EXISTS\r\n* OK [UIDVALIDITY 1] ok\r\n'
+                          f'* OK [UIDNEXT {max(self.fetcher.messages, default=0) + 1}] ok\r\n'
+                          f'{tag} OK [READ-WRITE] done\r\n').encode())
+                elif command == 'UID':
+                    subcommand, _, criteria = args.partition(' ')
+                    uid_set, _, items = criteria.partition(' ')
+                    response = await self.fetcher.uid(subcommand, uid_set, items)
+                    send(self.render(response, tag))
+                elif command == 'LOGOUT':
+                    send(f'* BYE\r\n{tag} OK bye\r\n'.encode())
+                    logged_out = True
+                else:
+                    send(f'{tag} BAD unknown command\r\n'.encode())
+            await writer.drain()
+        writer.close()
+        if self.results is not None:
+            self.results.put(bytes_sent)
+
+    def serve(self, port_queue) -> None:
+        """Запускает сервер в текущем процессе и сообщает выбранный порт через port_queue."""
+
+        async def run() -> None:
+            server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+            port_queue.put(server.sockets[0].getsockname()[1])
+            async with server:
+                await server.serve_forever()
+
+        asyncio.run(run())
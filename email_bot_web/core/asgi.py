@@ -9,8 +9,24 @@ asgi_app = ASGIStaticFilesHandler(get_asgi_application())
 
 
 async def on_startup():
-    from infrastructure.imap_listener import start_listening_all_emails
-    await start_listening_all_emails()
+    from django.conf import settings
+
+    # При EMBEDDED_LISTENERS=False почту слушает отдельный процесс: manage.py run_listeners
+    if settings.EMBEDDED_LISTENERS:
+        from infrastructure.control_channel import start_control_channel
+        from infrastructure.imap_listener import start_listening_all_emails
+        start_control_channel()
+        await start_listening_all_emails()
+
+
+async def on_shutdown():
+    from django.conf import settings
+
+    if settings.EMBEDDED_LISTENERS:
+        from infrastructure.control_channel import stop_control_channel
+        from infrastructure.imap_listener import stop_listening_all_emails
+        await stop_control_channel()
+        await stop_listening_all_emails()
 
 
 class LifespanApp:
@@ -25,6 +41,7 @@ class LifespanApp:
                     await on_startup()
                     await send({'type': 'lifespan.startup.complete'})
                 elif message['type'] == 'lifespan.shutdown':
+                    await on_shutdown()
                     await send({'type': 'lifespan.shutdown.complete'})
                     return
         else:
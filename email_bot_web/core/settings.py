@@ -99,6 +99,75 @@ REDIS_HOST = os.getenv('REDIS_HOST')
 REDIS_PORT = os.getenv('REDIS_PORT')
 SCHEDULE_TASK_PERIOD = int(os.getenv('SCHEDULE_TASK_PERIOD', 600))
 
+EMBEDDED_LISTENERS = os.getenv('EMBEDDED_LISTENERS', 'True') == 'True'
+# Аренда ящиков в Redis для запуска сервиса прослушивания на нескольких узлах
+LISTENER_LEASES = os.getenv('LISTENER_LEASES', 'False') == 'True'
+LISTENER_LEASE_TTL = float(os.getenv('LISTENER_LEASE_TTL', 30))
+LISTENER_NODE_ID = os.getenv('LISTENER_NODE_ID', '')
+# Время на остановку слушателей: обработку текущих писем, сохранение UID и LOGOUT
+LISTENER_SHUTDOWN_TIMEOUT = float(os.getenv('LISTENER_SHUTDOWN_TIMEOUT', 25))
+LISTENER_STATS_INTERVAL = float(os.getenv('LISTENER_STATS_INTERVAL', 300))
+LISTENER_CONTROL_CHANNEL = os.getenv('LISTENER_CONTROL_CHANNEL', 'email_listener_control')
+# Индекс фильтров ящика сбрасывается командой reload_filters, TTL - на случай потерянной команды
+FILTER_INDEX_TTL = float(os.getenv('FILTER_INDEX_TTL', 600))
+
+LISTENER_STARTUP_CHUNK_SIZE = int(os.getenv('LISTENER_STARTUP_CHUNK_SIZE', 500))
+LISTENER_STARTUP_CONCURRENCY = int(os.getenv('LISTENER_STARTUP_CONCURRENCY', 100))
+LISTENER_READY_TIMEOUT = int(os.getenv('LISTENER_READY_TIMEOUT', 60))
+
+# Лимиты подключений к одному IMAP серверу, 0 - без ограничений. Слушатель держит соединение
+# все время работы, поэтому ящики сверх max_connections ждут, пока освободится слот.
+# IMAP_HOST_LIMITS переопределяет их для отдельных серверов:
+# {"imap.gmail.com": {"max_connections": 1000, "logins_per_second": 5}}
+IMAP_HOST_MAX_CONNECTIONS = int(os.getenv('IMAP_HOST_MAX_CONNECTIONS', 0))
+IMAP_HOST_LOGINS_PER_SECOND = float(os.getenv('IMAP_HOST_LOGINS_PER_SECOND', 10))
+IMAP_HOST_LIMITS = os.getenv('IMAP_HOST_LIMITS', '')
+
+# Интервал обновления IDLE подбирается для каждого сервера между этими границами (RFC 2177: до 29 минут)
+IMAP_IDLE_MIN_TIMEOUT = float(os.getenv('IMAP_IDLE_MIN_TIMEOUT', 59))
+IMAP_IDLE_MAX_TIMEOUT = float(os.getenv('IMAP_IDLE_MAX_TIMEOUT', 1740))
+IMAP_IDLE_GROWTH_FACTOR = float(os.getenv('IMAP_IDLE_GROWTH_FACTOR', 1.5))
+IMAP_IDLE_GROWTH_AFTER = int(os.getenv('IMAP_IDLE_GROWTH_AFTER', 3))
+IMAP_IDLE_MAX_FAILURES = int(os.getenv('IMAP_IDLE_MAX_FAILURES', 3))
+
+# Опрос ящиков на серверах без IDLE, интервал подстраивается под частоту писем
+IMAP_POLL_MIN_INTERVAL = float(os.getenv('IMAP_POLL_MIN_INTERVAL', 15))
+IMAP_POLL_MAX_INTERVAL = float(os.getenv('IMAP_POLL_MAX_INTERVAL', 300))
+IMAP_POLL_BACKOFF_FACTOR = float(os.getenv('IMAP_POLL_BACKOFF_FACTOR', 1.25))
+
+# Сжатие трафика (RFC 4978), если сервер объявляет COMPRESS=DEFLATE. Распаковщик занимает ~40 КБ на соединение
+IMAP_COMPRESS = os.getenv('IMAP_COMPRESS', 'True') == 'True'
+
+IMAP_CONNECT_TIMEOUT = float(os.getenv('IMAP_CONNECT_TIMEOUT', 15))
+IMAP_RECONNECT_BASE_DELAY = float(os.getenv('IMAP_RECONNECT_BASE_DELAY', 5))
+IMAP_RECONNECT_MAX_DELAY = float(os.getenv('IMAP_RECONNECT_MAX_DELAY', 300))
+IMAP_BREAKER_FAILURES = int(os.getenv('IMAP_BREAKER_FAILURES', 5))
+IMAP_BREAKER_COOLDOWN = float(os.getenv('IMAP_BREAKER_COOLDOWN', 60))
+
+# Дополнительные папки ящиков (WatchedFolder) слушаются через то же соединение:
+# через NOTIFY, если сервер его поддерживает, иначе проверкой STATUS
+IMAP_WATCH_FOLDERS = os.getenv('IMAP_WATCH_FOLDERS', 'False') == 'True'
+IMAP_NOTIFY = os.getenv('IMAP_NOTIFY', 'True') == 'True'
+IMAP_FOLDER_POLL_INTERVAL = float(os.getenv('IMAP_FOLDER_POLL_INTERVAL', 60))
+
+IMAP_FETCH_BATCH_SIZE = int(os.getenv('IMAP_FETCH_BATCH_SIZE', 50))
+IMAP_SERVER_SEARCH = os.getenv('IMAP_SERVER_SEARCH', 'True') == 'True'
+IMAP_PARTIAL_FETCH = os.getenv('IMAP_PARTIAL_FETCH', 'False') == 'True'
+IMAP_BODY_MAX_BYTES = int(os.getenv('IMAP_BODY_MAX_BYTES', 1024 * 1024))
+
+# Письма больше IMAP_DECODE_INLINE_BYTES разбираются в пуле из IMAP_DECODE_WORKERS потоков
+# (процессов при IMAP_DECODE_PROCESSES), а не в event loop слушателей. 0 воркеров - всегда в event loop
+IMAP_DECODE_INLINE_BYTES = int(os.getenv('IMAP_DECODE_INLINE_BYTES', 128 * 1024))
+IMAP_DECODE_WORKERS = int(os.getenv('IMAP_DECODE_WORKERS', 2))
+IMAP_DECODE_PROCESSES = os.getenv('IMAP_DECODE_PROCESSES', 'False') == 'True'
+
+# Извлечение текста из HTML писем: stream - потоковый разбор без дерева, soup - BeautifulSoup
+EMAIL_HTML_EXTRACTOR = os.getenv('EMAIL_HTML_EXTRACTOR', 'stream')
+
+# Письмо с тем же Message-ID не отправляется пользователю повторно в течение EMAIL_DEDUP_TTL секунд
+EMAIL_DEDUP = os.getenv('EMAIL_DEDUP', 'True') == 'True'
+EMAIL_DEDUP_TTL = int(os.getenv('EMAIL_DEDUP_TTL', 7 * 24 * 60 * 60))
+
 CELERY_BROKER_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/0'
 CELERY_RESULT_BACKEND = f'redis://{REDIS_HOST}:{REDIS_PORT}/0'
 CELERY_ACCEPT_CONTENT = ['json']
@@ -1,9 +1,14 @@
 from admin_utils.admin_actions import (
+    clear_filters_cache_and_reload,
     delete_email_boxes_and_clear_cache,
     delete_filters_and_clear_chache,
+    publish_listening_change,
+    restart_box,
+    restart_service_boxes,
 )
 from django.contrib import admin
-from email_service.models import BoxFilter, EmailBox, EmailService
+from django.db import transaction
+from email_service.models import BoxFilter, EmailBox, EmailService, WatchedFolder
 
 
 class BoxFilterInline(admin.TabularInline):
@@ -16,6 +21,17 @@ class BoxFilterInline(admin.TabularInline):
     extra = 1
 
 
+class WatchedFolderInline(admin.TabularInline):
+    """
+    Встроенный интерфейс для модели WatchedFolder.
+
+    Папки прослушиваются вместе с INBOX при IMAP_WATCH_FOLDERS=True.
+    """
+    model = WatchedFolder
+    extra = 0
+    readonly_fields = ('uid_validity', 'last_uid')
+
+
 @admin.register(EmailBox)
 class BoxAdmin(admin.ModelAdmin):
     """Админ-панель модели почтового ящика."""
@@ -25,13 +41,13 @@ class BoxAdmin(admin.ModelAdmin):
     list_display = ('display_user', 'display_email_service', 'email_username', 'listening')
     list_filter = ('email_service__title', 'listening')
     search_fields = ('email_username',)
-    readonly_fields = ('email_username',)
+    readonly_fields = ('email_username', 'uid_validity', 'last_uid')
     exclude = ('email_password',)
     search_help_text = 'Поиск по имени пользователя'
 
     list_per_page = 50
 
-    inlines = (BoxFilterInline,)
+    inlines = (BoxFilterInline, WatchedFolderInline)
 
     def display_user(self, obj: EmailBox) -> int:
         return obj.user_id.telegram_id
@@ -43,6 +59,22 @@ class BoxAdmin(admin.ModelAdmin):
 
     display_email_service.short_description = 'Почтовый сервис'  # type: ignore
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'listening' in form.changed_data:
+            transaction.on_commit(lambda: publish_listening_change(obj))
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if any(formset.model is BoxFilter and formset.has_changed() for formset in formsets):
+            # Слушатели перечитают фильтры только после фиксации транзакции админки
+            box = form.instance
+            transaction.on_commit(lambda: clear_filters_cache_and_reload(box))
+        if any(formset.model is WatchedFolder and formset.has_changed() for formset in formsets):
+            # Список папок читается при подключении, поэтому слушатель переподключается
+            box = form.instance
+            transaction.on_commit(lambda: restart_box(box))
+
     def get_actions(self, request):
         actions = super().get_actions(request)
         if 'delete_selected' in actions:
@@ -59,6 +91,12 @@ class EmailServiceAdmin(admin.ModelAdmin):
 
     list_per_page = 50
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'address' in form.changed_data:
+            # Слушатели ящиков сервиса переподключаются к новому адресу сервера
+            transaction.on_commit(lambda: restart_service_boxes(obj))
+
 
 @admin.register(BoxFilter)
 class FilterAdmin(admin.ModelAdmin):
@@ -66,8 +104,8 @@ class FilterAdmin(admin.ModelAdmin):
 
     actions = [delete_filters_and_clear_chache]
 
-    list_display = ('display_user', 'display_box', 'filter_value', 'filter_name')
-    list_filter = ('box_id__user_id__telegram_id', 'box_id__email_username')
+    list_display = ('display_user', 'display_box', 'filter_type', 'filter_value', 'filter_name')
+    list_filter = ('filter_type', 'box_id__user_id__telegram_id', 'box_id__email_username')
     search_fields = ('box_id__email_username', 'box_id__user_id__telegram_id')
     list_per_page = 50
 
@@ -81,6 +119,20 @@ class FilterAdmin(admin.ModelAdmin):
 
     display_user.short_description = 'Пользователь'  # type: ignore
 
+    def save_model(self, request, obj, form, change):
+        boxes = [obj.box_id]
+        if change and 'box_id' in form.changed_data:
+            # Фильтр перенесен в другой ящик: индекс прежнего ящика тоже устарел
+            boxes.append(BoxFilter.objects.get(pk=obj.pk).box_id)
+        super().save_model(request, obj, form, change)
+        for box in boxes:
+            transaction.on_commit(lambda box=box: clear_filters_cache_and_reload(box))
+
+    def delete_model(self, request, obj):
+        box = obj.box_id
+        super().delete_model(request, obj)
+        transaction.on_commit(lambda: clear_filters_cache_and_reload(box))
+
     def get_actions(self, request):
         actions = super().get_actions(request)
         if 'delete_selected' in actions:
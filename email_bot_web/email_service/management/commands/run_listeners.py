@@ -0,0 +1,35 @@
+import asyncio
+import signal
+
+from django.core.management.base import BaseCommand
+from infrastructure.control_channel import start_control_channel, stop_control_channel
+from infrastructure.imap_listener import (
+    start_listening_all_emails,
+    stop_listening_all_emails,
+)
+from infrastructure.logger_config import logger
+
+
+class Command(BaseCommand):
+    help = 'Запускает прослушивание почтовых ящиков отдельно от веб-приложения'
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run())
+
+    @staticmethod
+    async def run() -> None:
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+
+        start_control_channel()
+        await start_listening_all_emails()
+        logger.info('Сервис прослушивания почты запущен')
+
+        await stop_event.wait()
+        logger.info('Остановка сервиса прослушивания почты...')
+
+        await stop_control_channel()
+        await stop_listening_all_emails()
+        logger.info('Сервис прослушивания почты остановлен')
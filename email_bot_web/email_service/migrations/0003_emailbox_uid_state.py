@@ -0,0 +1,23 @@
+# Generated by Django 4.1 on 2026-10-17 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_service', '0002_emailbox_listening'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailbox',
+            name='last_uid',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Последний обработанный UID'),
+        ),
+        migrations.AddField(
+            model_name='emailbox',
+            name='uid_validity',
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name='UIDVALIDITY папки INBOX'),
+        ),
+    ]
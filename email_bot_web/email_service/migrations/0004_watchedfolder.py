@@ -0,0 +1,32 @@
+# Generated by Django 4.1 on 2026-10-17 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_service', '0003_emailbox_uid_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WatchedFolder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=256, verbose_name='Имя папки')),
+                ('uid_validity', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='UIDVALIDITY папки')),
+                ('last_uid', models.PositiveBigIntegerField(default=0, verbose_name='Последний обработанный UID')),
+                ('box_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='folders', to='email_service.emailbox', verbose_name='Почтовый ящик')),
+            ],
+            options={
+                'verbose_name': 'Папка',
+                'verbose_name_plural': 'Папки',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='watchedfolder',
+            constraint=models.UniqueConstraint(fields=('box_id', 'name'), name='unique_box_folder'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_service', '0004_watchedfolder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='boxfilter',
+            name='filter_type',
+            field=models.CharField(choices=[('sender', 'Отправитель: адрес, @домен или *.домен'), ('sender_glob', 'Шаблон адреса отправителя (news*@*.example.com)'), ('subject', 'Ключевое слово в теме'), ('body', 'Ключевое слово в тексте письма'), ('header_regex', 'Регулярное выражение по заголовкам From, To, Subject')], default='sender', max_length=16, verbose_name='Тип фильтра'),
+        ),
+    ]
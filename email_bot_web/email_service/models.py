@@ -1,4 +1,13 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from infrastructure.filter_rules import (
+    FILTER_BODY,
+    FILTER_HEADER_REGEX,
+    FILTER_SENDER,
+    FILTER_SENDER_GLOB,
+    FILTER_SUBJECT,
+    validate_filter_rule,
+)
 from user.models import BotUser
 
 
@@ -27,6 +36,8 @@ class EmailBox(models.Model):
     email_username = models.CharField(max_length=64, verbose_name='Имя пользователя')
     email_password = models.CharField(max_length=256, verbose_name='Пароль')
     listening = models.BooleanField(default=True, verbose_name='Слушает')
+    uid_validity = models.PositiveBigIntegerField(null=True, blank=True, verbose_name='UIDVALIDITY папки INBOX')
+    last_uid = models.PositiveBigIntegerField(default=0, verbose_name='Последний обработанный UID')
 
     class Meta:
         verbose_name = 'Почтовый ящик'
@@ -39,7 +50,16 @@ class EmailBox(models.Model):
 class BoxFilter(models.Model):
     """Модель фильтра почтового ящика."""
 
+    class FilterType(models.TextChoices):
+        SENDER = FILTER_SENDER, 'Отправитель: адрес, @домен или *.домен'
+        SENDER_GLOB = FILTER_SENDER_GLOB, 'Шаблон адреса отправителя (news*@*.example.com)'
+        SUBJECT = FILTER_SUBJECT, 'Ключевое слово в теме'
+        BODY = FILTER_BODY, 'Ключевое слово в тексте письма'
+        HEADER_REGEX = FILTER_HEADER_REGEX, 'Регулярное выражение по заголовкам From, To, Subject'
+
     box_id = models.ForeignKey(EmailBox, on_delete=models.CASCADE, related_name='filters', verbose_name='Почтовый ящик')
+    filter_type = models.CharField(max_length=16, choices=FilterType.choices, default=FilterType.SENDER,
+                                   verbose_name='Тип фильтра')
     filter_value = models.CharField(max_length=256, verbose_name='Значение фильтра')
     filter_name = models.CharField(max_length=128, verbose_name='Имя фильтра', null=True, blank=True)
 
@@ -47,5 +67,28 @@ class BoxFilter(models.Model):
         verbose_name = 'Фильтр'
         verbose_name_plural = 'Фильтры'
 
+    def clean(self) -> None:
+        try:
+            self.filter_value = validate_filter_rule(self.filter_type, self.filter_value)
+        except ValueError as e:
+            raise ValidationError({'filter_value': str(e)})
+
     def __str__(self) -> str:
         return self.filter_value
+
+
+class WatchedFolder(models.Model):
+    """Модель дополнительной папки почтового ящика, которая прослушивается вместе с INBOX."""
+
+    box_id = models.ForeignKey(EmailBox, on_delete=models.CASCADE, related_name='folders', verbose_name='Почтовый ящик')
+    name = models.CharField(max_length=256, verbose_name='Имя папки')
+    uid_validity = models.PositiveBigIntegerField(null=True, blank=True, verbose_name='UIDVALIDITY папки')
+    last_uid = models.PositiveBigIntegerField(default=0, verbose_name='Последний обработанный UID')
+
+    class Meta:
+        verbose_name = 'Папка'
+        verbose_name_plural = 'Папки'
+        constraints = [models.UniqueConstraint(fields=('box_id', 'name'), name='unique_box_folder')]
+
+    def __str__(self) -> str:
+        return self.name
@@ -1,5 +1,11 @@
 from email_service.models import BoxFilter, EmailBox, EmailService
+from infrastructure.filter_rules import (
+    FILTER_HEADER_REGEX,
+    FILTER_SENDER,
+    validate_filter_rule,
+)
 from ninja import Schema
+from pydantic import root_validator
 
 
 class BotUserCreateSchema(Schema):
@@ -47,6 +53,7 @@ class BoxFilterSchema(Schema):
 
     filter_value: str
     filter_name: str | None = None
+    filter_type: str = FILTER_SENDER
 
     class Config:
         orm_mode = True
@@ -55,14 +62,33 @@ class BoxFilterSchema(Schema):
     def from_orm(cls, obj: BoxFilter) -> 'BoxFilterSchema':
         return cls(
             filter_value=obj.filter_value,
-            filter_name=obj.filter_name
+            filter_name=obj.filter_name,
+            filter_type=obj.filter_type
         )
 
 
+class BoxFilterCreateSchema(BoxFilterSchema):
+    """
+    Схема создания фильтра через API: регулярные выражения по заголовкам добавляет только администратор.
+    Правило проверяется только при создании, чтобы сохраненные ранее фильтры по-прежнему читались.
+    """
+
+    @root_validator(skip_on_failure=True)
+    def validate_rule(cls, values: dict) -> dict:
+        values['filter_value'] = validate_filter_rule(values['filter_type'], values['filter_value'])
+        return values
+
+    @root_validator(skip_on_failure=True)
+    def reject_header_regex(cls, values: dict) -> dict:
+        if values['filter_type'] == FILTER_HEADER_REGEX:
+            raise ValueError('Фильтры header_regex добавляются только в админ-панели')
+        return values
+
+
 class CreateBoxFilterRequest(Schema):
     telegram_id: int
     email_username: str
-    filter_data: BoxFilterSchema
+    filter_data: BoxFilterCreateSchema
 
 
 class EmailBoxCreateSchema(Schema):
@@ -72,7 +98,7 @@ class EmailBoxCreateSchema(Schema):
     email_service_slug: str
     email_username: str
     email_password: str | bytes
-    filters: list[BoxFilterSchema]
+    filters: list[BoxFilterCreateSchema]
 
     class Config:
         orm_mode = True
@@ -115,3 +141,7 @@ class ImapEmailModel(Schema):
     to: str
     date: str
     body: str
+    # Текст без разметки извлекается только для ящиков с фильтрами по тексту письма (process_email)
+    text: str | None = None
+    attachments: list[str] = []
+    message_id: str = ''
@@ -0,0 +1,131 @@
+import base64
+import binascii
+import quopri
+from collections import namedtuple
+from email.header import decode_header
+from typing import Any, Iterator
+from urllib.parse import unquote_to_bytes
+
+BodyPart = namedtuple('BodyPart', 'section content_type charset encoding size filename disposition')
+
+# Позиция поля disposition в описании части зависит от ее типа (RFC 3501, 7.4.2)
+DISPOSITION_INDEX = {'text': 9, 'message/rfc822': 11}
+DEFAULT_DISPOSITION_INDEX = 8
+
+
+def to_str(value: Any) -> str:
+    return value.decode(errors='replace') if isinstance(value, (bytes, bytearray)) else ''
+
+
+def parse_params(params: Any) -> dict[str, str]:
+    """Преобразует список параметров ("name" "value" ...) в словарь с ключами в нижнем регистре."""
+
+    if not isinstance(params, list):
+        return {}
+    result = {}
+    for key, value in zip(params[::2], params[1::2]):
+        key, value = to_str(key).lower(), to_str(value)
+        if key.endswith('*'):
+            # RFC 2231: charset'language'percent-encoded-value
+            charset, _, encoded = value.partition("'")
+            _, _, encoded = encoded.partition("'")
+            key, value = key[:-1], unquote_to_bytes(encoded).decode(charset or 'utf-8', errors='replace')
+        result[key] = value
+    return result
+
+
+def decode_filename(filename: str) -> str:
+    return ''.join(text.decode(charset or 'utf-8', errors='replace') if isinstance(text, bytes) else text
+                   for text, charset in decode_header(filename))
+
+
+def walk_bodystructure(structure: list, section: str = '') -> Iterator[BodyPart]:
+    """Перебирает все конечные части письма по разобранному BODYSTRUCTURE."""
+
+    if structure and isinstance(structure[0], list):
+        index = 0
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            index += 1
+            yield from walk_bodystructure(child, f'{section}.{index}' if section else str(index))
+        return
+
+    content_type = f'{to_str(structure[0])}/{to_str(structure[1])}'.lower()
+    params = parse_params(structure[2])
+    maintype = content_type.split('/')[0]
+    disposition_index = DISPOSITION_INDEX.get(content_type, DISPOSITION_INDEX.get(maintype, DEFAULT_DISPOSITION_INDEX))
+    disposition_data = structure[disposition_index] if len(structure) > disposition_index else None
+
+    disposition, disposition_params = '', {}
+    if isinstance(disposition_data, list) and disposition_data:
+        disposition = to_str(disposition_data[0]).lower()
+        disposition_params = parse_params(disposition_data[1] if len(disposition_data) > 1 else None)
+
+    filename = disposition_params.get('filename') or params.get('name')
+    yield BodyPart(
+        section=section or '1',
+        content_type=content_type,
+        charset=params.get('charset') or 'utf-8',
+        encoding=to_str(structure[5]).lower(),
+        size=int(structure[6]) if structure[6] else 0,
+        filename=decode_filename(filename) if filename else None,
+        disposition=disposition,
+    )
+
+
+def is_inline(part: BodyPart) -> bool:
+    return part.disposition != 'attachment' and not part.filename
+
+
+def select_parts(structure: list) -> tuple[BodyPart | None, list[BodyPart]]:
+    """
+    Выбирает часть с телом письма и список вложений.
+
+    Телом считается первая text/html часть, иначе первая text/plain часть,
+    не помеченная как вложение. Вложения - части с именем файла или disposition attachment.
+    """
+    parts = list(walk_bodystructure(structure))
+    text_part = None
+    for content_type in ('text/html', 'text/plain'):
+        text_part = next((part for part in parts if part.content_type == content_type and is_inline(part)), None)
+        if text_part:
+            break
+
+    attachments = [part for part in parts if part is not text_part and not is_inline(part)]
+    return text_part, attachments
+
+
+def decode_part(data: bytes, part: BodyPart) -> str:
+    """Декодирует загруженную часть письма с учетом Content-Transfer-Encoding и кодировки."""
+
+    if part.encoding == 'base64':
+        compact = b''.join(data.split())
+        try:
+            # При ограничении размера последний блок base64 может быть неполным
+            payload = base64.b64decode(compact[:len(compact) - len(compact) % 4])
+        except binascii.Error:
+            payload = data
+    elif part.encoding == 'quoted-printable':
+        payload = quopri.decodestring(data)
+    else:
+        payload = data
+
+    try:
+        return payload.decode(part.charset, errors='replace')
+    except LookupError:
+        return payload.decode('utf-8', errors='replace')
+
+
+def estimate_decoded_size(part: BodyPart) -> int:
+    """Оценивает размер вложения после декодирования по размеру из BODYSTRUCTURE."""
+
+    return part.size * 3 // 4 if part.encoding == 'base64' else part.size
+
+
+def format_attachment(name: str, size: int) -> str:
+    for unit in ('Б', 'КБ', 'МБ'):
+        if size < 1024:
+            return f'{name} ({size:.0f} {unit})'
+        size /= 1024
+    return f'{name} ({size:.1f} ГБ)'
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import socket
+import uuid
+
+from django.conf import settings
+from redis import asyncio as aioredis
+
+ListenerKey = tuple[int, str]
+
+LEASE_KEY_PREFIX = 'listener_lease:'
+NODES_KEY = 'listener_nodes'
+
+# Продлевает аренды узла и возвращает ключи, которые ему больше не принадлежат
+RENEW_SCRIPT = """
+local lost = {}
+for _, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        redis.call('PEXPIRE', key, ARGV[2])
+    else
+        table.insert(lost, key)
+    end
+end
+return lost
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class BoxLeases:
+    """
+    Аренда почтовых ящиков узлами сервиса прослушивания.
+
+    Ящик прослушивает только узел, владеющий ключом listener_lease:<telegram_id>:<email> в Redis.
+    Аренда выдается через SET NX PX и продлевается каждые LISTENER_LEASE_TTL / 3 секунд;
+    если узел перестал продлевать аренды, через LISTENER_LEASE_TTL ящики подхватывают другие узлы.
+    Живые узлы отмечаются в sorted set listener_nodes временем последнего heartbeat.
+    """
+
+    def __init__(self):
+        self.node_id = settings.LISTENER_NODE_ID or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self.held: dict[str, ListenerKey] = {}
+        self._client: aioredis.Redis | None = None
+        self._renew_script = None
+        self._release_script = None
+
+    @property
+    def ttl_ms(self) -> int:
+        return int(settings.LISTENER_LEASE_TTL * 1000)
+
+    @property
+    def client(self) -> aioredis.Redis:
+        if self._client is None:
+            self._client = aioredis.from_url(f'redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/0',
+                                             decode_responses=True)
+            self._renew_script = self._client.register_script(RENEW_SCRIPT)
+            self._release_script = self._client.register_script(RELEASE_SCRIPT)
+        return self._client
+
+    @staticmethod
+    def lease_key(key: ListenerKey) -> str:
+        return f'{LEASE_KEY_PREFIX}{key[0]}:{key[1]}'
+
+    async def acquire(self, key: ListenerKey) -> bool:
+        lease_key = self.lease_key(key)
+        if await self.client.set(lease_key, self.node_id, nx=True, px=self.ttl_ms):
+            self.held[lease_key] = key
+            return True
+        # Аренда уже принадлежит узлу (например, осталась от остановленного слушателя): ее тоже нужно продлевать
+        if await self.client.get(lease_key) == self.node_id:
+            self.held[lease_key] = key
+            return True
+        return False
+
+    async def release(self, key: ListenerKey) -> None:
+        lease_key = self.lease_key(key)
+        self.held.pop(lease_key, None)
+        client = self.client
+        await self._release_script(keys=[lease_key], args=[self.node_id], client=client)
+
+    async def release_all(self) -> None:
+        await asyncio.gather(*(self.release(key) for key in list(self.held.values())), return_exceptions=True)
+        await self.client.zrem(NODES_KEY, self.node_id)
+
+    async def renew(self) -> list[ListenerKey]:
+        """Продлевает все аренды узла одним скриптом и возвращает потерянные ящики."""
+
+        if not self.held:
+            return []
+        client = self.client
+        lost = await self._renew_script(keys=list(self.held), args=[self.node_id, self.ttl_ms], client=client)
+        return [self.held.pop(lease_key) for lease_key in lost if lease_key in self.held]
+
+    async def heartbeat(self) -> int:
+        """Отмечает узел живым и возвращает число живых узлов."""
+
+        now = await self.server_time()
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.zadd(NODES_KEY, {self.node_id: now})
+            pipe.zremrangebyscore(NODES_KEY, '-inf', now - settings.LISTENER_LEASE_TTL)
+            pipe.zcard(NODES_KEY)
+            *_, alive_nodes = await pipe.execute()
+        return max(alive_nodes, 1)
+
+    async def server_time(self) -> float:
+        seconds, microseconds = await self.client.time()
+        return seconds + microseconds / 1_000_000
+
+    async def free_keys(self, keys: list[ListenerKey]) -> list[ListenerKey]:
+        """Возвращает ящики, которые сейчас никем не арендованы."""
+
+        if not keys:
+            return []
+        owners = await self.client.mget([self.lease_key(key) for key in keys])
+        return [key for key, owner in zip(keys, owners) if owner is None]
+
+
+box_leases = BoxLeases()
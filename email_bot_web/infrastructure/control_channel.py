@@ -0,0 +1,138 @@
+import asyncio
+import json
+
+from django.conf import settings
+from infrastructure.filter_index import filter_indexes
+from infrastructure.imap_listener import IMAPClient, start_listening_box
+from infrastructure.listener_manager import ListenerKey, listener_manager
+from infrastructure.logger_config import logger
+from infrastructure.tools import redis_client
+from redis import asyncio as aioredis
+
+COMMAND_START = 'start'
+COMMAND_STOP = 'stop'
+COMMAND_RESTART = 'restart'
+COMMAND_RELOAD_FILTERS = 'reload_filters'
+COMMANDS = (COMMAND_START, COMMAND_STOP, COMMAND_RESTART, COMMAND_RELOAD_FILTERS)
+
+RECONNECT_DELAY = 5
+
+_control_task: asyncio.Task | None = None
+_command_tasks: set[asyncio.Task] = set()
+# Последняя принятая команда каждого ящика: следующая команда ящика ждет ее завершения
+_last_box_commands: dict[ListenerKey, asyncio.Task] = {}
+
+
+def publish_command(command: str, telegram_id: int, email_username: str) -> int:
+    """
+    Отправляет команду слушателям почты всех процессов.
+    Возвращает число процессов, подписанных на управляющий канал.
+    """
+    message = json.dumps({'command': command, 'telegram_id': telegram_id, 'email_username': email_username})
+    try:
+        return redis_client.publish(settings.LISTENER_CONTROL_CHANNEL, message)
+    except Exception as e:
+        logger.error(f'Не удалось отправить команду {command} для {email_username}: {e}')
+        return 0
+
+
+async def request_listening_start(telegram_id: int, email_username: str, verified: IMAPClient | None = None) -> None:
+    """
+    Просит сервис прослушивания запустить ящик. Если ни один процесс не подписан
+    на управляющий канал и слушатели встроены в веб-приложение, запускает ящик здесь,
+    передав слушателю сессию, проверенную клиентом verified.
+    """
+    if not publish_command(COMMAND_START, telegram_id, email_username) and settings.EMBEDDED_LISTENERS:
+        await start_listening_box(telegram_id, email_username, verified)
+
+
+async def execute_command(command: str, telegram_id: int, email_username: str) -> None:
+    if command != COMMAND_START:
+        filter_indexes.invalidate(telegram_id, email_username)
+    if command in (COMMAND_STOP, COMMAND_RESTART):
+        await listener_manager.stop(telegram_id, email_username)
+    if command in (COMMAND_START, COMMAND_RESTART):
+        await start_listening_box(telegram_id, email_username)
+    logger.info(f'{email_username} - Выполнена команда {command}')
+
+
+async def execute_after(previous: asyncio.Task | None, command: str, telegram_id: int, email_username: str) -> None:
+    """Выполняет команду после предыдущей команды того же ящика, даже если та завершилась ошибкой."""
+
+    if previous is not None:
+        await asyncio.wait({previous})
+    try:
+        await execute_command(command, telegram_id, email_username)
+    except Exception as e:
+        logger.error(f'{email_username} - Не удалось выполнить команду {command}: {e!r}')
+
+
+def handle_control_message(data: bytes | str) -> None:
+    """Разбирает сообщение управляющего канала и запускает выполнение команды в отдельной задаче."""
+
+    try:
+        payload = json.loads(data)
+        command = payload['command']
+        telegram_id = int(payload['telegram_id'])
+        email_username = payload['email_username']
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error(f'Некорректная команда в управляющем канале {data!r}: {e}')
+        return
+
+    if command not in COMMANDS:
+        logger.error(f'Неизвестная команда в управляющем канале: {command}')
+        return
+
+    # Команды разных ящиков выполняются параллельно, чтобы долгий LOGIN одного ящика не задерживал остальные,
+    # а команды одного ящика - по очереди: stop, пришедший во время start, выполняется после него
+    key = listener_manager.make_key(telegram_id, email_username)
+    task = asyncio.create_task(execute_after(_last_box_commands.get(key), command, telegram_id, email_username))
+    _last_box_commands[key] = task
+    _command_tasks.add(task)
+    task.add_done_callback(lambda done: _forget_command(key, done))
+
+
+def _forget_command(key: ListenerKey, task: asyncio.Task) -> None:
+    _command_tasks.discard(task)
+    if _last_box_commands.get(key) is task:
+        del _last_box_commands[key]
+
+
+async def listen_control_channel() -> None:
+    """Подписывается на управляющий канал один раз на процесс и переподключается при обрыве."""
+
+    while True:
+        client = aioredis.from_url(f'redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/0')
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(settings.LISTENER_CONTROL_CHANNEL)
+            logger.info(f'Подписка на управляющий канал {settings.LISTENER_CONTROL_CHANNEL}')
+            async for message in pubsub.listen():
+                if message and message['type'] == 'message':
+                    handle_control_message(message['data'])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f'Ошибка управляющего канала: {e}. Переподключение через {RECONNECT_DELAY} с')
+            await asyncio.sleep(RECONNECT_DELAY)
+        finally:
+            await pubsub.reset()
+            await client.close()
+
+
+def start_control_channel() -> asyncio.Task:
+    global _control_task
+
+    if _control_task is None or _control_task.done():
+        _control_task = asyncio.create_task(listen_control_channel())
+    return _control_task
+
+
+async def stop_control_channel() -> None:
+    """Отписывается от управляющего канала и дожидается уже принятых команд."""
+
+    if _control_task:
+        _control_task.cancel()
+        await asyncio.gather(_control_task, return_exceptions=True)
+    if _command_tasks:
+        await asyncio.wait(set(_command_tasks), timeout=settings.LISTENER_SHUTDOWN_TIMEOUT)
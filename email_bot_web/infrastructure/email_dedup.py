@@ -0,0 +1,82 @@
+import hashlib
+
+from django.conf import settings
+from email_service.schema import ImapEmailModel
+from infrastructure.logger_config import logger
+from redis import asyncio as aioredis
+
+DELIVERED_KEY_PREFIX = 'email_delivered:'
+
+
+class DeliveryDedup:
+    """
+    Защита от повторной отправки одного письма пользователю.
+
+    Перед рендерингом письма обработчик занимает ключ email_delivered:<telegram_id>:<хеш>
+    через SET NX EX: хеш считается по Message-ID, а без него - по отправителю, получателю,
+    дате и теме. Если ключ уже занят, письмо уже отправлялось (повторная загрузка после
+    переподключения или перезапуска, второй слушатель того же ящика, тот же адрес в двух ящиках)
+    и пропускается. Ключи живут EMAIL_DEDUP_TTL секунд. При недоступности Redis письмо отправляется.
+    """
+
+    def __init__(self):
+        self._client: aioredis.Redis | None = None
+        self.checked = 0
+        self.duplicates = 0
+        self.errors = 0
+
+    @property
+    def client(self) -> aioredis.Redis:
+        if self._client is None:
+            self._client = aioredis.from_url(f'redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/0',
+                                             decode_responses=True)
+        return self._client
+
+    @staticmethod
+    def delivered_key(telegram_id: int, email_object: ImapEmailModel) -> str:
+        if email_object.message_id:
+            identity = email_object.message_id
+        else:
+            identity = '\0'.join((email_object.from_, email_object.to, email_object.date, email_object.subject))
+        digest = hashlib.sha1(identity.encode('utf-8', errors='replace')).hexdigest()
+        return f'{DELIVERED_KEY_PREFIX}{telegram_id}:{digest}'
+
+    async def claim(self, telegram_id: int, email_object: ImapEmailModel) -> bool:
+        """Отмечает письмо отправленным. Возвращает False, если оно уже отправлялось пользователю."""
+
+        if not settings.EMAIL_DEDUP:
+            return True
+
+        self.checked += 1
+        try:
+            claimed = await self.client.set(self.delivered_key(telegram_id, email_object), 1,
+                                            nx=True, ex=settings.EMAIL_DEDUP_TTL)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f'Не удалось проверить повторную отправку письма: {e!r}')
+            return True
+
+        if not claimed:
+            self.duplicates += 1
+        return bool(claimed)
+
+    async def release(self, telegram_id: int, email_object: ImapEmailModel) -> None:
+        """Снимает отметку, если письмо так и не удалось передать на отправку."""
+
+        if not settings.EMAIL_DEDUP:
+            return
+        try:
+            await self.client.delete(self.delivered_key(telegram_id, email_object))
+        except Exception as e:
+            logger.warning(f'Не удалось снять отметку об отправке письма: {e!r}')
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            'checked': self.checked,
+            'duplicates': self.duplicates,
+            'errors': self.errors,
+            'hit_rate': round(self.duplicates / self.checked, 3) if self.checked else 0.0,
+        }
+
+
+delivery_dedup = DeliveryDedup()
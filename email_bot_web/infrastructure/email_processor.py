@@ -1,23 +1,65 @@
-import re
 from typing import Any
+from weakref import WeakKeyDictionary
 
 from aioimaplib import aioimaplib
-from api.services.box_filter_services import BoxFilterService
 from email_service.schema import ImapEmailModel
+from infrastructure.decode_pool import HTML_EXTRACT_COST, decode_pool
+from infrastructure.email_dedup import delivery_dedup
+from infrastructure.filter_index import filter_indexes
+from infrastructure.html_extractors import extract_email_text
+from infrastructure.imap_utils import format_uid_set
 from infrastructure.logger_config import logger
 from infrastructure.tasks import handle_email_to_image
 
-filters = BoxFilterService
 
-EMAIL_PATTERN = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
+class SeenFlags:
+    """
+    Очередь отметок о прочтении писем по соединениям.
+
+    Обработчик писем только добавляет UID в очередь, а слушатель после каждой пачки писем
+    отправляет одну команду UID STORE <набор UID> +FLAGS.SILENT (\\Seen) вместо команды
+    на каждое письмо. Флаг ставится уже после передачи писем на отправку, а SILENT избавляет
+    от ответа FETCH на каждое отмеченное письмо.
+    """
+
+    def __init__(self):
+        self.pending: WeakKeyDictionary[aioimaplib.IMAP4_SSL, set[int]] = WeakKeyDictionary()
+        self.commands = 0
+        self.messages = 0
+
+    def add(self, imap_client: aioimaplib.IMAP4_SSL, uid: int) -> None:
+        self.pending.setdefault(imap_client, set()).add(uid)
+
+    async def flush(self, imap_client: aioimaplib.IMAP4_SSL) -> None:
+        """Отмечает прочитанными все письма из очереди соединения одной командой."""
 
+        uids = self.pending.pop(imap_client, None)
+        if not uids:
+            return
+        try:
+            response = await imap_client.uid('store', format_uid_set(uids), '+FLAGS.SILENT', '(\\Seen)')
+        except Exception as e:
+            logger.error(f'Не удалось отметить прочитанными письма {sorted(uids)}: {e!r}')
+            return
+        if response.result != 'OK':
+            logger.error(f'Не удалось отметить прочитанными письма {sorted(uids)}: {response.lines}')
+            return
+        self.commands += 1
+        self.messages += len(uids)
 
-async def mark_as_read(imap_client: aioimaplib.IMAP4_SSL, uid: int) -> None:
+    def stats(self) -> dict[str, int]:
+        return {'commands': self.commands, 'messages': self.messages}
+
+
+seen_flags = SeenFlags()
+
+
+def mark_as_read(imap_client: aioimaplib.IMAP4_SSL, uid: int) -> None:
     """
     Отмечает указанное письмо как прочитанное на IMAP-сервере.
 
-    Эта функция использует IMAP-команду 'store' для установки флага 'Seen'
-    для письма с заданным UID. После выполнения этой функции, письмо будет
+    Флаг 'Seen' ставится не сразу: UID добавляется в очередь seen_flags, и слушатель
+    отмечает все письма пачки одной командой STORE. После этого письмо будет
     отображаться как прочитанное на почтовом сервере и в любых почтовых клиентах,
     которые синхронизируются с этим сервером.
 
@@ -26,9 +68,9 @@ async def mark_as_read(imap_client: aioimaplib.IMAP4_SSL, uid: int) -> None:
     - uid (int): Уникальный идентификатор письма, которое необходимо отметить как прочитанное.
 
     Возвращает:
-    None: Функция не возвращает значений, но может вызвать исключения в случае ошибок.
+    None
     """
-    await imap_client.uid('store', str(uid), '+FLAGS', '(\\Seen)')
+    seen_flags.add(imap_client, uid)
 
 
 def email_to_html(email_data: dict[str, Any]) -> str:
@@ -75,38 +117,59 @@ def email_to_html(email_data: dict[str, Any]) -> str:
         """
 
 
+async def find_matching_sender(from_: str, telegram_id: int, email_username: str, to: str = '',
+                               subject: str = '', body: str | None = None) -> str | None:
+    """
+    Возвращает адрес отправителя, если письмо подходит под один из фильтров почтового ящика.
+
+    Используется как для готового письма, так и для заголовков до загрузки тела письма (body=None).
+    Проверка выполняется по индексу фильтров ящика в памяти (filter_indexes), без запроса к Redis.
+    """
+    index = await filter_indexes.get(telegram_id, email_username)
+    return index.match(from_, to=to, subject=subject, body=body)
+
+
 async def process_email(email_object: ImapEmailModel, telegram_id: int, email_username: str,
                         uid: int, imap_client: aioimaplib.IMAP4_SSL) -> None:
-    """Обработка письма, сортировка по фильтрам, преобразование в фотографию"""
-
-    list_of_filters: list[dict | Any] = await filters.get_filters_for_user_and_email(telegram_id, email_username)
-    email_sender_matches = re.findall(EMAIL_PATTERN, email_object.from_)
-    if email_sender_matches:
-        email_sender = email_sender_matches[0]
-        logger.info(f'OUR_SERNDER_TO_MATCH_WITH_FILTER - {email_sender}')
-        for filter_ in list_of_filters:
-            if isinstance(filter_, dict):
-                value = filter_['filter_value']
-            else:
-                value = filter_.filter_value
-            if value == email_sender:
-                logger.info(f'Date: {email_object.date}')
-                logger.info(f'From: {email_object.from_}')
-                logger.info(f'To: {email_object.to}')
-                logger.info(f'Subject: {email_object.subject}')
-                logger.info(f'Body: {email_object.body}')
-                await mark_as_read(imap_client, uid)
-
-                email_data = {
-                    'Subject': email_object.subject,
-                    'From': email_object.from_,
-                    'To': email_object.to,
-                    'Date': email_object.date,
-                    'Body': {
-                        'html_body': email_object.body,
-                        'attachment_names': []
-                    }
-                }
-
-                content = email_to_html(email_data)
-                handle_email_to_image.delay(content, telegram_id, email_sender)
+    """
+    Обработка письма, сортировка по фильтрам, преобразование в фотографию.
+    Письма, уже отправленные пользователю, повторно не рендерятся (delivery_dedup).
+    Текст без разметки извлекается, только если у ящика есть фильтры по тексту письма.
+    """
+    index = await filter_indexes.get(telegram_id, email_username)
+    if index.body_matcher and email_object.text is None:
+        email_object.text = await decode_pool.run(len(email_object.body) * HTML_EXTRACT_COST,
+                                                  extract_email_text, email_object.body)
+
+    email_sender = index.match(email_object.from_, to=email_object.to, subject=email_object.subject,
+                               body=email_object.text)
+    if email_sender:
+        mark_as_read(imap_client, uid)
+        if not await delivery_dedup.claim(telegram_id, email_object):
+            logger.info(f'{email_username} - Письмо {email_object.message_id or email_object.subject!r} '
+                        f'уже отправлено пользователю, пропускаем')
+            return
+
+        logger.info(f'Date: {email_object.date}')
+        logger.info(f'From: {email_object.from_}')
+        logger.info(f'To: {email_object.to}')
+        logger.info(f'Subject: {email_object.subject}')
+        logger.info(f'Body: {email_object.body}')
+
+        email_data = {
+            'Subject': email_object.subject,
+            'From': email_object.from_,
+            'To': email_object.to,
+            'Date': email_object.date,
+            'Body': {
+                'html_body': email_object.body,
+                'attachment_names': email_object.attachments
+            }
+        }
+
+        content = email_to_html(email_data)
+        try:
+            handle_email_to_image.delay(content, telegram_id, email_sender)
+        except Exception:
+            await delivery_dedup.release(telegram_id, email_object)
+            raise
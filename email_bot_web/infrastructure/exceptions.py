@@ -72,3 +72,7 @@ class EmailNotListeningError(CustomError):
 
 class EmailCredentialsError(CustomError):
     """Исключение, возникающее если предоставлены не корректные данные логина и пароля от почты"""
+
+
+class EmailLoginUnavailableError(CustomError):
+    """Исключение, возникающее если сервер временно отклонил авторизацию ([UNAVAILABLE], [LIMIT], [INUSE])"""
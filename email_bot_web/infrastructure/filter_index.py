@@ -0,0 +1,217 @@
+import re
+import time
+from functools import lru_cache
+from typing import Any, Iterable, NamedTuple
+
+from api.services.box_filter_services import BoxFilterService
+from django.conf import settings
+from infrastructure.filter_rules import (
+    FILTER_BODY,
+    FILTER_HEADER_REGEX,
+    FILTER_SENDER,
+    FILTER_SENDER_GLOB,
+    FILTER_SUBJECT,
+    HEADER_MATCH_LENGTH,
+    compile_regex_rules,
+    glob_to_regex,
+    keywords_to_regex,
+    validate_filter_rule,
+)
+from infrastructure.logger_config import logger
+
+filters = BoxFilterService
+
+ListenerKey = tuple[int, str]
+
+EMAIL_PATTERN = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+
+
+class ParsedSender(NamedTuple):
+    address: str
+    normalized: str
+    domain: str
+
+
+@lru_cache(maxsize=4096)
+def parse_sender(from_: str) -> ParsedSender | None:
+    """
+    Разбирает заголовок From: первый найденный адрес, он же в нижнем регистре и его домен.
+    Рассылки приходят от одних и тех же отправителей, поэтому результат кешируется.
+    """
+    match = EMAIL_PATTERN.search(from_)
+    if not match:
+        return None
+    address = match.group(0)
+    normalized = address.lower()
+    return ParsedSender(address, normalized, normalized.rpartition('@')[2])
+
+
+class FilterIndex:
+    """
+    Скомпилированные правила фильтров одного ящика.
+
+    Правило отправителя (sender) задает:
+    - адрес (news@example.com) - точное совпадение без учета регистра;
+    - домен (@example.com, *@example.com или example.com) - любой адрес домена;
+    - поддомены (*.example.com) - любой адрес поддоменов example.com.
+    Адреса и домены хранятся в множествах, поддомены проверяются по суффиксам домена
+    отправителя, поэтому проверка письма не зависит от числа фильтров.
+
+    Шаблоны адреса (sender_glob) собираются в одно выражение, которое проверяет адрес
+    отправителя целиком. Ключевые слова темы (subject) и текста (body) собираются
+    в выражения по префиксному дереву, текст письма проверяется без HTML разметки
+    и только после его загрузки.
+
+    Регулярные выражения по заголовкам (header_regex) собираются в одно выражение,
+    которое проверяет строки Sender, From, To и Subject письма за один проход. Каждое
+    выражение проверяется с начала строки, а значения заголовков обрезаются до
+    HEADER_MATCH_LENGTH символов, чтобы время проверки письма было ограничено.
+    """
+
+    def __init__(self, rules: Iterable[tuple[str, str]]):
+        self.rules = tuple(sorted({(filter_type, value.strip()) for filter_type, value in rules
+                                   if value and value.strip()}))
+        self.addresses: set[str] = set()
+        self.domains: set[str] = set()
+        self.subdomains: set[str] = set()
+        globs, subject_keywords, body_keywords, header_patterns = [], [], [], []
+        for filter_type, value in self.rules:
+            if filter_type == FILTER_SENDER:
+                self.add_sender(value.lower())
+            elif filter_type == FILTER_SENDER_GLOB:
+                globs.append(glob_to_regex(value))
+            elif filter_type == FILTER_SUBJECT:
+                subject_keywords.append(value.lower())
+            elif filter_type == FILTER_BODY:
+                body_keywords.append(value.lower())
+            elif filter_type == FILTER_HEADER_REGEX:
+                self.add_header_regex(value, header_patterns)
+
+        self.sender_glob = re.compile('|'.join(globs), re.IGNORECASE) if globs else None
+        self.subject_matcher = re.compile(keywords_to_regex(subject_keywords)) if subject_keywords else None
+        self.header_matchers = compile_regex_rules(header_patterns, re.IGNORECASE | re.MULTILINE)
+        self.body_matcher = re.compile(keywords_to_regex(body_keywords)) if body_keywords else None
+
+        # Критерий UID SEARCH: сервер отбирает письма с запасом (поиск по подстроке), затем они
+        # проверяются по индексу. Шаблоны и регулярные выражения поиском IMAP не выражаются
+        if globs or any(filter_type == FILTER_HEADER_REGEX for filter_type, _ in self.rules):
+            self.search_keys: list[tuple[str, str]] | None = None
+        else:
+            self.search_keys = [('FROM', address) for address in sorted(self.addresses)]
+            self.search_keys.extend(('FROM', f'@{domain}') for domain in sorted(self.domains))
+            self.search_keys.extend(('FROM', f'.{domain}') for domain in sorted(self.subdomains))
+            self.search_keys.extend(('SUBJECT', keyword) for keyword in sorted(set(subject_keywords)))
+            self.search_keys.extend(('BODY', keyword) for keyword in sorted(set(body_keywords)))
+        self.built_at = time.monotonic()
+
+    def add_sender(self, value: str) -> None:
+        local, at, domain = value.rpartition('@')
+        if at and local not in ('', '*'):
+            self.addresses.add(value)
+        elif domain.startswith('*.'):
+            self.subdomains.add(domain[2:])
+        else:
+            self.domains.add(domain)
+
+    @staticmethod
+    def add_header_regex(value: str, header_patterns: list[str]) -> None:
+        # Правила, сохраненные до ограничения синтаксиса выражений, пропускаются
+        pattern = f'^(?:{value})'
+        try:
+            validate_filter_rule(FILTER_HEADER_REGEX, value)
+            re.compile(pattern)
+        except (re.error, ValueError) as e:
+            logger.warning(f'Фильтр {value!r} пропущен: {e}')
+            return
+        header_patterns.append(pattern)
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    def is_expired(self) -> bool:
+        return time.monotonic() - self.built_at > settings.FILTER_INDEX_TTL
+
+    def match_sender(self, sender: ParsedSender) -> bool:
+        if sender.normalized in self.addresses or sender.domain in self.domains:
+            return True
+        if self.sender_glob and self.sender_glob.fullmatch(sender.normalized):
+            return True
+        if self.subdomains:
+            domain = sender.domain
+            dot = domain.find('.')
+            while dot != -1:
+                domain = domain[dot + 1:]
+                if domain in self.subdomains:
+                    return True
+                dot = domain.find('.')
+        return False
+
+    def match(self, from_: str, to: str = '', subject: str = '', body: str | None = None) -> str | None:
+        """
+        Возвращает адрес отправителя, если письмо подходит под одно из правил ящика.
+
+        body - текст письма без HTML разметки (ImapEmailModel.text).
+        Без текста письма (body=None, проверка по заголовкам) ящик с правилами по тексту
+        считает подходящим любое письмо, окончательно оно проверяется после загрузки.
+        """
+        sender = parse_sender(from_)
+        sender_address = sender.address if sender else from_
+        if sender and self.match_sender(sender):
+            return sender_address
+
+        if self.subject_matcher and self.subject_matcher.search(subject.lower()):
+            return sender_address
+
+        if self.header_matchers:
+            # Перевод строки внутри свернутого заголовка не должен начинать новую строку
+            from_, to, subject = (' '.join(value.split('\n'))[:HEADER_MATCH_LENGTH] for value in (from_, to, subject))
+            address = sender.normalized[:HEADER_MATCH_LENGTH] if sender else ''
+            headers = f'Sender: {address}\nFrom: {from_}\nTo: {to}\nSubject: {subject}'
+            if any(matcher.search(headers) for matcher in self.header_matchers):
+                return sender_address
+
+        if self.body_matcher:
+            if body is None or self.body_matcher.search(body.lower()):
+                return sender_address
+        return None
+
+
+async def load_filter_rules(telegram_id: int, email_username: str) -> list[tuple[str, str]]:
+    """Загружает правила фильтров почтового ящика (из кеша Redis или базы): пары (тип, значение)."""
+
+    list_of_filters: list[dict | Any] = await filters.get_filters_for_user_and_email(telegram_id, email_username)
+    rules = []
+    for filter_ in list_of_filters:
+        if isinstance(filter_, dict):
+            rules.append((filter_.get('filter_type') or FILTER_SENDER, filter_['filter_value']))
+        else:
+            rules.append((filter_.filter_type, filter_.filter_value))
+    return rules
+
+
+class FilterIndexes:
+    """
+    Индексы фильтров ящиков в памяти процесса слушателей.
+
+    Индекс строится при первом письме ящика и сбрасывается командой reload_filters
+    управляющего канала, которую отправляет API при изменении фильтров, а также
+    остановкой ящика. На случай потерянной команды индекс перестраивается
+    не реже раза в FILTER_INDEX_TTL секунд.
+    """
+
+    def __init__(self):
+        self._indexes: dict[ListenerKey, FilterIndex] = {}
+
+    async def get(self, telegram_id: int, email_username: str) -> FilterIndex:
+        key = (telegram_id, email_username)
+        index = self._indexes.get(key)
+        if index is None or index.is_expired():
+            index = FilterIndex(await load_filter_rules(telegram_id, email_username))
+            self._indexes[key] = index
+        return index
+
+    def invalidate(self, telegram_id: int, email_username: str) -> None:
+        self._indexes.pop((telegram_id, email_username), None)
+
+
+filter_indexes = FilterIndexes()
@@ -0,0 +1,188 @@
+import fnmatch
+import re
+from typing import Iterable
+
+FILTER_SENDER = 'sender'
+FILTER_SENDER_GLOB = 'sender_glob'
+FILTER_SUBJECT = 'subject'
+FILTER_BODY = 'body'
+FILTER_HEADER_REGEX = 'header_regex'
+FILTER_TYPES = (FILTER_SENDER, FILTER_SENDER_GLOB, FILTER_SUBJECT, FILTER_BODY, FILTER_HEADER_REGEX)
+
+# Обратные ссылки ломаются при объединении выражений: номера групп сдвигаются
+BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+WORD_CHAR = re.compile(r'\w')
+QUANTIFIER = re.compile(r'\{(?=[\d,])(\d*)(,?)(\d*)\}')
+# Флаги внутри выражения: (?i:...) действует на группу, (?i) - на все выражение
+INLINE_FLAGS = re.compile(r'\(\?[aiLmsux]*(?:-[imsx]*)?([:)])')
+# Регулярные выражения по заголовкам проверяются в процессе слушателей без таймаута,
+# поэтому их длина и число повторений (*, +, {m,}, {m,n}) ограничены
+HEADER_REGEX_MAX_LENGTH = 200
+HEADER_REGEX_MAX_REPEATS = 2
+# Заголовки проверяются выражениями только по первым HEADER_MATCH_LENGTH символам
+HEADER_MATCH_LENGTH = 256
+
+
+def glob_to_regex(glob: str) -> str:
+    """
+    Шаблон адреса в регулярное выражение: * - любые символы, ? - один символ.
+    fnmatch.translate проверяет шаблон с несколькими * за линейное время.
+    """
+    # Квадратные скобки в адресе - обычные символы, а не набор символов fnmatch
+    return fnmatch.translate(glob.strip().lower().replace('[', '[[]'))
+
+
+def _trie_pattern(node: dict) -> str:
+    if '' in node:
+        # Ключевое слово закончилось: более длинные слова с тем же началом ничего не добавляют
+        return ''
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items())]
+    return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+
+def keywords_to_regex(keywords: Iterable[str]) -> str:
+    """
+    Ключевые слова в одно выражение, совпадающее с началом любого слова текста.
+
+    Слова собираются в префиксное дерево, и общие начала проверяются один раз,
+    как в автомате Ахо-Корасик, но обход выполняет движок re на C: 'скидк' и 'скидка'
+    дают одну ветку, а ключевое слово 'скидк' находит и 'скидки', и 'скидками'.
+    Граница слова проверяется только перед словами, начинающимися с буквы или цифры:
+    '#промо' и '$100' ищутся в любом месте текста.
+    """
+    trie: dict = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    branches = [(r'\b' if WORD_CHAR.match(char) else '') + re.escape(char) + _trie_pattern(child)
+                for char, child in sorted(trie.items())]
+    return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+
+def compile_regex_rules(patterns: Iterable[str], flags: int = 0) -> list[re.Pattern]:
+    """
+    Объединяет выражения в одно, чтобы текст проверялся за один проход. Выражения
+    с обратными ссылками и выражения, которые не объединяются (одинаковые имена групп,
+    флаги внутри выражения), компилируются отдельно.
+    """
+    combined, separate = [], []
+    for pattern in patterns:
+        (separate if BACKREFERENCE.search(pattern) else combined).append(pattern)
+
+    compiled = []
+    if combined:
+        try:
+            compiled.append(re.compile('|'.join(f'(?:{pattern})' for pattern in combined), flags))
+        except re.error:
+            separate.extend(combined)
+    compiled.extend(re.compile(pattern, flags) for pattern in separate)
+    return compiled
+
+
+def _skip_group_prefix(pattern: str, i: int) -> int:
+    """Возвращает позицию после начала группы: (, (?:, (?P<name>, (?=, (?<! и т.п."""
+
+    if not pattern.startswith('(?', i):
+        return i + 1
+    if pattern.startswith('(?P<', i):
+        return pattern.index('>', i) + 1
+    if pattern.startswith(('(?<=', '(?<!'), i):
+        return i + 4
+    if pattern.startswith('(?(', i):
+        raise ValueError('условные группы не поддерживаются')
+    flags = INLINE_FLAGS.match(pattern, i)
+    if flags:
+        # Выражение проверяется внутри группы (?:...), где флаги на все выражение недопустимы
+        if flags.group(1) == ')':
+            raise ValueError('флаги на все выражение, например (?i), не поддерживаются, используйте (?i:...)')
+        return flags.end()
+    return i + 3
+
+
+def check_header_regex(pattern: str) -> None:
+    """
+    Проверяет, что регулярное выражение по заголовкам не приводит к экспоненциальному
+    перебору. Запрещены обратные ссылки, повторение групп, внутри которых есть повторение
+    или альтернатива ((\\w+\\s?)+, (a|ab)*), больше HEADER_REGEX_MAX_REPEATS повторений
+    и флаги на все выражение ((?i)).
+    Генерирует ValueError.
+    """
+    if len(pattern) > HEADER_REGEX_MAX_LENGTH:
+        raise ValueError(f'длина выражения больше {HEADER_REGEX_MAX_LENGTH} символов')
+    if BACKREFERENCE.search(pattern):
+        raise ValueError('обратные ссылки не поддерживаются')
+
+    # Для каждой открытой группы: есть ли внутри повторение или альтернатива
+    groups = [False]
+    last = ''
+    repeats = 0
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        quantifier = QUANTIFIER.match(pattern, i) if char == '{' else None
+        if char == '\\':
+            i, last = i + 2, 'atom'
+            continue
+        if char == '[':
+            # ] сразу после [ или [^ - обычный символ набора
+            i += 2 if pattern.startswith('[^', i) else 1
+            i += pattern.startswith(']', i)
+            while pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+            i, last = i + 1, 'atom'
+            continue
+        if char == '(':
+            if pattern.startswith('(?#', i):
+                i = pattern.index(')', i) + 1
+                continue
+            groups.append(False)
+            i, last = _skip_group_prefix(pattern, i), ''
+            continue
+        if char == ')':
+            nested = groups.pop()
+            groups[-1] = groups[-1] or nested
+            i, last = i + 1, 'nested' if nested else 'atom'
+            continue
+        if char == '|':
+            groups[-1] = True
+            i, last = i + 1, ''
+            continue
+        if char in '*+?' or quantifier:
+            if quantifier:
+                low, comma, high = quantifier.groups()
+                repeating = bool(comma) and (not high or low != high)
+                i = quantifier.end()
+            else:
+                repeating = char != '?'
+                i += 1
+            if repeating and last == 'nested':
+                raise ValueError('повторение группы, внутри которой есть повторение или альтернатива')
+            if pattern.startswith('?', i):
+                i += 1
+            repeats += repeating
+            groups[-1] = True
+            last = 'quantifier'
+            continue
+        i, last = i + 1, 'atom'
+
+    if repeats > HEADER_REGEX_MAX_REPEATS:
+        raise ValueError(f'больше {HEADER_REGEX_MAX_REPEATS} повторений (*, +, {{m,}})')
+
+
+def validate_filter_rule(filter_type: str, filter_value: str) -> str:
+    """Проверяет правило фильтра и возвращает значение без пробелов по краям. Генерирует ValueError."""
+
+    if filter_type not in FILTER_TYPES:
+        raise ValueError(f'Неизвестный тип фильтра {filter_type!r}, доступны: {", ".join(FILTER_TYPES)}')
+    filter_value = filter_value.strip()
+    if not filter_value:
+        raise ValueError('Значение фильтра не может быть пустым')
+    if filter_type == FILTER_HEADER_REGEX:
+        try:
+            re.compile(filter_value)
+            check_header_regex(filter_value)
+        except (re.error, ValueError) as e:
+            raise ValueError(f'Некорректное регулярное выражение {filter_value!r}: {e}')
+    return filter_value
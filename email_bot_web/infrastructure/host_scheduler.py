@@ -0,0 +1,269 @@
+import asyncio
+import json
+import random
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from django.conf import settings
+from infrastructure.logger_config import logger
+
+
+def backoff_delay(attempt: int) -> float:
+    """Экспоненциальная задержка переподключения со случайным разбросом (full jitter)."""
+
+    delay = min(settings.IMAP_RECONNECT_MAX_DELAY, settings.IMAP_RECONNECT_BASE_DELAY * 2 ** attempt)
+    return random.uniform(settings.IMAP_RECONNECT_BASE_DELAY / 2, delay)
+
+
+class PollInterval:
+    """
+    Интервал опроса ящика на сервере без IDLE, подстраиваемый под частоту писем.
+
+    Опрос, нашедший новые письма, сокращает интервал вдвое (не ниже IMAP_POLL_MIN_INTERVAL),
+    пустой опрос увеличивает его в IMAP_POLL_BACKOFF_FACTOR раз (не выше IMAP_POLL_MAX_INTERVAL).
+    Тихие ящики опрашиваются редко, а в активных письма приходят с небольшой задержкой.
+    """
+
+    def __init__(self):
+        self.interval = settings.IMAP_POLL_MIN_INTERVAL
+
+    def update(self, has_new_messages: bool) -> float:
+        if has_new_messages:
+            self.interval = max(settings.IMAP_POLL_MIN_INTERVAL, self.interval / 2)
+        else:
+            self.interval = min(settings.IMAP_POLL_MAX_INTERVAL, self.interval * settings.IMAP_POLL_BACKOFF_FACTOR)
+        return self.interval
+
+
+class CircuitBreaker:
+    """
+    Предохранитель IMAP сервера.
+
+    После failure_threshold неудачных подключений подряд (от любых слушателей) сервер
+    считается недоступным, и переподключения приостанавливаются на cooldown секунд.
+    Затем пропускается одна пробная попытка: при успехе предохранитель замыкается
+    и все ожидающие слушатели продолжают работу, при ошибке пауза начинается заново.
+    """
+
+    def __init__(self, host: str, failure_threshold: int, cooldown: float):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = 0.0
+        self._closed = asyncio.Event()
+        self._closed.set()
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._closed.is_set():
+            return 'closed'
+        return 'half_open' if self._probing else 'open'
+
+    async def wait_available(self) -> None:
+        """Ждет, пока сервер считается доступным, или получает право на пробную попытку."""
+
+        loop = asyncio.get_running_loop()
+        while not self._closed.is_set():
+            remaining = self.opened_at + self.cooldown - loop.time()
+            if remaining <= 0:
+                # Следующая пробная попытка разрешается не раньше, чем через cooldown
+                self._probing = True
+                self.opened_at = loop.time()
+                return
+            try:
+                await asyncio.wait_for(self._closed.wait(), timeout=max(remaining, self.cooldown / 10, 1))
+            except asyncio.TimeoutError:
+                pass
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        if not self._closed.is_set():
+            logger.info(f'{self.host} - Сервер снова доступен, переподключения возобновлены')
+            self._closed.set()
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or (self._closed.is_set() and self.failures >= self.failure_threshold):
+            self._probing = False
+            self.opened_at = asyncio.get_running_loop().time()
+            if self._closed.is_set():
+                logger.error(f'{self.host} - Сервер недоступен ({self.failures} ошибок подряд), '
+                             f'переподключения приостановлены на {self.cooldown} с')
+            self._closed.clear()
+
+
+class IdleProfile:
+    """
+    Интервал обновления IDLE для IMAP сервера, подбираемый по поведению сервера.
+
+    Интервал начинается с min_timeout. Когда слушатели growth_after раз подряд доживают
+    до конца текущего интервала, он увеличивается в growth_factor раз, но не выше потолка
+    (max_timeout, по RFC 2177 - 29 минут). Если сервер разрывает сессию посреди IDLE,
+    интервал сокращается до половины прожитого сессией времени, а потолком роста
+    становится 80% этого времени.
+    """
+
+    def __init__(self, host: str, min_timeout: float, max_timeout: float):
+        self.host = host
+        self.min_timeout = min_timeout
+        self.timeout = min_timeout
+        self.ceiling = max(min_timeout, max_timeout)
+        self.successes = 0
+        self.refreshes = 0
+        self.drops = 0
+
+    def record_refresh(self, timeout: float) -> None:
+        """Сессия сохранилась весь интервал timeout и IDLE был обновлен."""
+
+        self.refreshes += 1
+        if timeout < self.timeout:
+            return
+        self.successes += 1
+        if self.successes >= settings.IMAP_IDLE_GROWTH_AFTER and self.timeout < self.ceiling:
+            self.successes = 0
+            self.timeout = min(self.ceiling, self.timeout * settings.IMAP_IDLE_GROWTH_FACTOR)
+            logger.info(f'{self.host} - Интервал обновления IDLE увеличен до {self.timeout:.0f} с')
+
+    def record_drop(self, elapsed: float) -> None:
+        """Сервер разорвал сессию через elapsed секунд после начала IDLE."""
+
+        self.drops += 1
+        self.successes = 0
+        # Разрыв вскоре после начала IDLE не связан с длиной интервала (перезапуск сервера, сеть)
+        if elapsed < self.min_timeout:
+            return
+        self.ceiling = max(self.min_timeout, min(self.ceiling, elapsed * 0.8))
+        timeout = max(self.min_timeout, min(self.timeout, elapsed / 2))
+        if timeout < self.timeout:
+            self.timeout = timeout
+            logger.warning(f'{self.host} - Сервер разорвал IDLE через {elapsed:.0f} с, '
+                           f'интервал обновления сокращен до {self.timeout:.0f} с')
+
+    def commands_saved_per_second(self, idle_connections: int) -> float:
+        """Сколько команд DONE/IDLE в секунду экономится по сравнению с обновлением каждые min_timeout."""
+
+        return idle_connections * 2 * (1 / self.min_timeout - 1 / self.timeout)
+
+
+class HostBudget:
+    """
+    Ограничения одного IMAP сервера: число одновременных соединений и частота авторизаций.
+
+    Ожидающие соединения и авторизации обслуживаются в порядке очереди.
+    """
+
+    def __init__(self, host: str, max_connections: int, logins_per_second: float,
+                 idle_min_timeout: float, idle_max_timeout: float):
+        self.host = host
+        self.max_connections = max_connections
+        self.login_interval = 1 / logins_per_second if logins_per_second > 0 else 0
+        self.active = 0
+        self.waiting = 0
+        self._connections = asyncio.Semaphore(max_connections) if max_connections > 0 else None
+        self._next_login_at = 0.0
+        self.breaker = CircuitBreaker(host, settings.IMAP_BREAKER_FAILURES, settings.IMAP_BREAKER_COOLDOWN)
+        self.idle_profile = IdleProfile(host, idle_min_timeout, idle_max_timeout)
+
+    async def acquire(self, name: str = '') -> None:
+        if self._connections:
+            if self._connections.locked():
+                logger.warning(f'{name or self.host} - Заняты все {self.max_connections} соединений с {self.host}, '
+                               f'ждем освобождения слота (в очереди: {self.waiting + 1})')
+            self.waiting += 1
+            try:
+                await self._connections.acquire()
+            finally:
+                self.waiting -= 1
+        self.active += 1
+
+    def release(self) -> None:
+        self.active -= 1
+        if self._connections:
+            self._connections.release()
+
+    async def wait_login_slot(self) -> None:
+        """Резервирует ближайшее разрешенное время авторизации и ждет его наступления."""
+
+        if not self.login_interval:
+            return
+        now = asyncio.get_running_loop().time()
+        login_at = max(now, self._next_login_at)
+        self._next_login_at = login_at + self.login_interval
+        if login_at > now:
+            await asyncio.sleep(login_at - now)
+
+
+class HostScheduler:
+    """
+    Планировщик подключений к IMAP серверам, ключ - адрес сервера (EmailService.address).
+
+    Лимиты по умолчанию задаются IMAP_HOST_MAX_CONNECTIONS, IMAP_HOST_LOGINS_PER_SECOND,
+    IMAP_IDLE_MIN_TIMEOUT и IMAP_IDLE_MAX_TIMEOUT, для отдельных серверов их можно
+    переопределить в IMAP_HOST_LIMITS (JSON), например
+    {"imap.mail.ru": {"max_connections": 200, "idle_max_timeout": 600}}.
+    """
+
+    def __init__(self):
+        self._budgets: dict[str, HostBudget] = {}
+        self._overrides: dict[str, dict] | None = None
+
+    def get_overrides(self) -> dict[str, dict]:
+        if self._overrides is None:
+            try:
+                self._overrides = json.loads(settings.IMAP_HOST_LIMITS) if settings.IMAP_HOST_LIMITS else {}
+            except ValueError as e:
+                logger.error(f'Некорректное значение IMAP_HOST_LIMITS: {e}')
+                self._overrides = {}
+        return self._overrides
+
+    def get_budget(self, host: str) -> HostBudget:
+        budget = self._budgets.get(host)
+        if budget is None:
+            limits = self.get_overrides().get(host, {})
+            budget = self._budgets[host] = HostBudget(
+                host,
+                max_connections=int(limits.get('max_connections', settings.IMAP_HOST_MAX_CONNECTIONS)),
+                logins_per_second=float(limits.get('logins_per_second', settings.IMAP_HOST_LOGINS_PER_SECOND)),
+                idle_min_timeout=float(limits.get('idle_min_timeout', settings.IMAP_IDLE_MIN_TIMEOUT)),
+                idle_max_timeout=float(limits.get('idle_max_timeout', settings.IMAP_IDLE_MAX_TIMEOUT)),
+            )
+        return budget
+
+    @asynccontextmanager
+    async def connection(self, host: str, name: str = '') -> AsyncIterator[HostBudget]:
+        """Занимает слот соединения с сервером на время работы слушателя name."""
+
+        budget = self.get_budget(host)
+        await budget.acquire(name)
+        try:
+            yield budget
+        finally:
+            budget.release()
+
+    async def wait_login_slot(self, host: str) -> None:
+        await self.get_budget(host).wait_login_slot()
+
+    def get_breaker(self, host: str) -> CircuitBreaker:
+        return self.get_budget(host).breaker
+
+    def get_idle_profile(self, host: str) -> IdleProfile:
+        return self.get_budget(host).idle_profile
+
+    def stats(self) -> dict[str, dict[str, int | float | str]]:
+        return {host: {'active': budget.active, 'waiting': budget.waiting, 'max_connections': budget.max_connections,
+                       'breaker': budget.breaker.state,
+                       'idle_timeout': round(budget.idle_profile.timeout),
+                       'idle_refreshes': budget.idle_profile.refreshes,
+                       'idle_drops': budget.idle_profile.drops,
+                       'idle_commands_saved_per_second': round(
+                           budget.idle_profile.commands_saved_per_second(budget.active), 2)}
+                for host, budget in self._budgets.items()}
+
+    def commands_saved_per_second(self) -> float:
+        return sum(budget.idle_profile.commands_saved_per_second(budget.active) for budget in self._budgets.values())
+
+
+host_scheduler = HostScheduler()
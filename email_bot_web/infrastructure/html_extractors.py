@@ -0,0 +1,187 @@
+import re
+from html import unescape
+from html.parser import HTMLParser
+from typing import Callable
+
+from bs4 import BeautifulSoup
+from bs4.builder import HTMLTreeBuilder
+from bs4.dammit import EntitySubstitution
+from django.conf import settings
+
+IMAGE_PLACEHOLDER = 'картинка'
+# Текст внутри этих тегов BeautifulSoup не включает в get_text (script, style, template, rt, rp)
+HIDDEN_TEXT_TAGS = frozenset(HTMLTreeBuilder.DEFAULT_STRING_CONTAINERS)
+VOID_TAGS = frozenset(HTMLTreeBuilder.DEFAULT_EMPTY_ELEMENT_TAGS)
+PRESERVE_WHITESPACE_TAGS = frozenset(HTMLTreeBuilder.DEFAULT_PRESERVE_WHITESPACE_TAGS)
+ASCII_SPACES = BeautifulSoup.ASCII_SPACES
+# Числовая ссылка без точки с запятой: число и следующий за ним обычный текст
+DECIMAL_REFERENCE = re.compile(r'([0-9]+)(.*)', re.DOTALL)
+HEX_REFERENCE = re.compile(r'([0-9a-f]+)(.*)', re.DOTALL)
+
+
+def dereference_charref(name: str) -> tuple[str, str]:
+    """
+    Разбирает числовую ссылку &#name; так же, как BeautifulSoup: символы 128-159 берутся
+    из windows-1252 (&#128; -> '€'), недопустимые номера заменяются на U+FFFD.
+
+    Возвращает символ и текст после числа, который к ссылке не относится.
+    """
+
+    base, pattern, digits = (16, HEX_REFERENCE, name[1:]) if name[:1] in 'xX' else (10, DECIMAL_REFERENCE, name)
+    extra_data = ''
+    try:
+        code = int(digits, base)
+    except ValueError:
+        match = pattern.match(digits)
+        if match is None:
+            return '', digits
+        code, extra_data = int(match.group(1), base), match.group(2)
+    # html.unescape отбрасывает управляющие символы и несимволы, BeautifulSoup оставляет их как есть
+    return unescape(f'&#{code};') or chr(code), extra_data
+
+
+def extract_text_soup(html: str) -> str:
+    """Текст письма через дерево BeautifulSoup: ссылки удаляются, изображения заменяются на 'картинка'."""
+
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Удаляем все теги (ссылки)
+    for a in soup.find_all('a'):
+        a.decompose()
+
+    # Удаляем все теги <img> (изображения) и заменяем их на текст "картинка"
+    for img in soup.find_all('img'):
+        img.replace_with(IMAGE_PLACEHOLDER)
+
+    return soup.get_text().strip()
+
+
+class TextExtractor(HTMLParser):
+    """
+    Потоковое извлечение текста из HTML без построения дерева.
+
+    Разбирает разметку тем же html.parser, что и BeautifulSoup, и повторяет правила
+    его дерева: закрывающий тег закрывает все теги до последнего открытого с тем же именем,
+    строки из одних пробелов сворачиваются в пробел или перевод строки (кроме pre и textarea),
+    текст script, style, template, rt и rp, комментарии и объявления пропускаются.
+    Поэтому результат совпадает с extract_text_soup, но в разы быстрее.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack: list[str] = []
+        self.open_tags: dict[str, int] = {}
+        self.already_closed_void_tags: list[str] = []
+        self.current_data: list[str] = []
+        self.parts: list[str] = []
+
+    def flush(self, cdata: bool = False) -> None:
+        """Завершает текущую строку текста и добавляет ее в результат, если она видима."""
+
+        if not self.current_data:
+            return
+        data = ''.join(self.current_data)
+        self.current_data = []
+        if not self.open_tags.get('a') and (cdata or self._visible()):
+            if not any(self.open_tags.get(tag) for tag in PRESERVE_WHITESPACE_TAGS) and not data.strip(ASCII_SPACES):
+                data = '\n' if '\n' in data else ' '
+            self.parts.append(data)
+
+    def _visible(self) -> bool:
+        for tag in reversed(self.stack):
+            if tag in HIDDEN_TEXT_TAGS:
+                return False
+        return True
+
+    def push(self, tag: str) -> None:
+        self.flush()
+        self.stack.append(tag)
+        self.open_tags[tag] = self.open_tags.get(tag, 0) + 1
+        if tag == 'img' and not self.open_tags.get('a'):
+            self.parts.append(IMAGE_PLACEHOLDER)
+
+    def pop_to(self, tag: str) -> None:
+        self.flush()
+        if not self.open_tags.get(tag):
+            return
+        while self.stack:
+            popped = self.stack.pop()
+            self.open_tags[popped] -= 1
+            if popped == tag:
+                break
+
+    def handle_starttag(self, tag: str, attrs: list, handle_void: bool = True) -> None:
+        self.push(tag)
+        if handle_void and tag in VOID_TAGS:
+            self.pop_to(tag)
+            self.already_closed_void_tags.append(tag)
+
+    def handle_startendtag(self, tag: str, attrs: list) -> None:
+        self.handle_starttag(tag, attrs, handle_void=False)
+        self.pop_to(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self.already_closed_void_tags:
+            self.already_closed_void_tags.remove(tag)
+        else:
+            self.pop_to(tag)
+
+    def handle_data(self, data: str) -> None:
+        self.current_data.append(data)
+
+    def handle_charref(self, name: str) -> None:
+        self.current_data.extend(dereference_charref(name))
+
+    def handle_entityref(self, name: str) -> None:
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.current_data.append(character if character is not None else f'&{name}')
+
+    def handle_comment(self, data: str) -> None:
+        self.flush()
+
+    def handle_decl(self, decl: str) -> None:
+        self.flush()
+
+    def handle_pi(self, data: str) -> None:
+        self.flush()
+
+    def unknown_decl(self, data: str) -> None:
+        self.flush()
+        if data.upper().startswith('CDATA['):
+            # CDATA входит в текст даже внутри script и style
+            self.current_data.append(data[len('CDATA['):])
+            self.flush(cdata=True)
+
+    def extract(self, html: str) -> str:
+        self.feed(html)
+        self.close()
+        self.flush()
+        return ''.join(self.parts).strip()
+
+
+def extract_text_stream(html: str) -> str:
+    """Текст письма потоковым разбором, результат совпадает с extract_text_soup."""
+
+    return TextExtractor().extract(html)
+
+
+HTML_EXTRACTORS: dict[str, Callable[[str], str]] = {
+    'soup': extract_text_soup,
+    'stream': extract_text_stream,
+}
+
+
+def get_html_extractor(name: str | None = None) -> Callable[[str], str]:
+    """Возвращает функцию извлечения текста из HTML, выбранную в EMAIL_HTML_EXTRACTOR."""
+
+    name = name or settings.EMAIL_HTML_EXTRACTOR
+    try:
+        return HTML_EXTRACTORS[name]
+    except KeyError:
+        raise ValueError(f'Неизвестный EMAIL_HTML_EXTRACTOR {name!r}, доступны: {", ".join(HTML_EXTRACTORS)}')
+
+
+def extract_email_text(html: str) -> str:
+    """Текст письма без разметки в одну строку, для проверки ключевых слов текста письма."""
+
+    return ' '.join(get_html_extractor()(html).split())
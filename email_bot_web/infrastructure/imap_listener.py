@@ -1,45 +1,101 @@
 import asyncio
 import json
+import math
 import os
+import random
 import re
+import time
 from asyncio import CancelledError, TimeoutError, wait_for
-from collections import namedtuple
 from email.header import decode_header
 from email.message import Message
 from email.parser import BytesHeaderParser, BytesParser
-from typing import Callable, Collection
+from typing import Any, Callable, Collection
 
 import aioimaplib
-from api.repositories.repositories import EmailBoxRepository, EmailServiceRepository
-from bs4 import BeautifulSoup
+from api.repositories.repositories import EmailBoxRepository, WatchedFolderRepository
 from crypto.crypto_utils import PasswordCipher
-from email_service.models import EmailBox
+from django.conf import settings
+from email_service.models import EmailBox, WatchedFolder
 from email_service.schema import ImapEmailModel
-from infrastructure.email_processor import process_email
-from infrastructure.exceptions import EmailCredentialsError
+from infrastructure.bodystructure import (
+    decode_part,
+    estimate_decoded_size,
+    format_attachment,
+    select_parts,
+)
+from infrastructure.box_leases import box_leases
+from infrastructure.decode_pool import decode_pool
+from infrastructure.email_dedup import delivery_dedup
+from infrastructure.email_processor import (
+    find_matching_sender,
+    process_email,
+    seen_flags,
+)
+from infrastructure.exceptions import EmailCredentialsError, EmailLoginUnavailableError
+from infrastructure.filter_index import FilterIndex, filter_indexes
+from infrastructure.host_scheduler import (
+    IdleProfile,
+    PollInterval,
+    backoff_delay,
+    host_scheduler,
+)
+from infrastructure.html_extractors import get_html_extractor
+from infrastructure.imap_compression import DeflateCompression, enable_compression
+from infrastructure.imap_utils import (
+    encode_mailbox_name,
+    format_uid_set,
+    iter_fetch_items,
+    iter_fetch_messages,
+    notify_set,
+    parse_status_responses,
+)
+from infrastructure.listener_manager import listener_manager
 from infrastructure.logger_config import logger
+from infrastructure.loop_monitor import loop_lag_monitor
 from infrastructure.tools import redis_client
 
 ID_HEADER_SET = {'Content-Type', 'From', 'To', 'Cc', 'Bcc', 'Date', 'Subject',
                  'Message-ID', 'In-Reply-To', 'References'}
-FETCH_MESSAGE_DATA_UID = re.compile(rb'.*UID (?P<uid>\d+).*')
-FETCH_MESSAGE_DATA_SEQNUM = re.compile(rb'(?P<seqnum>\d+) FETCH.*')
-FETCH_MESSAGE_DATA_FLAGS = re.compile(rb'.*FLAGS \((?P<flags>.*?)\).*')
-MessageAttributes = namedtuple('MessageAttributes', 'uid flags sequence_number')
+SELECT_UIDVALIDITY = re.compile(rb'\[UIDVALIDITY (?P<uidvalidity>\d+)\]')
+SELECT_UIDNEXT = re.compile(rb'\[UIDNEXT (?P<uidnext>\d+)\]')
+SEARCH_RESPONSE = re.compile(rb'(SEARCH)?(?P<uids>[\d ]*)')
 
-email_domain_repo = EmailServiceRepository
 email_repo = EmailBoxRepository
+folder_repo = WatchedFolderRepository
 
 MAX_RETRIES = 5
 RETRY_DELAY = 5
+STOP_TIMEOUT = 30
+CANCEL_TIMEOUT = 5
+# Запас ожидания ответа сервера сверх интервала обновления IDLE
+IDLE_PUSH_MARGIN = 60
+# Ошибки связи с сервером: только они считаются отказами сервера в предохранителе
+NETWORK_ERRORS = (OSError, TimeoutError, aioimaplib.Abort, aioimaplib.CommandTimeout)
+# Коды ответа RFC 5530, с которыми сервер временно отклоняет LOGIN при верных учетных данных
+TEMPORARY_LOGIN_CODES = re.compile(rb'\[(?:UNAVAILABLE|LIMIT|INUSE|SERVERBUG)\b', re.IGNORECASE)
+
+
+def is_temporary_login_failure(response: aioimaplib.Response) -> bool:
+    return any(TEMPORARY_LOGIN_CODES.search(line if isinstance(line, bytes) else line.encode())
+               for line in response.lines)
 
 
 class EmailDecoder:
     @staticmethod
     def decode_header_content(header_content: str) -> str:
-        decoded_content = decode_header(header_content)
-        return ''.join(
-            [text.decode(charset or 'utf-8') if isinstance(text, bytes) else text for text, charset in decoded_content])
+        """
+        Декодирует заголовок письма. Неизвестная кодировка (=?unknown-8bit?...?=) и некорректные
+        байты заменяются, чтобы одно письмо не останавливало обработку ящика.
+        """
+        parts = []
+        for text, charset in decode_header(header_content):
+            if isinstance(text, bytes):
+                try:
+                    text = text.decode(charset or 'utf-8', errors='replace')
+                except LookupError:
+                    text = text.decode('utf-8', errors='replace')
+            parts.append(text)
+        return ''.join(parts)
 
     @staticmethod
     def get_email_body(email_obj: Message) -> str:
@@ -93,48 +149,101 @@ class EmailDecoder:
         return self.decode_header_content(email_obj['Date'])
 
     @staticmethod
-    def clean_email_body(body_part: str) -> str:
-        soup = BeautifulSoup(body_part, 'html.parser')
+    def get_email_message_id(email_obj: Message) -> str:
+        return str(email_obj['Message-ID'] or '').strip()
 
-        # Удаляем все теги (ссылки)
-        for a in soup.find_all('a'):
-            a.decompose()
-
-        # Удаляем все теги <img> (изображения) и заменяем их на текст "картинка"
-        for img in soup.find_all('img'):
-            img.replace_with('картинка')
+    @staticmethod
+    def clean_email_body(body_part: str) -> str:
+        """Извлекает текст из HTML: ссылки удаляются, изображения заменяются на 'картинка' (EMAIL_HTML_EXTRACTOR)."""
 
-        return soup.get_text().strip()
+        return get_html_extractor()(body_part)
 
     @staticmethod
     def clean_excessive_newlines(text: str) -> str:
         return ' '.join(text.split())
 
-    def get_cleaned_email_details(self, email_obj: Message) -> dict[str, str]:
-        body = self.get_email_body(email_obj)
+    def get_email_attachments(self, email_obj: Message) -> list[str]:
+        """Возвращает имена и размеры вложений письма без декодирования их содержимого."""
+
+        attachments = []
+        for part in email_obj.walk():
+            filename = part.get_filename()
+            if filename:
+                payload = part.get_payload()
+                size = len(payload) if isinstance(payload, str) else 0
+                if part.get('Content-Transfer-Encoding', '').lower() == 'base64':
+                    size = size * 3 // 4
+                attachments.append(format_attachment(self.decode_header_content(filename), size))
+        return attachments
+
+    def get_cleaned_email_details(self, email_obj: Message, body: str | None = None,
+                                  attachments: list[str] | None = None) -> dict[str, Any]:
+        """
+        Собирает данные письма. Если тело и вложения уже получены частичной загрузкой,
+        email_obj может содержать только заголовки.
+        """
+        if body is None:
+            body = self.get_email_body(email_obj)
+        if attachments is None:
+            attachments = self.get_email_attachments(email_obj)
         body = self.clean_excessive_newlines(body)
         subject = self.get_email_subject(email_obj)
         sender = self.get_email_sender(email_obj)
         recipient = self.get_email_recipient(email_obj)
         date = self.get_email_date(email_obj)
+        message_id = self.get_email_message_id(email_obj)
         return {
             'body': body,
             'subject': subject,
             'sender': sender,
             'recipient': recipient,
-            'date': date
+            'date': date,
+            'attachments': attachments,
+            'message_id': message_id
         }
 
 
+def decode_email(data: bytes | Message, body: str | None = None,
+                 attachments: list[str] | None = None) -> dict[str, Any]:
+    """
+    Разбирает письмо и собирает его данные. Выполняется в decode_pool, поэтому принимает
+    исходные байты письма (или уже разобранные заголовки при частичной загрузке).
+    """
+    message = BytesParser().parsebytes(data) if isinstance(data, bytes) else data
+    return EmailDecoder().get_cleaned_email_details(message, body=body, attachments=attachments)
+
+
 class IMAPClient(EmailDecoder):
-    def __init__(self, host: str, user: str, password: str, telegram_id: int, callback: Callable | None = None):
+    def __init__(self, host: str, user: str, password: str, telegram_id: int, callback: Callable | None = None,
+                 header_filter: Callable | None = None):
         self.host = host
         self.user = user
         self.telegram_id = telegram_id
         self.password = password
-        self.persistent_max_uid = 1
+        self.persistent_max_uid = 0
+        self.handled_uid = 0
+        self.uid_validity: int | None = None
+        self.uid_state_loaded = False
         self.should_stop = False
+        self.stop_event = asyncio.Event()
+        self.state = 'created'
+        self.ready = asyncio.Event()
+        self.connection: aioimaplib.IMAP4_SSL | None = None
+        self.connection_lost = False
+        self.verified_session: aioimaplib.IMAP4_SSL | None = None
+        self.compression: DeflateCompression | None = None
+        self.polling = False
+        self.poll_interval = PollInterval()
+        self.idle_failures = 0
+        self.folders: list[WatchedFolder] = []
+        self.selected_folder: WatchedFolder | None = None
+        self.notify_active = False
+        self.folders_checked_at = 0.0
         self.callback = callback
+        self.header_filter = header_filter
+        self.server_search = settings.IMAP_SERVER_SEARCH
+        self.search_filter_index: FilterIndex | None = None
+        self.search_criteria: list[str] = []
 
     @staticmethod
     def extract_email(encoded_str: str) -> str | None:
@@ -149,51 +258,175 @@ class IMAPClient(EmailDecoder):
 
         return email_address
 
-    def stop_listening(self):
+    async def stop_listening(self):
+        """Помечает клиент на остановку и прерывает текущее ожидание в режиме IDLE."""
+
         self.should_stop = True
+        self.stop_event.set()
+        if self.connection:
+            await self.connection.stop_wait_server_push()
+
+    @staticmethod
+    def build_search_criteria(search_keys: Collection[tuple[str, str]]) -> list[str]:
+        """
+        Формирует критерий SEARCH, совпадающий с письмами, подходящими под любой из ключей.
+
+        OR в IMAP бинарный и префиксный, поэтому для ключей (FROM, a), (FROM, b), (SUBJECT, c)
+        получается OR FROM "a" OR FROM "b" SUBJECT "c".
+        """
+        criteria = ['OR'] * (len(search_keys) - 1)
+        for key, value in search_keys:
+            criteria.extend([key, aioimaplib.quoted(value)])
+        return criteria
+
+    async def search_matching_uids(self, imap_client: aioimaplib.IMAP4_SSL, max_uid: int) -> list[int] | None:
+        """
+        Ищет на сервере новые письма, подходящие под фильтры ящика, командой
+        UID SEARCH UID n:* OR FROM a OR SUBJECT b ...
+
+        Критерий пересобирается только при изменении фильтров. Возвращает None, если
+        фильтры ящика не выражаются поиском IMAP (шаблоны, регулярные выражения), или если
+        сервер не поддерживает такой поиск - тогда поиск отключается для этого ящика.
+        """
+        filter_index = await filter_indexes.get(self.telegram_id, self.user)
+        if not filter_index:
+            return []
+        if filter_index.search_keys is None:
+            return None
+        if filter_index is not self.search_filter_index:
+            self.search_filter_index = filter_index
+            self.search_criteria = self.build_search_criteria(filter_index.search_keys)
+
+        charset = None if all(value.isascii() for _, value in filter_index.search_keys) else 'utf-8'
+        response = await imap_client.uid_search('UID', '%d:*' % (max_uid + 1), *self.search_criteria,
+                                                charset=charset)
+        if response.result != 'OK':
+            logger.warning(f'{self.user} - Сервер не поддерживает поиск по отправителям ({response}), '
+                           f'переходим на фильтрацию по заголовкам')
+            self.server_search = False
+            return None
+
+        return sorted(uid for uid in self.extract_search_uids(response) if uid > max_uid)
+
+    @staticmethod
+    def extract_search_uids(response: aioimaplib.Response) -> list[int]:
+        uids = []
+        for line in response.lines:
+            match_result = SEARCH_RESPONSE.fullmatch(line) if isinstance(line, bytes) else None
+            if match_result:
+                uids.extend(int(uid) for uid in match_result.group('uids').split())
+        return uids
+
+    @staticmethod
+    def extract_response_code(response: aioimaplib.Response, pattern: re.Pattern) -> int | None:
+        """Извлекает числовое значение кода ответа (например, [UIDVALIDITY n]) из ответа сервера."""
+
+        for line in response.lines:
+            if isinstance(line, bytes):
+                match_result = pattern.search(line)
+                if match_result:
+                    return int(match_result.group(1))
+        return None
+
+    async def fetch_last_uid(self, imap_client: aioimaplib.IMAP4_SSL) -> int:
+        """Возвращает UID последнего письма в выбранной папке."""
+
+        response = await imap_client.uid('fetch', '*', '(UID)')
+        last_uid = 0
+        if response.result == 'OK':
+            last_uid = max((uid for uid, _ in iter_fetch_items(response.lines)), default=0)
+        return last_uid
+
+    async def save_uid_state(self) -> None:
+        """Сохраняет UIDVALIDITY и последний обработанный UID почтового ящика."""
+
+        await email_repo.set_uid_state(self.telegram_id, self.user, self.uid_validity, self.persistent_max_uid)
+
+    async def advance_max_uid(self, last_uid: int) -> None:
+        """Сдвигает последний обработанный UID выбранной папки вперед и сохраняет его."""
+
+        folder = self.selected_folder
+        if folder:
+            if last_uid > folder.last_uid:
+                folder.last_uid = last_uid
+                await folder_repo.set_uid_state(folder.id, folder.uid_validity, folder.last_uid)
+        elif last_uid > self.persistent_max_uid:
+            self.persistent_max_uid = last_uid
+            await self.save_uid_state()
+
+    def set_uid_state(self, uid_validity: int | None, last_uid: int) -> None:
+        """Задает сохраненное состояние UID, чтобы не запрашивать его из базы при подключении."""
+
+        self.uid_validity, self.persistent_max_uid = uid_validity, last_uid
+        self.handled_uid = 0
+        self.uid_state_loaded = True
+
+    async def select_inbox(self, imap_client: aioimaplib.IMAP4_SSL) -> None:
+        """
+        Выбирает папку INBOX и сверяет сохраненное состояние UID с UIDVALIDITY сервера.
+
+        Если UIDVALIDITY совпадает, прослушивание продолжается с last_uid + 1.
+        Иначе выполняется дешевая ресинхронизация: базовой точкой становится UIDNEXT - 1,
+        без выгрузки заголовков всей папки.
+        """
+        logger.info(f'{self.user} - Выбор папки INBOX...')
+        response = await imap_client.select('INBOX')
+        uid_validity = self.extract_response_code(response, SELECT_UIDVALIDITY)
+
+        if not self.uid_state_loaded:
+            self.uid_validity, self.persistent_max_uid = await email_repo.get_uid_state(self.telegram_id, self.user)
+            self.uid_state_loaded = True
+
+        # last_uid = 0 тоже валидная точка продолжения: ящик был пуст при прошлом подключении
+        if self.uid_validity is not None and uid_validity == self.uid_validity:
+            logger.info(f'{self.user} - Продолжаем прослушивание с UID {self.persistent_max_uid + 1}')
+            return
+
+        uid_next = self.extract_response_code(response, SELECT_UIDNEXT)
+        last_uid = uid_next - 1 if uid_next else await self.fetch_last_uid(imap_client)
+        logger.info(f'{self.user} - Ресинхронизация UID (UIDVALIDITY {self.uid_validity} -> {uid_validity}), '
+                    f'базовый UID {last_uid}')
+        self.uid_validity = uid_validity
+        self.persistent_max_uid = last_uid
+        self.handled_uid = 0
+        await self.save_uid_state()
 
     async def fetch_messages_headers(self, imap_client: aioimaplib.IMAP4_SSL, max_uid: int) -> int:
+        """Находит все новые письма с UID больше max_uid, обрабатывает их и возвращает новый максимальный UID."""
+
         for attempt in range(MAX_RETRIES):
             try:
-                response = await imap_client.uid('fetch', '%d:*' % max_uid,
+                uid_set = '%d:*' % (max_uid + 1)
+                if self.header_filter and self.server_search:
+                    matching_uids = await self.search_matching_uids(imap_client, max_uid)
+                    if matching_uids == []:
+                        return max_uid
+                    if matching_uids:
+                        uid_set = format_uid_set(matching_uids)
+
+                # Сервер возвращает последнее письмо даже если новых нет, поэтому UID <= max_uid отбрасываются
+                response = await imap_client.uid('fetch', uid_set,
                                                  '(UID FLAGS BODY.PEEK[HEADER.FIELDS (%s)])' % ' '.join(ID_HEADER_SET))
-                new_max_uid = max_uid
-                last_message_headers = None
-                if response.result == 'OK':
-                    uids_in_response = []
-                    for i in range(0, len(response.lines) - 1, 3):
-                        fetch_command_without_literal = b'%s %s' % (response.lines[i], response.lines[i + 2])
-                        match_result = FETCH_MESSAGE_DATA_UID.match(fetch_command_without_literal)
-                        uid = 0
-                        if match_result:
-                            uid = int(match_result.group('uid'))
-                            uids_in_response.append(uid)
-
-                        if uid > max_uid:
-                            last_message_headers = BytesHeaderParser().parsebytes(response.lines[i + 1])
-                            new_max_uid = uid
-
-                    if max_uid not in uids_in_response:
-                        if uids_in_response:
-                            new_max_uid = max(uids_in_response)
-                        else:
-                            new_max_uid = 0
-                    if last_message_headers:
-                        email_details = await self.fetch_message_details(imap_client, new_max_uid)
-                        formatted_email_dict = self.format_email(email_details)
-                        email_object = ImapEmailModel(**formatted_email_dict)
+                if response.result != 'OK':
+                    logger.error(f'error {response}')
+                    return max_uid
 
-                        if self.callback:
-                            await process_email(email_object,
-                                                telegram_id=self.telegram_id,
-                                                email_username=self.user,
-                                                imap_client=imap_client,
-                                                uid=new_max_uid)
-                    else:
-                        logger.error(f'error {response}')
-                    return new_max_uid
+                new_messages_headers = {}
+                for message in iter_fetch_messages(response.lines):
+                    if message.uid > max_uid:
+                        new_messages_headers[message.uid] = BytesHeaderParser().parsebytes(message.data or b'')
+
+                uids_to_process = await self.filter_by_headers(new_messages_headers)
+                if uids_to_process:
+                    stopped_at = await self.process_new_messages(
+                        imap_client, {uid: new_messages_headers[uid] for uid in uids_to_process})
+                    if stopped_at is not None:
+                        return stopped_at
+                return max(new_messages_headers, default=max_uid)
 
             except aioimaplib.aioimaplib.CommandTimeout:
+                # Письма, переданные в обработку до таймаута, не должны загружаться и отправляться повторно
+                max_uid = max(max_uid, self.handled_uid)
                 logger.error(
                     f'CommandTimeout error when fetching messages for UID {max_uid}. Attempt {attempt + 1} of {MAX_RETRIES}.')
                 if attempt < MAX_RETRIES - 1:
@@ -203,10 +436,144 @@ class IMAPClient(EmailDecoder):
                     return max_uid
         return max_uid
 
+    async def filter_by_headers(self, messages_headers: dict[int, Message]) -> list[int]:
+        """
+        Отбирает UID писем, которые нужно загрузить целиком.
+
+        Решение принимается по уже полученным заголовкам, поэтому тела писем,
+        не подходящих под фильтры ящика, не скачиваются и не декодируются.
+        """
+        if not self.header_filter:
+            return sorted(messages_headers)
+
+        uids_to_process = []
+        for uid, headers in sorted(messages_headers.items()):
+            if headers['from'] and await self.header_filter(self.get_email_sender(headers),
+                                                            telegram_id=self.telegram_id,
+                                                            email_username=self.user,
+                                                            to=self.decode_header_content(headers['to'] or ''),
+                                                            subject=self.decode_header_content(headers['subject'] or '')):
+                uids_to_process.append(uid)
+
+        if messages_headers:
+            logger.info(f'{self.user} - Новых писем: {len(messages_headers)}, '
+                        f'подходят под фильтры: {len(uids_to_process)}')
+        return uids_to_process
+
+    async def process_new_messages(self, imap_client: aioimaplib.IMAP4_SSL,
+                                   messages_headers: dict[int, Message]) -> int | None:
+        """
+        Загружает тела новых писем пачками по IMAP_FETCH_BATCH_SIZE UID за один UID FETCH
+        и передает каждое письмо в обработчик.
+
+        При IMAP_PARTIAL_FETCH загружается только текстовая часть письма по BODYSTRUCTURE.
+        Большие письма разбираются в decode_pool, чтобы не задерживать остальные ящики.
+        После каждой пачки письма, отмеченные обработчиком, помечаются прочитанными
+        одной командой STORE (seen_flags), и последний обработанный UID сохраняется. Если слушатель останавливается,
+        следующая пачка не загружается и возвращается UID, до которого письма обработаны,
+        остальные письма обработает следующий запуск.
+        """
+        started_at = time.perf_counter()
+        uids = sorted(messages_headers)
+
+        for i in range(0, len(uids), settings.IMAP_FETCH_BATCH_SIZE):
+            batch_uids = uids[i:i + settings.IMAP_FETCH_BATCH_SIZE]
+            if settings.IMAP_PARTIAL_FETCH:
+                messages = await self.fetch_messages_by_structure(
+                    imap_client, {uid: messages_headers[uid] for uid in batch_uids})
+            else:
+                messages = {uid: (raw_message, None, None)
+                            for uid, raw_message in (await self.fetch_messages(imap_client, batch_uids)).items()}
+
+            try:
+                for uid, (message, body, attachments) in messages.items():
+                    try:
+                        size = len(message) if isinstance(message, bytes) else len(body or '')
+                        email_details = await decode_pool.run(size, decode_email, message, body, attachments)
+                        email_object = ImapEmailModel(**self.format_email(email_details))
+                        if self.callback:
+                            await self.callback(email_object,
+                                                telegram_id=self.telegram_id,
+                                                email_username=self.user,
+                                                imap_client=imap_client,
+                                                uid=uid)
+                    except Exception as e:
+                        logger.error(f'{self.user} - Ошибка обработки письма UID {uid}: {e}')
+                    self.handled_uid = uid
+            finally:
+                # Отмеченные обработчиком письма пачки помечаются прочитанными одной командой
+                await seen_flags.flush(imap_client)
+
+            await self.advance_max_uid(batch_uids[-1])
+            if self.should_stop and batch_uids[-1] != uids[-1]:
+                logger.info(f'{self.user} - Остановка: письма обработаны до UID {batch_uids[-1]}, '
+                            f'остальные будут обработаны при следующем запуске')
+                return batch_uids[-1]
+
+        elapsed = time.perf_counter() - started_at
+        logger.info(f'{self.user} - Обработано писем: {len(uids)} за {elapsed:.3f} с '
+                    f'({elapsed / len(uids) * 1000:.2f} мс на письмо)')
+        return None
+
+    @staticmethod
+    async def fetch_messages(imap_client: aioimaplib.IMAP4_SSL, uids: list[int]) -> dict[int, bytes]:
+        """Загружает письма с указанными UID одной командой UID FETCH и возвращает их без разбора."""
+
+        response = await imap_client.uid('fetch', format_uid_set(uids), '(UID BODY.PEEK[])')
+        messages = {}
+        if response.result == 'OK':
+            for message in iter_fetch_messages(response.lines):
+                if message.data is not None:
+                    messages[message.uid] = message.data
+        return messages
+
+    async def fetch_messages_by_structure(
+            self, imap_client: aioimaplib.IMAP4_SSL, messages_headers: dict[int, Message]
+    ) -> dict[int, tuple[Message, str, list[str]]]:
+        """
+        Загружает только текстовую часть писем, не скачивая вложения.
+
+        Сначала одной командой запрашивается BODYSTRUCTURE всех писем пачки, затем
+        для каждой найденной секции - BODY.PEEK[<секция>]<0.IMAP_BODY_MAX_BYTES>.
+        Имена и размеры вложений берутся из BODYSTRUCTURE.
+        """
+        response = await imap_client.uid('fetch', format_uid_set(messages_headers), '(UID BODYSTRUCTURE)')
+        if response.result != 'OK':
+            logger.error(f'{self.user} - Ошибка получения BODYSTRUCTURE: {response}')
+            return {}
+
+        text_parts = {}
+        messages = {}
+        for uid, attributes in iter_fetch_items(response.lines):
+            if uid not in messages_headers or not isinstance(attributes.get(b'BODYSTRUCTURE'), list):
+                continue
+            text_part, attachment_parts = select_parts(attributes[b'BODYSTRUCTURE'])
+            attachments = [format_attachment(part.filename or 'без имени', estimate_decoded_size(part))
+                           for part in attachment_parts]
+            messages[uid] = (messages_headers[uid], '', attachments)
+            if text_part:
+                text_parts[uid] = text_part
+
+        uids_by_section = {}
+        for uid, part in text_parts.items():
+            uids_by_section.setdefault(part.section, []).append(uid)
+
+        partial = f'<0.{settings.IMAP_BODY_MAX_BYTES}>' if settings.IMAP_BODY_MAX_BYTES else ''
+        for section, section_uids in uids_by_section.items():
+            response = await imap_client.uid('fetch', format_uid_set(section_uids),
+                                             f'(UID BODY.PEEK[{section}]{partial})')
+            for uid, attributes in iter_fetch_items(response.lines):
+                data = next((value for key, value in attributes.items() if key.startswith(b'BODY[')), None)
+                if uid in text_parts and data:
+                    headers, _, attachments = messages[uid]
+                    messages[uid] = (headers, decode_part(data, text_parts[uid]), attachments)
+        return messages
+
     @staticmethod
     async def fetch_message(imap_client: aioimaplib.IMAP4_SSL, uid: int) -> Message:
-        dwnld_resp = await imap_client.uid('fetch', str(uid), 'BODY.PEEK[]')
-        return BytesParser().parsebytes(dwnld_resp.lines[1])
+        dwnld_resp = await imap_client.uid('fetch', str(uid), '(UID BODY.PEEK[])')
+        message = next((message for message in iter_fetch_messages(dwnld_resp.lines) if message.uid == uid), None)
+        return BytesParser().parsebytes(message.data if message and message.data else b'')
 
     async def fetch_message_details(self, imap_client: aioimaplib.IMAP4_SSL, uid: int) -> dict[str, str]:
         message = await self.fetch_message(imap_client, uid)
@@ -220,209 +587,703 @@ class IMAPClient(EmailDecoder):
             'from_': email_details['sender'],
             'to': email_details['recipient'],
             'date': email_details['date'],
-            'body': email_details['body']
+            'body': email_details['body'],
+            'attachments': email_details['attachments'],
+            'message_id': email_details['message_id']
         }
         return formatted_email
 
     async def handle_server_push(self, imap_client: aioimaplib.IMAP4_SSL, push_messages: Collection[bytes]) -> bool:
-        for msg in push_messages:
-            if msg.endswith(b'EXISTS'):
-                imap_client.idle_done()
-                logger.info(f'new message: {msg!r}')
-                last_uid = await self.fetch_messages_headers(imap_client, self.persistent_max_uid)
-                if last_uid > self.persistent_max_uid:
-                    self.persistent_max_uid = last_uid
-                return True
-        return False
+        """
+        Обрабатывает уведомления сервера в режиме IDLE: EXISTS для INBOX
+        и STATUS (NOTIFY) для дополнительных папок. Возвращает True, если IDLE был завершен.
+        """
+        new_inbox_messages = any(msg.endswith(b'EXISTS') for msg in push_messages if isinstance(msg, bytes))
+        changed_folders = set(parse_status_responses(push_messages)) if self.folders else set()
+        if not new_inbox_messages and not changed_folders:
+            return False
+
+        imap_client.idle_done()
+        self.state = 'fetching'
+        if new_inbox_messages:
+            logger.info(f'new message: {push_messages!r}')
+            last_uid = await self.fetch_messages_headers(imap_client, self.persistent_max_uid)
+            await self.advance_max_uid(last_uid)
+        if changed_folders:
+            await self.check_folders(imap_client, changed_folders)
+        return True
+
+    async def watch_folders(self, imap_client: aioimaplib.IMAP4_SSL) -> None:
+        """
+        Загружает дополнительные папки ящика и подписывается на новые письма в них командой NOTIFY
+        (RFC 5465), если сервер ее поддерживает. Иначе папки проверяются командой STATUS
+        раз в IMAP_FOLDER_POLL_INTERVAL секунд. Все папки слушаются через одно соединение.
+        """
+        self.folders = await folder_repo.get_for_box(self.telegram_id, self.user)
+        self.notify_active = False
+        if not self.folders:
+            return
+
+        if settings.IMAP_NOTIFY and imap_client.has_capability('NOTIFY'):
+            mailboxes = ' '.join(aioimaplib.quoted(encode_mailbox_name(folder.name)) for folder in self.folders)
+            response = await notify_set(imap_client, '(selected (MessageNew MessageExpunge))',
+                                        f'(mailboxes {mailboxes} (MessageNew MessageExpunge))')
+            self.notify_active = response.result == 'OK'
+            if not self.notify_active:
+                logger.warning(f'{self.user} - Сервер отклонил NOTIFY ({response}), папки будут проверяться STATUS')
+        logger.info(f'{self.user} - Прослушиваются папки: {", ".join(folder.name for folder in self.folders)} '
+                    f'({"NOTIFY" if self.notify_active else "STATUS"})')
+
+        # Догоняем письма, пришедшие в папки пока ящик не прослушивался
+        await self.check_folders(imap_client)
+
+    async def check_folders(self, imap_client: aioimaplib.IMAP4_SSL, names: set[bytes] | None = None) -> None:
+        """
+        Запрашивает STATUS дополнительных папок (всех или с именами names) и загружает новые письма
+        из папок, в которых вырос UIDNEXT. После этого снова выбирается INBOX.
+        """
+        self.folders_checked_at = asyncio.get_running_loop().time()
+        folders_with_mail = []
+        for folder in self.folders:
+            encoded_name = encode_mailbox_name(folder.name)
+            if names is not None and encoded_name.encode() not in names:
+                continue
+            response = await imap_client.status(aioimaplib.quoted(encoded_name), '(UIDNEXT UIDVALIDITY)')
+            status = parse_status_responses(response.lines).get(encoded_name.encode())
+            if response.result != 'OK' or not status or b'UIDNEXT' not in status:
+                logger.error(f'{self.user} - Не удалось получить STATUS папки {folder.name}: {response}')
+                continue
+
+            last_uid = status[b'UIDNEXT'] - 1
+            uid_validity = status.get(b'UIDVALIDITY')
+            if uid_validity != folder.uid_validity:
+                logger.info(f'{self.user} - Папка {folder.name}: ресинхронизация UID, базовый UID {last_uid}')
+                folder.uid_validity, folder.last_uid = uid_validity, last_uid
+                await folder_repo.set_uid_state(folder.id, uid_validity, last_uid)
+            elif last_uid > folder.last_uid:
+                folders_with_mail.append(folder)
+
+        if not folders_with_mail:
+            return
+        for folder in folders_with_mail:
+            await self.fetch_folder(imap_client, folder)
+        await self.select_inbox(imap_client)
+        last_uid = await self.fetch_messages_headers(imap_client, self.persistent_max_uid)
+        await self.advance_max_uid(last_uid)
 
-    async def imap_loop(self):
+    async def check_folders_if_due(self, imap_client: aioimaplib.IMAP4_SSL) -> None:
+        if self.folders and not self.should_stop:
+            interval = settings.IMAP_FOLDER_POLL_INTERVAL
+            if self.notify_active or asyncio.get_running_loop().time() - self.folders_checked_at >= interval:
+                await self.check_folders(imap_client)
+
+    async def fetch_folder(self, imap_client: aioimaplib.IMAP4_SSL, folder: WatchedFolder) -> None:
+        """Выбирает папку и обрабатывает новые письма в ней так же, как в INBOX."""
+
+        response = await imap_client.select(aioimaplib.quoted(encode_mailbox_name(folder.name)))
+        if response.result != 'OK':
+            logger.error(f'{self.user} - Не удалось выбрать папку {folder.name}: {response}')
+            return
+
+        self.state = 'fetching'
+        self.selected_folder, self.handled_uid = folder, 0
+        try:
+            last_uid = await self.fetch_messages_headers(imap_client, folder.last_uid)
+            await self.advance_max_uid(last_uid)
+        finally:
+            await self.checkpoint()
+            self.selected_folder, self.handled_uid = None, 0
+
+    async def run(self):
+        """Запускает прослушивание, заняв слот соединения с сервером в планировщике подключений."""
+
+        self.state = 'queued'
+        try:
+            async with host_scheduler.connection(self.host, self.user):
+                if not self.should_stop:
+                    await self.imap_loop()
+        finally:
+            await self.discard_verified_session()
+            await self.checkpoint()
+        self.state = 'stopped'
+
+    async def checkpoint(self) -> None:
+        """
+        Сохраняет UID последнего переданного в обработку письма, в том числе при отмене задачи
+        посреди пачки, чтобы следующий запуск продолжил ровно с этого места.
+        """
+        try:
+            await self.advance_max_uid(self.handled_uid)
+        except Exception as e:
+            logger.error(f'{self.user} - Не удалось сохранить UID {self.handled_uid}: {e!r}')
+
+    async def login(self) -> aioimaplib.IMAP4_SSL:
+        """
+        Подключается к серверу и авторизуется. При отклоненной авторизации закрывает
+        соединение и генерирует EmailCredentialsError, при таймауте обрывает его.
+        Если сервер отклонил авторизацию временно (перегрузка, лимит соединений),
+        генерирует EmailLoginUnavailableError: ящик не отключается, попытка повторяется.
+        """
+        await host_scheduler.wait_login_slot(self.host)
         logger.info(f'{self.user} - Подключение к серверу...')
-        imap_client = aioimaplib.IMAP4_SSL(host=self.host, timeout=60)
-        await imap_client.wait_hello_from_server()
-        for attempt in range(MAX_RETRIES):
-            try:
-                logger.info(f'{self.user} - Авторизация... Попытка {attempt + 1}')
-                await imap_client.login(self.user, self.password)
-                logger.info(f'{self.user} - Выбор папки INBOX...')
-                await imap_client.select('INBOX')
-                break
-            except asyncio.exceptions.TimeoutError:
-                logger.error(
-                    f'Ошибка авторизации из-за превышения времени ожидания. Попытка {attempt + 1} из {MAX_RETRIES}')
-                if attempt == MAX_RETRIES - 1:
-                    logger.error(f'Не удалось авторизоваться после {MAX_RETRIES} попыток. Завершение работы.')
-            except aioimaplib.aioimaplib.Abort:
-                raise EmailCredentialsError(
-                    f'Не удалось авторизоваться для {self.user} после {MAX_RETRIES} попыток.')
-            await asyncio.sleep(RETRY_DELAY)
-
-        # Проверка последнего письма перед началом прослушивания
-        last_uid = await self.fetch_messages_headers(imap_client, self.persistent_max_uid)
-        if last_uid > self.persistent_max_uid:
-            # Если UID последнего письма больше сохраненного UID и письмо не прочитано, обрабатываем его
-            self.persistent_max_uid = last_uid
+        imap_client = self.connection = aioimaplib.IMAP4_SSL(host=self.host, timeout=60)
+        # IMAP4_SSL не принимает conn_lost_cb в конструкторе, соединение устанавливается позже в отдельной задаче
+        imap_client.protocol.conn_lost_cb = lambda exc: self.on_connection_lost(imap_client, exc)
+        self.connection_lost = False
+        try:
+            await wait_for(imap_client.wait_hello_from_server(), timeout=settings.IMAP_CONNECT_TIMEOUT)
+
+            logger.info(f'{self.user} - Авторизация...')
+            response = await imap_client.login(self.user, self.password)
+            if response.result != 'OK':
+                await self.close_connection(imap_client)
+                if is_temporary_login_failure(response):
+                    raise EmailLoginUnavailableError(f'Сервер временно отклонил авторизацию {self.user}: '
+                                                     f'{response.lines}')
+                raise EmailCredentialsError(f'Не удалось авторизоваться для {self.user}: {response.lines}')
+
+            # После авторизации сервер может сообщить другой набор возможностей
+            await wait_for(imap_client.protocol.capability(), timeout=settings.IMAP_CONNECT_TIMEOUT)
+        except TimeoutError:
+            self.abort_connection(imap_client)
+            raise
+        return imap_client
+
+    def has_verified_session(self) -> bool:
+        """Проверяет, что сохраненная при проверке ящика сессия еще авторизована и не закрыта сервером."""
+
+        session = self.verified_session
+        if session is None or session is not self.connection or self.connection_lost:
+            return False
+        return session.protocol.state == aioimaplib.AUTH
 
+    def adopt_session(self, source: 'IMAPClient') -> None:
+        """Забирает сессию, проверенную при создании ящика другим клиентом того же ящика."""
+
+        if not source.has_verified_session():
+            return
+        session, source.verified_session, source.connection = source.verified_session, None, None
+        self.verified_session = self.connection = session
+        self.connection_lost = False
+        session.protocol.conn_lost_cb = lambda exc: self.on_connection_lost(session, exc)
+
+    async def discard_verified_session(self) -> None:
+        """Завершает сохраненную при проверке ящика сессию, если она так и не понадобилась."""
+
+        session, self.verified_session = self.verified_session, None
+        if session is not None:
+            await self.close_connection(session)
+
+    async def connect(self) -> aioimaplib.IMAP4_SSL:
+        """
+        Подключается к серверу, авторизуется, выбирает INBOX и догоняет пропущенные письма.
+        Сессия, проверенная при создании ящика, используется вместо повторного подключения и авторизации.
+        """
+        if self.has_verified_session():
+            logger.info(f'{self.user} - Используем сессию, проверенную при создании ящика')
+            imap_client, self.verified_session = self.verified_session, None
+        else:
+            await self.discard_verified_session()
+            imap_client = await self.login()
+
+        try:
+            if not self.polling and not imap_client.has_capability('IDLE'):
+                logger.warning(f'{self.user} - Сервер не поддерживает IDLE, переходим на периодический опрос')
+                self.polling = True
+            self.compression = await enable_compression(imap_client) if settings.IMAP_COMPRESS else None
+            await self.select_inbox(imap_client)
+
+            # Догоняем письма, пришедшие пока ящик не прослушивался
+            last_uid = await self.fetch_messages_headers(imap_client, self.persistent_max_uid)
+            await self.advance_max_uid(last_uid)
+            if settings.IMAP_WATCH_FOLDERS:
+                await self.watch_folders(imap_client)
+        except BaseException as e:
+            # Авторизованное соединение не должно остаться открытым: reconnect откроет новое
+            if isinstance(e, Exception) and not isinstance(e, NETWORK_ERRORS) and not self.connection_lost:
+                await self.close_connection(imap_client)
+            self.abort_connection(imap_client)
+            raise
+        return imap_client
+
+    def on_connection_lost(self, imap_client: aioimaplib.IMAP4_SSL, exc: Exception | None) -> None:
+        """Прерывает ожидание в IDLE, если сервер закрыл текущее соединение."""
+
+        if imap_client is self.connection and not self.should_stop:
+            logger.error(f'{self.user} - Соединение закрыто сервером: {exc!r}')
+            self.connection_lost = True
+            asyncio.ensure_future(imap_client.stop_wait_server_push())
+
+    async def reconnect(self) -> aioimaplib.IMAP4_SSL | None:
+        """
+        Подключается к серверу до успеха или остановки слушателя.
+
+        Между попытками выдерживается экспоненциальная задержка со случайным разбросом,
+        а пока предохранитель сервера разомкнут, попытки не выполняются вовсе.
+        Предохранитель учитывает только сетевые ошибки и таймауты: ошибки базы или
+        удаленный ящик одного слушателя не останавливают подключения к серверу остальных.
+        Сетевые ошибки и временный отказ в авторизации никогда не отключают прослушивание ящика.
+        """
+        breaker = host_scheduler.get_breaker(self.host)
+        attempt = 0
         while not self.should_stop:
-            user_key = f'user:{self.user}'
-            user_data_str = redis_client.get_key(user_key)
-            if user_data_str:
-                user_data = json.loads(user_data_str)
-                if not user_data['listening']:
-                    break
-            else:
+            await breaker.wait_available()
+            if self.should_stop:
                 break
-            logger.info(f'{self.user} starting idle')
             try:
-                idle_task = await imap_client.idle_start(timeout=59)
-                push = await self.handle_server_push(imap_client, await imap_client.wait_server_push())
+                imap_client = await self.connect()
+                breaker.record_success()
+                return imap_client
+            except EmailCredentialsError:
+                breaker.record_success()
+                raise
+            except Exception as e:
+                if isinstance(e, NETWORK_ERRORS):
+                    breaker.record_failure()
+                delay = backoff_delay(attempt)
+                attempt += 1
+                logger.error(f'Ошибка подключения для {self.user}: {e!r}. '
+                             f'Попытка {attempt}, следующая через {delay:.1f} с')
+                await self.sleep_unless_stopped(delay)
+        return None
+
+    async def open_connection(self) -> aioimaplib.IMAP4_SSL | None:
+        try:
+            return await self.reconnect()
+        except EmailCredentialsError as e:
+            logger.error(str(e))
+            await self.disable_listening()
+            return None
+
+    async def sleep_unless_stopped(self, delay: float) -> None:
+        try:
+            await wait_for(self.stop_event.wait(), timeout=delay)
+        except TimeoutError:
+            pass
+
+    async def close_connection(self, imap_client: aioimaplib.IMAP4_SSL) -> None:
+        if imap_client is self.connection:
+            self.connection = None
+        try:
+            await wait_for(imap_client.logout(), timeout=10)
+        except Exception:
+            pass
+
+    def abort_connection(self, imap_client: aioimaplib.IMAP4_SSL) -> None:
+        """Закрывает сокет без LOGOUT: сервер не ответил и сессии еще нет."""
+
+        if imap_client is self.connection:
+            self.connection = None
+        if imap_client.protocol.transport is not None:
+            imap_client.protocol.transport.close()
+
+    async def disable_listening(self) -> None:
+        """Отключает прослушивание ящика в базе и Redis (при отклоненной авторизации)."""
+
+        email_box = await email_repo.get_by_email_username_for_user(self.telegram_id, self.user)
+        if email_box:
+            await email_repo.set_listening_status(email_box.id, False)
+        else:
+            logger.error(f'Почтовый ящик для {self.user} не найден!')
+
+        user_key = f'user:{self.user}'
+        user_data_str = redis_client.get_key(user_key)
+        user_data = json.loads(user_data_str) if user_data_str else {}
+        user_data['listening'] = False
+        redis_client.set_key(user_key, json.dumps(user_data))
+        redis_client.delete_key(f'email_boxes_for_user_{self.user}')
+        logger.info(f'Установлено значение listening в False для {self.user} в Redis.')
+
+    async def reopen_connection(self, imap_client: aioimaplib.IMAP4_SSL) -> aioimaplib.IMAP4_SSL | None:
+        self.state = 'reconnecting'
+        if not self.connection_lost:
+            await self.close_connection(imap_client)
+        return await self.open_connection()
+
+    def record_idle_drop(self, idle_profile: IdleProfile, elapsed: float) -> None:
+        """
+        Учитывает разрыв сессии посреди IDLE. Если сессии ящика подряд не доживают даже
+        до минимального интервала (например, NAT закрывает неактивные соединения),
+        ящик переходит на периодический опрос.
+        """
+        idle_profile.record_drop(elapsed)
+        if elapsed < idle_profile.min_timeout:
+            self.idle_failures += 1
+        if self.idle_failures >= settings.IMAP_IDLE_MAX_FAILURES:
+            logger.warning(f'{self.user} - IDLE сессии обрываются {self.idle_failures} раз подряд, '
+                           f'переходим на периодический опрос')
+            self.polling = True
+
+    async def poll_mailbox(self, imap_client: aioimaplib.IMAP4_SSL) -> None:
+        """
+        Проверяет появление новых писем командой UID SEARCH UID n:* (для серверов без IDLE)
+        и ждет следующего опроса. Интервал опроса подстраивается под частоту писем в ящике.
+        """
+        self.state = 'polling'
+        self.ready.set()
+        if self.connection_lost:
+            raise ConnectionResetError('connection lost')
+
+        max_uid = self.persistent_max_uid
+        response = await imap_client.uid_search('UID', '%d:*' % (max_uid + 1), charset=None)
+        if response.result != 'OK':
+            raise aioimaplib.Abort(f'UID SEARCH failed: {response}')
+
+        # Как и FETCH, SEARCH n:* возвращает последнее письмо, даже если новых нет
+        has_new_messages = any(uid > max_uid for uid in self.extract_search_uids(response))
+        if has_new_messages:
+            self.state = 'fetching'
+            last_uid = await self.fetch_messages_headers(imap_client, max_uid)
+            await self.advance_max_uid(last_uid)
+        await self.check_folders_if_due(imap_client)
+        await self.sleep_unless_stopped(self.poll_interval.update(has_new_messages))
+
+    async def imap_loop(self):
+        self.state = 'connecting'
+        imap_client = await self.open_connection()
+
+        idle_profile = host_scheduler.get_idle_profile(self.host)
+        loop = asyncio.get_running_loop()
+
+        # Остановка приходит через управляющий канал (infrastructure.control_channel)
+        while imap_client and not self.should_stop:
+            if self.polling:
+                try:
+                    await self.poll_mailbox(imap_client)
+                    continue
+                except (TimeoutError, aioimaplib.Abort, aioimaplib.CommandTimeout, OSError) as e:
+                    if self.should_stop:
+                        break
+                    logger.error(f'Опрос почты {self.user} не удался ({e!r})! Переподключаемся...')
+                    imap_client = await self.reopen_connection(imap_client)
+                    continue
+
+            idle_timeout = idle_profile.timeout
+            if self.folders and not self.notify_active:
+                idle_timeout = min(idle_timeout, settings.IMAP_FOLDER_POLL_INTERVAL)
+            logger.info(f'{self.user} starting idle ({idle_timeout:.0f} s)')
+            self.state = 'idle'
+            self.ready.set()
+            idle_started_at = loop.time()
+            try:
+                try:
+                    idle_task = await imap_client.idle_start(timeout=idle_timeout)
+                except aioimaplib.Abort as e:
+                    logger.warning(f'{self.user} - Сервер отклонил IDLE ({e}), переходим на периодический опрос')
+                    self.polling = True
+                    continue
+                server_push = await imap_client.wait_server_push(timeout=idle_timeout + IDLE_PUSH_MARGIN)
+                if self.connection_lost:
+                    raise ConnectionResetError('connection lost')
+                push = await self.handle_server_push(imap_client, server_push)
                 if not push:
                     imap_client.idle_done()
 
                 await wait_for(idle_task, timeout=300)
+                # Сервер ответил на DONE после полного интервала - сессия пережила его
+                if server_push == aioimaplib.STOP_WAIT_SERVER_PUSH and not self.should_stop:
+                    idle_profile.record_refresh(idle_timeout)
+                self.idle_failures = 0
                 logger.info(f'{self.user} ending idle')
+                await self.check_folders_if_due(imap_client)
 
-            except (TimeoutError, CancelledError):
-                logger.error(f'Превышено время ожидания на почте {self.user}! Перезапускаем режим idle...')
-                await asyncio.sleep(10)
-                imap_client.idle_done()
-                retries = 0
+            except (TimeoutError, CancelledError, aioimaplib.Abort, OSError) as e:
+                if self.should_stop:
+                    break
+                if self.state == 'idle':
+                    # Молча закрытая (NAT) сессия обнаруживается только при обновлении IDLE: сверх интервала
+                    # прошли IDLE_PUSH_MARGIN и ожидание ответа на DONE, а сессия не пережила сам интервал
+                    self.record_idle_drop(idle_profile, min(loop.time() - idle_started_at, idle_timeout))
+                logger.error(f'Соединение с почтой {self.user} прервано ({e!r})! Переподключаемся...')
+                imap_client = await self.reopen_connection(imap_client)
 
-                while retries < MAX_RETRIES:
-                    try:
-                        await imap_client.logout()
-                        logger.info(f'{self.user} - Подключение к серверу...')
-                        imap_client = aioimaplib.IMAP4_SSL(host=self.host, timeout=60)
-                        await imap_client.wait_hello_from_server()
-                        logger.info(f'{self.user} - Авторизация...')
-                        await imap_client.login(self.user, self.password)
-                        logger.info(f'{self.user} - Выбор папки INBOX...')
-                        await imap_client.select('INBOX')
-                        await imap_client.idle_start(timeout=59)
-                        break
-                    except Exception as e:
-                        logger.error(f'Ошибка при попытке переподключения для {self.user}: {e}')
-                        retries += 1
-                        await asyncio.sleep(10)
-                if retries == MAX_RETRIES:
-                    logger.error(f'Не удалось переподключиться к {self.user} после {MAX_RETRIES} попыток.')
-
-                    user_data_str = redis_client.get_key(user_key)
-                    user_data = json.loads(user_data_str) if user_data_str else {}
-                    email_box = await email_repo.get_by_email_username_for_user(self.telegram_id, self.user)
-                    email_box_id = email_box.id
-                    if email_box:
-                        await email_repo.set_listening_status(email_box_id, False)
-                    else:
-                        logger.error(f'Почтовый ящик для {self.user} не найден!')
-                    user_data['listening'] = False
-                    redis_client.set_key(user_key, json.dumps(user_data))
-                    redis_client.delete_key(f'email_boxes_for_user_{self.user}')
-                    logger.info(f'Установлено значение listening в False для {self.user} в Redis.')
-                    self.should_stop = True
-        await imap_client.logout()
+        if imap_client:
+            await self.close_connection(imap_client)
+        self.state = 'stopped'
 
 
 class IMAPListener:
-    def __init__(self, host: str, user: str, password: str, telegram_id: int, callback: Callable | None = None):
+    def __init__(self, host: str, user: str, password: str, telegram_id: int, callback: Callable | None = None,
+                 header_filter: Callable | None = None):
         self.imap_client = IMAPClient(host=host, user=user, telegram_id=telegram_id, password=password,
-                                      callback=callback)
+                                      callback=callback, header_filter=header_filter)
         self._task = None
         self.user = user
         self.password = password
         self.host = host
+        self.telegram_id = telegram_id
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def state(self) -> str:
+        if self._task is None:
+            return 'created'
+        if self._task.done():
+            return 'failed' if not self._task.cancelled() and self._task.exception() else 'stopped'
+        return self.imap_client.state
+
+    async def wait_ready(self, timeout: float) -> bool:
+        """Ждет перехода слушателя в режим IDLE. Возвращает False при ошибке или по таймауту."""
+
+        if self._task is None:
+            return False
+        ready = asyncio.create_task(self.imap_client.ready.wait())
+        try:
+            await asyncio.wait({ready, self._task}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            ready.cancel()
+        return self.imap_client.ready.is_set()
+
+    def add_done_callback(self, callback: Callable[[asyncio.Task], None]) -> None:
+        if self._task:
+            self._task.add_done_callback(callback)
 
     async def start(self):
         """Метод создания задачи на прослушивание почты."""
 
         if self._task is None:
-            self._task = asyncio.create_task(self.imap_client.imap_loop())
+            self._task = asyncio.create_task(self.imap_client.run())
             logger.info(f'Task for {self.user} was started!')
 
-    async def stop(self):
+    async def stop(self, timeout: float = STOP_TIMEOUT):
         """Метод остановки задачи на прослушивание почты."""
 
         if self._task:
-            self.imap_client.stop_listening()
-            await self._task
+            await self.imap_client.stop_listening()
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.error(f'Task for {self.user} did not stop in {timeout} s, cancelling')
+                self._task.cancel()
+                # Даем задаче сохранить последний обработанный UID
+                await asyncio.wait({self._task}, timeout=CANCEL_TIMEOUT)
+            except Exception as e:
+                logger.error(f'Task for {self.user} finished with error: {e}')
             self._task = None
             logger.info(f'Task for {self.user} was stopped!')
 
-    async def test_connection(self) -> bool:
+    async def test_connection(self, keep_session: bool = False) -> bool:
         """
         Проверяет соединение и авторизацию на IMAP сервере.
         Возвращает True, если соединение и авторизация успешны.
         Генерирует исключение в случае ошибки.
+
+        При keep_session=True авторизованная сессия сохраняется, чтобы слушатель ящика в этом процессе
+        забрал ее при запуске (start_listening_box), иначе завершается командой LOGOUT.
         """
+        imap_client = self.imap_client
         try:
-            imap_client = aioimaplib.IMAP4_SSL(host=self.host, timeout=10)
-            await imap_client.wait_hello_from_server()
-            login_response = await imap_client.login(self.user, self.password)
-            if login_response.result != 'OK':
-                return False
-            else:
-                return True
+            session = await imap_client.login()
+        except EmailCredentialsError:
+            return False
         except TimeoutError:
             raise TimeoutError('Connection to IMAP server timed out.')
 
-    @classmethod
-    async def create_and_start(cls, host: str, user: str, password: str, telegram_id: int,
-                               callback: Callable | None = None) -> 'IMAPListener':
-        """Метод класса для проверки валидности предоставленных данных и запуска прослушивания в случае успеха."""
-
-        listener = cls(
-            host=host,
-            user=user,
-            password=password,
-            telegram_id=telegram_id,
-            callback=callback
-        )
-
-        # Проверяем валидность предоставленных данных
-        credentials = await listener.test_connection()
-        if not credentials:
-            raise EmailCredentialsError('Error with authorisation, check email or password!')
-
-        await listener.start()
+        if keep_session:
+            imap_client.verified_session = session
+        else:
+            await imap_client.close_connection(session)
+        return True
+
+
+def create_listener(email_box: EmailBox, host: str, cipher: PasswordCipher | None = None) -> IMAPListener:
+    """Создает слушатель почтового ящика с уже загруженным состоянием UID."""
+
+    cipher = cipher or PasswordCipher(key=os.getenv('ENCRYPTION_KEY'))
+    decrypted_password = cipher.decrypt_password(email_box.email_password.encode())
+
+    listener = IMAPListener(
+        host=host,
+        user=email_box.email_username,
+        password=decrypted_password,
+        telegram_id=email_box.user_id.telegram_id,
+        callback=process_email,
+        header_filter=find_matching_sender
+    )
+    listener.imap_client.set_uid_state(email_box.uid_validity, email_box.last_uid)
+    return listener
+
+
+async def load_listener(telegram_id: int, email_username: str) -> IMAPListener | None:
+    email_box = await email_repo.get_by_email_username_for_user(telegram_id, email_username)
+    if not email_box:
+        logger.error(f'Почтовый ящик {email_username} пользователя {telegram_id} не найден!')
+        return None
+    return create_listener(email_box, email_box.email_service.address)
+
+
+async def start_listening_box(telegram_id: int, email_username: str,
+                              verified: IMAPClient | None = None) -> IMAPListener | None:
+    """
+    Загружает почтовый ящик из базы и запускает его прослушивание.
+    Слушатель забирает сессию, проверенную клиентом verified при создании ящика.
+    """
+    listener = await load_listener(telegram_id, email_username)
+    if not listener:
+        return None
+    if verified:
+        listener.imap_client.adopt_session(verified)
+
+    running = await listener_manager.start(listener)
+    if running is not listener:
+        # Ящик уже слушает другой слушатель или узел: проверенная сессия не понадобится
+        await listener.imap_client.discard_verified_session()
+    return running
+
+
+async def ramp_start_listeners(listeners: list[IMAPListener]) -> None:
+    """
+    Запускает слушатели с ограничением числа одновременных подключений.
+
+    Слот LISTENER_STARTUP_CONCURRENCY занят, пока слушатель не перейдет в IDLE.
+    Частоту авторизаций на каждом сервере ограничивает планировщик подключений (host_scheduler).
+    """
+    started_at = time.perf_counter()
+    semaphore = asyncio.Semaphore(settings.LISTENER_STARTUP_CONCURRENCY)
+
+    async def start_one(listener: IMAPListener) -> bool:
+        async with semaphore:
+            if not listener_manager.has_capacity():
+                return False
+            listener = await listener_manager.start(listener)
+            return await listener.wait_ready(settings.LISTENER_READY_TIMEOUT) if listener else False
 
-        return listener
+    results = await asyncio.gather(*(start_one(listener) for listener in listeners), return_exceptions=True)
+    ready = sum(1 for result in results if result is True)
+    logger.info(f'Прослушивание запущено: {ready} из {len(listeners)} ящиков в IDLE '
+                f'за {time.perf_counter() - started_at:.2f} с')
 
 
 async def start_listening_all_emails() -> None:
-    """Функция запуска на прослушивание всех почтовых ящиков"""
-
-    all_emails: list[EmailBox] = await email_repo.get_all_boxes()
-
-    for email_data in all_emails:
-        email_domain = await email_domain_repo.get_host_by_slug(email_data.email_service.slug)
-        if not email_domain:
-            logger.error(f'Email service with slug {email_data.email_service.slug} does not exist')
-            continue
-
-        if email_data.listening:
-            host = email_domain.address
-
-            cipher = PasswordCipher(key=os.getenv('ENCRYPTION_KEY'))
-            decrypted_password = cipher.decrypt_password(email_data.email_password.encode())
-
-            listener = IMAPListener(
-                host=host,
-                user=email_data.email_username,
-                password=decrypted_password,
-                telegram_id=email_data.user_id.telegram_id,
-                callback=process_email
-            )
-            await listener.start()
+    """
+    Функция запуска на прослушивание всех почтовых ящиков.
+
+    Ящики читаются порциями, состояние в Redis записывается одним pipeline,
+    а подключение выполняется в фоне, чтобы не задерживать старт приложения.
+    Неизвестный EMAIL_HTML_EXTRACTOR останавливает запуск, а не разбор каждого письма.
+    """
+    get_html_extractor()
+    started_at = time.perf_counter()
+    cipher = PasswordCipher(key=os.getenv('ENCRYPTION_KEY'))
+    listeners = []
+    users_data = {}
+
+    async for email_box in email_repo.iter_all_boxes(settings.LISTENER_STARTUP_CHUNK_SIZE):
+        users_data[f'user:{email_box.email_username}'] = json.dumps({
+            'telegram_id': email_box.user_id.telegram_id,
+            'email_username': email_box.email_username,
+            'listening': email_box.listening
+        })
+
+        if email_box.listening:
+            try:
+                listeners.append(create_listener(email_box, email_box.email_service.address, cipher))
+            except Exception as e:
+                logger.error(f'Не удалось подготовить слушатель для {email_box.email_username}: {e}')
         else:
-            logger.info(f'Listening is set to False for email {email_data.email_username}. Skipping...')
-
-        user_key = f'user:{email_data.email_username}'
-        user_data = {
-            'telegram_id': email_data.user_id.telegram_id,
-            'email_username': email_data.email_username,
-            'listening': email_data.listening
-        }
-
+            logger.info(f'Listening is set to False for email {email_box.email_username}. Skipping...')
+
+    try:
+        redis_client.set_many(users_data)
+    except Exception as e:
+        logger.error(e)
+
+    logger.info(f'Подготовлено {len(listeners)} слушателей из {len(users_data)} ящиков '
+                f'за {time.perf_counter() - started_at:.2f} с')
+
+    listener_manager.stats_task = asyncio.create_task(report_listener_stats())
+    listener_manager.lag_task = asyncio.create_task(loop_lag_monitor.run())
+    if settings.LISTENER_LEASES:
+        # Каждый узел берет свою долю ящиков, порядок перемешивается, чтобы узлы не конкурировали за одни и те же
+        alive_nodes = await box_leases.heartbeat()
+        listener_manager.capacity = math.ceil(len(listeners) / alive_nodes)
+        random.shuffle(listeners)
+        listener_manager.lease_task = asyncio.create_task(keep_listener_leases())
+    listener_manager.startup_task = asyncio.create_task(ramp_start_listeners(listeners))
+
+
+async def report_listener_stats() -> None:
+    """
+    Периодически пишет в лог состояние слушателей и серверов, включая экономию команд DONE/IDLE,
+    задержку event loop, число писем, разобранных в decode_pool, и долю повторно полученных писем.
+    """
+    while True:
+        await asyncio.sleep(settings.LISTENER_STATS_INTERVAL)
+        logger.info(f'Слушатели: {listener_manager.states()}, экономия IDLE: '
+                    f'{host_scheduler.commands_saved_per_second():.1f} команд/с, '
+                    f'задержка event loop: {loop_lag_monitor.stats()}, разбор писем: {decode_pool.stats()}, '
+                    f'отметки о прочтении: {seen_flags.stats()}, '
+                    f'повторы писем: {delivery_dedup.stats()}, серверы: {host_scheduler.stats()}')
+
+
+async def stop_listening_all_emails(timeout: float | None = None) -> None:
+    """
+    Останавливает все слушатели процесса: прерывает запуск и продление аренд, дожидается
+    обработки текущих писем, сохраняет последний UID и выполняет LOGOUT каждого ящика.
+    На все отводится не больше LISTENER_SHUTDOWN_TIMEOUT секунд.
+    """
+    timeout = settings.LISTENER_SHUTDOWN_TIMEOUT if timeout is None else timeout
+    for task in (listener_manager.startup_task, listener_manager.lease_task, listener_manager.rebalance_task,
+                 listener_manager.stats_task, listener_manager.lag_task):
+        if task:
+            task.cancel()
+
+    started_at = time.perf_counter()
+    states = listener_manager.states()
+    await listener_manager.stop_all(timeout)
+    decode_pool.shutdown()
+    logger.info(f'Слушатели остановлены за {time.perf_counter() - started_at:.2f} с: {states}')
+
+
+async def rebalance_listeners(alive_nodes: int) -> None:
+    """
+    Распределяет ящики между живыми узлами поровну.
+
+    Узел с избытком ящиков освобождает лишние, узел с недостатком арендует свободные,
+    в том числе оставшиеся от упавших узлов. Свободные ящики запускаются в фоне,
+    чтобы ожидание IDLE не задерживало продление аренд; пока идет предыдущий запуск, новые не берутся.
+    """
+    boxes = await email_repo.get_listening_box_keys()
+    target = math.ceil(len(boxes) / alive_nodes)
+    listener_manager.capacity = target
+
+    running = listener_manager.count()
+    if running > target:
+        logger.info(f'Узел {box_leases.node_id} освобождает {running - target} ящиков для других узлов')
+        for key in listener_manager.keys()[:running - target]:
+            await listener_manager.stop(*key)
+        return
+
+    if any(task and not task.done() for task in (listener_manager.startup_task, listener_manager.rebalance_task)):
+        return
+
+    candidates = {listener_manager.make_key(*box): box for box in boxes if not listener_manager.is_listening(*box)}
+    free = await box_leases.free_keys(list(candidates))
+    if not free or running >= target:
+        return
+
+    random.shuffle(free)
+    listeners = [listener for listener in await asyncio.gather(
+        *(load_listener(*candidates[key]) for key in free[:target - running])) if listener]
+    logger.info(f'Узел {box_leases.node_id} берет {len(listeners)} свободных ящиков')
+    listener_manager.rebalance_task = asyncio.create_task(ramp_start_listeners(listeners))
+
+
+async def keep_listener_leases() -> None:
+    """Продлевает аренды ящиков узла, останавливает потерянные и перераспределяет ящики между узлами."""
+
+    while True:
         try:
-            redis_client.set_key(user_key, json.dumps(user_data))
+            alive_nodes = await box_leases.heartbeat()
+            for key in await box_leases.renew():
+                logger.error(f'Аренда ящика {key[1]} потеряна, прослушивание остановлено')
+                await listener_manager.stop(*key)
+            await rebalance_listeners(alive_nodes)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            logger.error(e)
+            logger.error(f'Ошибка продления аренды ящиков: {e!r}')
+        await asyncio.sleep(settings.LISTENER_LEASE_TTL / 3)
@@ -0,0 +1,207 @@
+import asyncio
+import base64
+import itertools
+import re
+from collections import namedtuple
+from typing import Any, Iterable, Iterator
+
+import aioimaplib
+
+
+def format_uid_set(uids: Iterable[int]) -> str:
+    """
+    Формирует компактный IMAP sequence-set из списка UID.
+
+    Подряд идущие UID сворачиваются в диапазоны: [1, 2, 3, 7, 9, 10] -> '1:3,7,9:10'.
+    """
+    ranges = []
+    for uid in sorted(set(uids)):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ','.join(str(start) if start == end else f'{start}:{end}' for start, end in ranges)
+
+
+IMAP_TOKEN = re.compile(rb'\s*(?:(?P<open>\()|(?P<close>\))|"(?P<quoted>(?:[^"\\]|\\.)*)"|\{(?P<literal>\d+)\}$|'
+                        rb'(?P<atom>[^\s()"\[\]]+(?:\[[^\]]*\](?:<[\d.]+>)?)?))')
+FETCH_LINE = re.compile(rb'\d+ FETCH ')
+FETCH_START = re.compile(rb'\d+ FETCH \(')
+FETCH_ATTRIBUTE = re.compile(rb' ?(?P<name>[^\s()"\[\]{}]+(?:\[[^\]]*\](?:<[\d.]+>)?)?) (?:\((?P<list>[^()"]*)\)|'
+                             rb'"(?P<quoted>(?:[^"\\]|\\.)*)"|\{(?P<literal>\d+)\}$|(?P<atom>[^\s()"{]+))')
+FETCH_END = re.compile(rb' ?(?P<close>\))?')
+QUOTED_ESCAPE = re.compile(rb'\\(.)')
+
+FetchedMessage = namedtuple('FetchedMessage', 'uid flags data')
+
+
+def parse_imap_data(parts: Iterable[bytes]) -> list:
+    """
+    Разбирает данные ответа IMAP в дерево списков.
+
+    parts - строки ответа в формате aioimaplib: строка, заканчивающаяся на {n},
+    означает, что следующий элемент является литералом. Атомы возвращаются как bytes,
+    NIL как None, строки и литералы как bytes.
+    """
+    stack: list[list] = [[]]
+    parts = iter(parts)
+    for part in parts:
+        for match_result in IMAP_TOKEN.finditer(part):
+            kind = match_result.lastgroup
+            if kind == 'atom':
+                atom = match_result.group('atom')
+                stack[-1].append(None if len(atom) == 3 and atom.upper() == b'NIL' else atom)
+            elif kind == 'open':
+                stack.append([])
+            elif kind == 'close':
+                completed = stack.pop()
+                stack[-1].append(completed)
+            elif kind == 'quoted':
+                quoted = match_result.group('quoted')
+                stack[-1].append(QUOTED_ESCAPE.sub(rb'\1', quoted) if b'\\' in quoted else quoted)
+            else:
+                stack[-1].append(bytes(next(parts, b'')))
+    return stack[0]
+
+
+def parse_fetch_attributes(parts: list[bytes]) -> dict[bytes, Any] | None:
+    """
+    Быстрый разбор атрибутов одного ответа FETCH, в котором нет вложенных списков
+    (UID, FLAGS, RFC822.SIZE, BODY[...]), без общего разбора в дерево.
+
+    Возвращает None, если ответ не подходит для быстрого разбора (BODYSTRUCTURE, ENVELOPE ...).
+    Строки после закрывающей скобки ответа - уведомления сервера - пропускаются.
+    """
+    start = FETCH_START.match(parts[0])
+    if not start:
+        return None
+
+    items: dict[bytes, Any] = {}
+    literal_name = None
+    closed = False
+    position = start.end()
+    for part in parts:
+        if isinstance(part, bytearray):
+            if literal_name is None:
+                return None
+            items[literal_name], literal_name = bytes(part), None
+            continue
+        if closed:
+            continue
+
+        while match_result := FETCH_ATTRIBUTE.match(part, position):
+            position = match_result.end()
+            name, flags, quoted, literal, atom = match_result.groups()
+            if literal is not None:
+                literal_name = name.upper()
+            elif flags is not None:
+                items[name.upper()] = flags.split()
+            elif quoted is not None:
+                items[name.upper()] = QUOTED_ESCAPE.sub(rb'\1', quoted) if b'\\' in quoted else quoted
+            else:
+                items[name.upper()] = None if atom.upper() == b'NIL' else atom
+
+        end = FETCH_END.fullmatch(part, position)
+        if end is None or (literal_name is not None) == bool(end.group('close')):
+            return None
+        closed = bool(end.group('close'))
+        position = 0
+    return items
+
+
+def iter_fetch_items(lines: list[bytes]) -> Iterator[tuple[int, dict[bytes, Any]]]:
+    """
+    Перебирает ответы UID FETCH и возвращает пары (UID, атрибуты письма).
+
+    Строки читаются по одной: ответ на письмо начинается со строки 'n FETCH (' и продолжается
+    литералами и строками после них, поэтому порядок атрибутов и число литералов в ответе
+    на письмо могут быть любыми. Ключи атрибутов приводятся к верхнему регистру:
+    b'UID', b'FLAGS', b'BODY[1]<0>' и т.д. Последняя строка ответа (текст тегированного статуса)
+    пропускается, уведомления сервера между ответами (EXISTS, EXPUNGE) игнорируются.
+    """
+    message_parts: list[bytes] = []
+    for line in itertools.chain(itertools.islice(lines, max(len(lines) - 1, 0)), [None]):
+        if line is None or (not isinstance(line, bytearray) and FETCH_LINE.match(line)):
+            if message_parts:
+                items = parse_fetch_attributes(message_parts)
+                if items is None:
+                    data = parse_imap_data(message_parts)
+                    attributes = data[2] if len(data) > 2 and isinstance(data[2], list) else []
+                    items = {bytes(key).upper(): value for key, value in zip(attributes[::2], attributes[1::2])}
+                if b'UID' in items:
+                    yield int(items[b'UID']), items
+            message_parts = [line]
+        else:
+            message_parts.append(line)
+
+
+def iter_fetch_messages(lines: list[bytes]) -> Iterator[FetchedMessage]:
+    """
+    Перебирает ответы UID FETCH на запрос с одной секцией BODY[...] и возвращает
+    FetchedMessage(uid, flags, data): флаги - кортеж bytes, data - содержимое секции
+    (литерал, строка или None, если сервер секцию не прислал).
+    """
+    for uid, items in iter_fetch_items(lines):
+        flags = items.get(b'FLAGS')
+        data = None
+        for key, value in items.items():
+            if key.startswith(b'BODY['):
+                data = value
+                break
+        yield FetchedMessage(uid, tuple(flags) if isinstance(flags, list) else (), data)
+
+
+def encode_mailbox_name(name: str) -> str:
+    """
+    Кодирует имя папки в modified UTF-7 (RFC 3501, 5.1.3): 'Рассылки' -> '&BCAEMARBBEEESwQ7BDoEOA-'.
+    """
+    result, unicode_chars = [], []
+
+    def flush() -> None:
+        if unicode_chars:
+            encoded = base64.b64encode(''.join(unicode_chars).encode('utf-16-be')).decode().rstrip('=')
+            result.append('&' + encoded.replace('/', ',') + '-')
+            unicode_chars.clear()
+
+    for char in name:
+        if 0x20 <= ord(char) <= 0x7e:
+            flush()
+            result.append('&-' if char == '&' else char)
+        else:
+            unicode_chars.append(char)
+    flush()
+    return ''.join(result)
+
+
+def parse_status_responses(lines: Iterable[bytes]) -> dict[bytes, dict[bytes, int]]:
+    """
+    Разбирает ответы STATUS: b'STATUS "Work" (UIDNEXT 12 UIDVALIDITY 3)' -> {b'Work': {b'UIDNEXT': 12, ...}}.
+
+    В ответе на команду STATUS aioimaplib отрезает имя ответа, а в уведомлениях IDLE оставляет его,
+    поэтому принимаются оба вида строк. Имена папок возвращаются в кодировке сервера (modified UTF-7).
+    """
+    statuses = {}
+    for line in lines:
+        if not isinstance(line, bytes) or isinstance(line, bytearray):
+            continue
+        data = parse_imap_data([line])
+        if data and data[0] == b'STATUS':
+            data = data[1:]
+        if len(data) == 2 and isinstance(data[0], bytes) and isinstance(data[1], list):
+            attributes = data[1]
+            statuses[data[0]] = {bytes(key).upper(): int(value) for key, value in zip(attributes[::2], attributes[1::2])
+                                 if isinstance(value, bytes) and value.isdigit()}
+    return statuses
+
+
+# NOTIFY (RFC 5465) отсутствует в списке команд aioimaplib
+aioimaplib.aioimaplib.Commands.setdefault(
+    'NOTIFY', aioimaplib.aioimaplib.Cmd('NOTIFY', (aioimaplib.AUTH, aioimaplib.SELECTED), aioimaplib.Exec.is_sync))
+
+
+async def notify_set(imap_client: aioimaplib.IMAP4_SSL, *event_groups: str) -> aioimaplib.Response:
+    """Отправляет NOTIFY SET с указанными группами событий, например '(selected (MessageNew MessageExpunge))'."""
+
+    protocol = imap_client.protocol
+    command = aioimaplib.Command('NOTIFY', protocol.new_tag(), 'SET', *event_groups, loop=protocol.loop)
+    return await asyncio.wait_for(protocol.execute(command), imap_client.timeout)
@@ -0,0 +1,127 @@
+import asyncio
+from collections import Counter
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from infrastructure.box_leases import box_leases
+from infrastructure.logger_config import logger
+
+if TYPE_CHECKING:
+    from infrastructure.imap_listener import IMAPListener
+
+ListenerKey = tuple[int, str]
+
+
+class ListenerManager:
+    """
+    Реестр слушателей почты текущего процесса.
+
+    Хранит не более одного слушателя на пару (telegram_id, email_username),
+    поэтому повторный запуск не открывает второе IDLE соединение к тому же ящику,
+    а остановка всегда находит запущенный слушатель. Запуск, остановка и освобождение
+    аренды одного ящика выполняются по очереди под блокировкой ящика.
+
+    При LISTENER_LEASES слушатель запускается, только если узлу удалось арендовать ящик
+    (infrastructure.box_leases), а capacity ограничивает долю ящиков узла при распределении.
+    """
+
+    def __init__(self):
+        self._listeners: dict[ListenerKey, 'IMAPListener'] = {}
+        self._locks: dict[ListenerKey, asyncio.Lock] = {}
+        self.startup_task: asyncio.Task | None = None
+        self.lease_task: asyncio.Task | None = None
+        self.rebalance_task: asyncio.Task | None = None
+        self.stats_task: asyncio.Task | None = None
+        self.lag_task: asyncio.Task | None = None
+        self.capacity: int | None = None
+
+    @staticmethod
+    def make_key(telegram_id: int, email_username: str) -> ListenerKey:
+        return int(telegram_id), email_username.lower()
+
+    def get(self, telegram_id: int, email_username: str) -> 'IMAPListener | None':
+        listener = self._listeners.get(self.make_key(telegram_id, email_username))
+        return listener if listener and listener.is_running else None
+
+    def is_listening(self, telegram_id: int, email_username: str) -> bool:
+        return self.get(telegram_id, email_username) is not None
+
+    def has_capacity(self) -> bool:
+        return self.capacity is None or self.count() < self.capacity
+
+    def lock(self, key: ListenerKey) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    async def start(self, listener: 'IMAPListener') -> 'IMAPListener | None':
+        """
+        Запускает слушатель, если для его ящика в процессе еще нет работающего.
+        Возвращает фактически работающий слушатель ящика или None, если ящик арендован другим узлом.
+        """
+        key = self.make_key(listener.telegram_id, listener.user)
+        async with self.lock(key):
+            running = self.get(*key)
+            if running:
+                logger.info(f'{listener.user} - Прослушивание уже запущено, повторный запуск пропущен')
+                return running
+
+            if settings.LISTENER_LEASES and not await box_leases.acquire(key):
+                logger.info(f'{listener.user} - Ящик прослушивает другой узел')
+                return None
+
+            self._listeners[key] = listener
+            await listener.start()
+            listener.add_done_callback(lambda _: self._discard(key, listener))
+            return listener
+
+    async def stop(self, telegram_id: int, email_username: str) -> bool:
+        """Останавливает слушатель ящика. Возвращает False, если он не был запущен в этом процессе."""
+
+        key = self.make_key(telegram_id, email_username)
+        async with self.lock(key):
+            listener = self._listeners.pop(key, None)
+            stopped = bool(listener and listener.is_running)
+            if stopped:
+                await listener.stop()
+            if settings.LISTENER_LEASES:
+                await box_leases.release(key)
+            return stopped
+
+    async def stop_all(self, timeout: float | None = None) -> None:
+        """Останавливает все слушатели параллельно, каждому отводится не больше timeout секунд."""
+
+        listeners = list(self._listeners.values())
+        self._listeners.clear()
+        kwargs = {'timeout': timeout} if timeout is not None else {}
+        await asyncio.gather(*(listener.stop(**kwargs) for listener in listeners), return_exceptions=True)
+        if settings.LISTENER_LEASES:
+            await box_leases.release_all()
+
+    def _discard(self, key: ListenerKey, listener: 'IMAPListener') -> None:
+        if self._listeners.get(key) is listener:
+            del self._listeners[key]
+            if settings.LISTENER_LEASES:
+                asyncio.ensure_future(self._release_lease(key))
+
+    async def _release_lease(self, key: ListenerKey) -> None:
+        """Освобождает аренду завершившегося слушателя, если ящик за это время не запустили снова."""
+
+        async with self.lock(key):
+            if key not in self._listeners:
+                await box_leases.release(key)
+
+    def keys(self) -> list[ListenerKey]:
+        return [key for key, listener in self._listeners.items() if listener.is_running]
+
+    def count(self) -> int:
+        return sum(1 for listener in self._listeners.values() if listener.is_running)
+
+    def states(self) -> dict[str, int]:
+        """Количество слушателей в каждом состоянии (connecting, idle, fetching, reconnecting ...)."""
+
+        return dict(Counter(listener.state for listener in self._listeners.values()))
+
+
+listener_manager = ListenerManager()
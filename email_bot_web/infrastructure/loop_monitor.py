@@ -0,0 +1,49 @@
+import asyncio
+from collections import deque
+
+# Интервал замеров и число хранимых замеров: окно около 5 минут
+LAG_SAMPLE_INTERVAL = 0.25
+LAG_WINDOW = 1200
+
+
+class LoopLagMonitor:
+    """
+    Задержка event loop: задача засыпает на interval секунд и измеряет, насколько позже
+    срока она проснулась. Задержка показывает, как долго синхронный код (разбор писем,
+    запросы к базе без await) не давал остальным слушателям обрабатывать IDLE.
+    """
+
+    def __init__(self, interval: float = LAG_SAMPLE_INTERVAL, window: int = LAG_WINDOW):
+        self.interval = interval
+        self.samples: deque[float] = deque(maxlen=window)
+        self.max_lag = 0.0
+
+    def record(self, lag: float) -> None:
+        lag = max(lag, 0.0)
+        self.samples.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started_at = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record(loop.time() - started_at - self.interval)
+
+    def percentile(self, fraction: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def stats(self) -> dict[str, float]:
+        """Задержка в миллисекундах: медиана и p99 за окно замеров и максимум с запуска."""
+
+        return {
+            'p50_ms': round(self.percentile(0.5) * 1000, 1),
+            'p99_ms': round(self.percentile(0.99) * 1000, 1),
+            'max_ms': round(self.max_lag * 1000, 1),
+        }
+
+
+loop_lag_monitor = LoopLagMonitor()
@@ -13,7 +13,17 @@ email_repo = EmailBoxRepository
 
 @shared_task
 def sync_email_listening_status() -> None:
-    """Функция синхронизации статуса слушателя почты между базой и редисом"""
+    """
+    Функция синхронизации статуса слушателя почты между базой и редисом.
+    Если статус в базе изменился, слушатель ящика запускается или останавливается.
+    """
+
+    # Управляющий канал импортирует слушатели, которые сами ставят задачи этого модуля
+    from infrastructure.control_channel import (
+        COMMAND_START,
+        COMMAND_STOP,
+        publish_command,
+    )
 
     all_email_boxes: list[EmailBox] = email_repo.sync_get_all_boxes()
 
@@ -33,6 +43,8 @@ def sync_email_listening_status() -> None:
                 redis_client.set_key(user_key, json.dumps(user_data))
                 user_key_email_box = f'{CACHE_PREFIX}email_box_{email_box.user_id}_{email_box.email_username}'
                 redis_client.delete_key(user_key_email_box)
+                publish_command(COMMAND_START if db_status else COMMAND_STOP,
+                                email_box.user_id.telegram_id, email_box.email_username)
     return
 
 
@@ -0,0 +1,91 @@
+import base64
+
+from infrastructure.bodystructure import BodyPart, decode_part, select_parts
+from infrastructure.imap_utils import parse_imap_data
+
+
+def parse_structure(data: bytes) -> list:
+    return parse_imap_data([data])[0]
+
+
+def make_part(encoding: str, charset: str = 'utf-8') -> BodyPart:
+    return BodyPart(section='1', content_type='text/plain', charset=charset, encoding=encoding, size=0,
+                    filename=None, disposition='')
+
+
+class TestSelectParts:
+    """Класс для тестирования выбора частей письма по BODYSTRUCTURE"""
+
+    def test_html_preferred_over_plain(self) -> None:
+        """Тест multipart/alternative внутри multipart/mixed: телом выбирается HTML часть."""
+
+        structure = parse_structure(
+            b'((("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 10 1 NIL NIL NIL NIL)'
+            b'("text" "html" ("charset" "koi8-r") NIL NIL "base64" 200 3 NIL NIL NIL NIL) "alternative" NIL NIL NIL)'
+            b'("image" "png" ("name" "logo.png") "<logo>" NIL "base64" 4000 NIL ("inline" NIL) NIL NIL)'
+            b' "mixed" NIL NIL NIL)')
+
+        text_part, attachments = select_parts(structure)
+
+        assert (text_part.section, text_part.content_type, text_part.charset) == ('1.2', 'text/html', 'koi8-r')
+        assert [(part.section, part.filename) for part in attachments] == [('2', 'logo.png')]
+
+    def test_single_part_message(self) -> None:
+        """Тест письма из одной части: секция тела - 1."""
+
+        text_part, attachments = select_parts(
+            parse_structure(b'("text" "plain" ("charset" "utf-8") NIL NIL "quoted-printable" 42 2 NIL NIL NIL NIL)'))
+
+        assert (text_part.section, text_part.encoding) == ('1', 'quoted-printable')
+        assert attachments == []
+
+    def test_text_attachment_is_not_body(self) -> None:
+        """Тест текстового вложения с именем в RFC 2231: оно не выбирается телом письма."""
+
+        structure = parse_structure(
+            b'(("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 10 1 NIL ("attachment" '
+            b'("filename*" "utf-8\'\'%D0%BE%D1%82%D1%87%D0%B5%D1%82.txt")) NIL NIL)'
+            b'("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 20 1 NIL NIL NIL NIL) "mixed" NIL NIL NIL)')
+
+        text_part, attachments = select_parts(structure)
+
+        assert text_part.section == '2'
+        assert [part.filename for part in attachments] == ['отчет.txt']
+
+    def test_forwarded_message_disposition(self) -> None:
+        """Тест вложенного письма message/rfc822: disposition читается с его позиции в описании."""
+
+        structure = parse_structure(
+            b'(("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 10 1 NIL NIL NIL NIL)'
+            b'("message" "rfc822" NIL NIL NIL "7bit" 300 (NIL "Fwd" NIL NIL NIL NIL NIL NIL NIL NIL) '
+            b'("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 20 1 NIL NIL NIL NIL) 12 NIL '
+            b'("attachment" ("filename" "fwd.eml")) NIL NIL) "mixed" NIL NIL NIL)')
+
+        text_part, attachments = select_parts(structure)
+
+        assert text_part.section == '1'
+        assert [(part.section, part.filename) for part in attachments] == [('2', 'fwd.eml')]
+
+
+class TestDecodePart:
+    """Класс для тестирования декодирования загруженной части письма"""
+
+    def test_truncated_base64(self) -> None:
+        """Тест base64 части, обрезанной ограничением размера посреди блока."""
+
+        data = base64.encodebytes('Привет, мир'.encode('utf-8'))
+
+        assert decode_part(data[:-3], make_part('base64')).startswith('Привет, ')
+
+    def test_quoted_printable_with_charset(self) -> None:
+        """Тест quoted-printable части в windows-1251."""
+
+        data = 'Скидка 50%'.encode('cp1251').replace(b'%', b'=25')
+        data = b''.join(b'=%02X' % byte if byte > 127 else bytes([byte]) for byte in data)
+
+        assert decode_part(data, make_part('quoted-printable', 'windows-1251')) == 'Скидка 50%'
+
+    def test_unknown_charset(self) -> None:
+        """Тест неизвестной кодировки: часть декодируется как UTF-8."""
+
+        assert decode_part('текст'.encode('utf-8'), make_part('8bit', 'x-unknown')) == 'текст'
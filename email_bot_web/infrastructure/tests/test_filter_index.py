@@ -0,0 +1,110 @@
+import pytest
+from email_service.schema import ImapEmailModel
+from infrastructure import email_processor
+from infrastructure.filter_index import FilterIndex, filter_indexes
+
+
+class TestFilterIndexMatch:
+    """Класс для тестирования проверки письма по скомпилированным фильтрам ящика"""
+
+    @pytest.mark.parametrize('rule', ('news@shop.com', 'NEWS@Shop.COM'))
+    def test_address_case_insensitive(self, rule: str) -> None:
+        """Тест правила с адресом: регистр адреса и правила не важен."""
+
+        index = FilterIndex([('sender', rule)])
+
+        assert index.match('Shop News <News@SHOP.com>') == 'News@SHOP.com'
+        assert index.match('other@shop.com') is None
+
+    @pytest.mark.parametrize('rule', ('@shop.com', 'shop.com', '*@shop.com'))
+    def test_domain_forms(self, rule: str) -> None:
+        """Тест правил с доменом: подходит любой адрес домена, но не поддомены."""
+
+        index = FilterIndex([('sender', rule)])
+
+        assert index.match('anyone@Shop.com') == 'anyone@Shop.com'
+        assert index.match('anyone@mail.shop.com') is None
+
+    def test_subdomains(self) -> None:
+        """Тест правила *.domain: подходят поддомены любой глубины, но не сам домен."""
+
+        index = FilterIndex([('sender', '*.shop.com')])
+
+        assert index.match('a@mail.shop.com') == 'a@mail.shop.com'
+        assert index.match('a@eu.mail.SHOP.com') == 'a@eu.mail.SHOP.com'
+        assert index.match('a@shop.com') is None
+
+    def test_lookalike_domain(self) -> None:
+        """Тест домена, который только начинается с домена из правила."""
+
+        index = FilterIndex([('sender', 'shop.com'), ('sender', '*.shop.com'), ('sender', 'user@shop.com')])
+
+        assert index.match('user@shop.com.evil') is None
+        assert index.match('user@mail.shop.com.evil') is None
+        assert index.match('user@evilshop.com') is None
+
+    def test_from_without_address(self) -> None:
+        """Тест заголовка From без адреса: правила отправителя не срабатывают."""
+
+        index = FilterIndex([('sender', 'shop.com'), ('sender_glob', '*')])
+
+        assert index.match('Undisclosed recipients') is None
+        assert index.match('') is None
+
+    def test_sender_glob(self) -> None:
+        """Тест шаблона адреса: совпадение со всем адресом без учета регистра."""
+
+        index = FilterIndex([('sender_glob', 'news*@*.shop.com')])
+
+        assert index.match('News <NEWS-weekly@mail.shop.com>') == 'NEWS-weekly@mail.shop.com'
+        assert index.match('news@mail.shop.com.evil') is None
+        assert index.match('digest@mail.shop.com') is None
+
+    def test_subject_keyword(self) -> None:
+        """Тест ключевого слова темы: без учета регистра и только в теме."""
+
+        index = FilterIndex([('subject', 'Скидка')])
+
+        assert index.match('a@b.com', subject='Большая СКИДКА недели') == 'a@b.com'
+        assert index.match('скидка@b.com', to='скидка@c.com', subject='Новости') is None
+
+    def test_body_keyword(self) -> None:
+        """Тест ключевого слова текста: без текста письмо подходит до загрузки, с текстом - по совпадению."""
+
+        index = FilterIndex([('body', 'промокод')])
+
+        assert index.match('a@b.com') == 'a@b.com'
+        assert index.match('a@b.com', body='Ваш ПРОМОКОД внутри') == 'a@b.com'
+        assert index.match('a@b.com', body='Ничего интересного') is None
+
+    def test_empty_rules(self) -> None:
+        """Тест ящика без правил: индекс пуст и письма не подходят."""
+
+        index = FilterIndex([('sender', '  '), ('subject', '')])
+
+        assert not index
+        assert index.match('a@b.com', subject='x', body='y') is None
+
+
+class TestProcessEmailText:
+    """Класс для тестирования извлечения текста письма при проверке фильтров"""
+
+    @pytest.mark.parametrize('rules, text', (
+        ([('sender', 'shop.com')], None),
+        ([('body', 'промокод')], 'Ваш купон картинка'),
+    ))
+    @pytest.mark.asyncio
+    async def test_text_extracted_only_for_body_rules(self, monkeypatch: pytest.MonkeyPatch,
+                                                      rules: list[tuple[str, str]], text: str | None) -> None:
+        """Тест письма, не подходящего под фильтры: текст извлекается, только если есть фильтр по тексту."""
+
+        async def get(telegram_id: int, email_username: str) -> FilterIndex:
+            return FilterIndex(rules)
+
+        monkeypatch.setattr(filter_indexes, 'get', get)
+        email = ImapEmailModel(subject='Новости', from_='a@other.com', to='me@b.com', date='',
+                               body='<p>Ваш <b>купон</b> <img src="a.png"></p>')
+
+        await email_processor.process_email(email, telegram_id=1, email_username='me@b.com', uid=1, imap_client=None)
+
+        assert email.text == text
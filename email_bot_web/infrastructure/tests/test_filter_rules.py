@@ -0,0 +1,137 @@
+import re
+import time
+
+import pytest
+from email_service.schema import BoxFilterCreateSchema, BoxFilterSchema
+from infrastructure.filter_index import FilterIndex
+from infrastructure.filter_rules import (
+    glob_to_regex,
+    keywords_to_regex,
+    validate_filter_rule,
+)
+
+
+class TestHeaderRegex:
+    """Класс для тестирования ограничений регулярных выражений по заголовкам"""
+
+    @pytest.mark.parametrize('pattern', (
+        r'^From: (\w+\s?)+$',
+        r'(a|a)*z',
+        r'(?:a|ab)+z',
+        r'(a+)+z',
+        r'(?P<name>[a-z]*\.)*z',
+        r'(a?b?){2,}',
+        r'(a*){,}',
+        r'.*.*.*z',
+        r'(\w+)\s\1',
+        r'(?P<w>\w)(?P=w)',
+        r'(?i)^Subject: sale',
+        r'^Subject: (?ms)sale',
+        'a' * 201,
+    ))
+    def test_unsafe_pattern_rejected(self, pattern: str) -> None:
+        """Тест выражений с экспоненциальным перебором, обратными ссылками и слишком длинных."""
+
+        with pytest.raises(ValueError):
+            validate_filter_rule('header_regex', pattern)
+
+    @pytest.mark.parametrize('pattern', (
+        r'^Subject: .*\bскидка\d+',
+        r'^From: [^<]*<news@(?:shop|store)\.com>',
+        r'^To: (?:sales|info)@example\.com$',
+        r'^Subject: (?:RE: )?\[JIRA\] [A-Z]{2,10}-\d{1,6}',
+        r'[(|*+)]+x',
+        r'\(a+\)+z',
+        r'(ab){3}c*',
+        r'^Subject: (?i:sale)(?-i:X)',
+    ))
+    def test_safe_pattern_accepted(self, pattern: str) -> None:
+        """Тест обычных выражений по заголовкам."""
+
+        assert validate_filter_rule('header_regex', f' {pattern} ') == pattern
+
+    def test_match_time_bounded(self) -> None:
+        """Тест проверки длинных заголовков допустимым выражением с двумя повторениями."""
+
+        index = FilterIndex([('header_regex', r'.*a.*z')])
+        subject = 'a' * 10000
+
+        started_at = time.perf_counter()
+        assert index.match('x@y.com', to='a' * 10000, subject=subject) is None
+        assert time.perf_counter() - started_at < 0.5
+
+    def test_matches_from_line_start(self) -> None:
+        """Тест выражения без ^: проверяется с начала строки заголовка."""
+
+        index = FilterIndex([('header_regex', r'Subject: .*скидка')])
+
+        assert index.match('x@y.com', subject='Большая СКИДКА') == 'x@y.com'
+        assert index.match('x@y.com', to='Subject: скидка', subject='Новости') is None
+
+    @pytest.mark.parametrize('pattern', (r'^From: (\w+\s?)+$', r'(?i)^Subject: sale'))
+    def test_stored_unsafe_rule_skipped(self, pattern: str) -> None:
+        """Тест правила, сохраненного до ограничений: индекс его не использует."""
+
+        index = FilterIndex([('header_regex', pattern), ('sender', 'shop.com')])
+
+        assert index.match('a@shop.com') == 'a@shop.com'
+        assert index.match('aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa! <b@c.com>') is None
+
+    def test_stored_unsafe_rule_readable(self) -> None:
+        """Тест чтения сохраненного правила: схема чтения не проверяет правило, схема создания проверяет."""
+
+        pattern = r'^From: (\w+\s?)+$'
+
+        assert BoxFilterSchema(filter_value=pattern, filter_type='header_regex').filter_value == pattern
+        with pytest.raises(ValueError):
+            BoxFilterCreateSchema(filter_value='  ', filter_type='sender')
+
+
+class TestKeywords:
+    """Класс для тестирования выражения ключевых слов"""
+
+    @pytest.mark.parametrize('keyword, text', (
+        ('#промо', 'акция#промо2024'),
+        ('$100', 'скидка $100 на заказ'),
+        ('скидк', 'большие скидки'),
+    ))
+    def test_keyword_found(self, keyword: str, text: str) -> None:
+        """Тест ключевых слов, начинающихся с буквы и с других символов."""
+
+        assert re.search(keywords_to_regex([keyword]), text)
+
+    def test_word_keyword_needs_word_start(self) -> None:
+        """Тест ключевого слова с буквы: середина слова не подходит."""
+
+        pattern = keywords_to_regex(['промо', '#код'])
+
+        assert not re.search(pattern, 'суперпромо')
+        assert re.search(pattern, 'супер промо')
+        assert re.search(pattern, 'ваш#код')
+
+    def test_body_keyword_in_text(self) -> None:
+        """Тест ключевого слова текста, начинающегося не с буквы."""
+
+        index = FilterIndex([('body', '#Промо')])
+
+        assert index.match('a@b.com', body='Только сегодня #ПРОМО') == 'a@b.com'
+        assert index.match('a@b.com', body='Только сегодня промо') is None
+
+
+class TestGlob:
+    """Класс для тестирования шаблонов адреса"""
+
+    def test_brackets_are_literal(self) -> None:
+        """Тест квадратных скобок в шаблоне: обычные символы, а не набор."""
+
+        assert re.fullmatch(glob_to_regex('[news]*@shop.com'), '[news]1@shop.com')
+        assert not re.fullmatch(glob_to_regex('[news]*@shop.com'), 'n1@shop.com')
+
+    def test_many_stars_time_bounded(self) -> None:
+        """Тест шаблона с несколькими * на длинном адресе без совпадения."""
+
+        pattern = re.compile(glob_to_regex('*a*a*a*a*a*@*.com'))
+
+        started_at = time.perf_counter()
+        assert not pattern.fullmatch('a' * 5000 + '@example.org')
+        assert time.perf_counter() - started_at < 0.5
@@ -0,0 +1,74 @@
+import pytest
+from benchmarks.html_extract import make_document
+from infrastructure.html_extractors import (
+    dereference_charref,
+    extract_text_soup,
+    extract_text_stream,
+    get_html_extractor,
+)
+
+FRAGMENTS = (
+    '<table><tr><td>Заказ</td>\r\n<td>оплачен</td></tr></table>',
+    '<p>Текст <a href="https://example.com">ссылка <b>жирная</b></a> после</p>',
+    '<a href="#"><img src="logo.png"></a><img src="spacer.gif" alt="">',
+    '<div><font color="#333">незакрытый<p>абзац</div> хвост',
+    '<ul><li>один<li>два</ul>',
+    '<script>var a = "<p>";</script><style>td {color: red}</style>видимый',
+    '<template><p>скрытый</p></template><ruby>漢<rp>(</rp><rt>kan</rt><rp>)</rp></ruby>',
+    '<!-- комментарий --><!--[if mso]><xml><o:Settings/></xml><![endif]-->текст',
+    '<!DOCTYPE html><?xml version="1.0"?>текст',
+    '&nbsp;&amp;&laquo;цитата&raquo; &unknown; &amp',
+    '&#8212; &#x2014; &#X2014; &#128; &#150; &#0; &#xD800; &#1114112; &#65535; &#1; &#12ab &#x1fg',
+    '<![CDATA[<b>как есть</b>]]><script><![CDATA[в скрипте]]></script>',
+    '<pre>  отступ\n\n  сохраняется  </pre>   \n   <textarea>  \n  </textarea>',
+    '<p>строка<br></br>вторая<br/>третья</p>',
+    '<b><i>перепутанные</b></i> теги</span>',
+    '<p>   </p>\n\n<p>\t</p><div> </div>',
+)
+
+
+class TestExtractText:
+    """Класс для тестирования совпадения потокового извлечения текста с BeautifulSoup"""
+
+    @pytest.mark.parametrize('html', FRAGMENTS)
+    def test_fragment_matches_soup(self, html: str) -> None:
+        """Тест разметки, на которой разбор легко разойтись с деревом BeautifulSoup."""
+
+        assert extract_text_stream(html) == extract_text_soup(html)
+
+    @pytest.mark.parametrize('number', range(20))
+    def test_generated_newsletter_matches_soup(self, number: int) -> None:
+        """Тест сгенерированных рассылок из бенчмарка html_extract."""
+
+        html = make_document(number, 20000)
+
+        assert extract_text_stream(html) == extract_text_soup(html)
+
+    def test_links_and_images(self) -> None:
+        """Тест удаления ссылок и замены изображений на 'картинка'."""
+
+        html = '<p>Привет <a href="#">ссылка</a><img src="a.png"> пока</p>'
+
+        assert extract_text_stream(html) == 'Привет картинка пока'
+
+    @pytest.mark.parametrize('name, expected', (
+        ('8212', ('—', '')),
+        ('x2014', ('—', '')),
+        ('128', ('€', '')),
+        ('0', ('\ufffd', '')),
+        ('xD800', ('\ufffd', '')),
+        ('1114112', ('\ufffd', '')),
+        ('1', ('\x01', '')),
+        ('12ab', ('\x0c', 'ab')),
+        ('xzz', ('', 'zz')),
+    ))
+    def test_dereference_charref(self, name: str, expected: tuple[str, str]) -> None:
+        """Тест числовых ссылок: windows-1252, недопустимые номера и текст после числа."""
+
+        assert dereference_charref(name) == expected
+
+    def test_unknown_extractor_rejected(self) -> None:
+        """Тест неизвестного EMAIL_HTML_EXTRACTOR: ошибка настройки, а не пустой текст."""
+
+        with pytest.raises(ValueError):
+            get_html_extractor('lxml')
@@ -0,0 +1,135 @@
+from email.parser import BytesHeaderParser
+
+import aioimaplib
+import pytest
+from infrastructure.imap_listener import IMAPClient, is_temporary_login_failure
+
+
+class FakeImapClient:
+    """IMAP клиент с заранее заданными ответами на SELECT и UID FETCH"""
+
+    def __init__(self, select_lines: list[bytes], fetch_lines: list[bytes] | None = None):
+        self.select_lines = select_lines
+        self.fetch_lines = fetch_lines or [b'FETCH completed.']
+        self.commands: list[str] = []
+
+    async def select(self, mailbox: str) -> aioimaplib.Response:
+        self.commands.append(f'SELECT {mailbox}')
+        return aioimaplib.Response('OK', self.select_lines)
+
+    async def uid(self, command: str, *args: str) -> aioimaplib.Response:
+        self.commands.append(f'UID {command} {" ".join(args)}')
+        return aioimaplib.Response('OK', self.fetch_lines)
+
+
+@pytest.fixture
+def imap_client(monkeypatch: pytest.MonkeyPatch) -> IMAPClient:
+    client = IMAPClient(host='imap.example.com', user='me@example.com', password='', telegram_id=1)
+    client.saved_states = []
+
+    async def save_uid_state() -> None:
+        client.saved_states.append((client.uid_validity, client.persistent_max_uid))
+
+    monkeypatch.setattr(client, 'save_uid_state', save_uid_state)
+    return client
+
+
+class TestSelectInbox:
+    """Класс для тестирования продолжения прослушивания и ресинхронизации UID"""
+
+    @pytest.mark.asyncio
+    async def test_resume_from_saved_uid(self, imap_client: IMAPClient) -> None:
+        """Тест совпадающего UIDVALIDITY: прослушивание продолжается с сохраненного UID."""
+
+        imap_client.set_uid_state(uid_validity=7, last_uid=120)
+        server = FakeImapClient([b'[UIDVALIDITY 7] UIDs valid', b'[UIDNEXT 131] Predicted next UID'])
+
+        await imap_client.select_inbox(server)
+
+        assert (imap_client.uid_validity, imap_client.persistent_max_uid) == (7, 120)
+        assert imap_client.saved_states == []
+
+    @pytest.mark.asyncio
+    async def test_resume_from_empty_mailbox(self, imap_client: IMAPClient) -> None:
+        """Тест last_uid = 0: ящик был пуст, письма, пришедшие после этого, не пропускаются."""
+
+        imap_client.set_uid_state(uid_validity=7, last_uid=0)
+        server = FakeImapClient([b'[UIDVALIDITY 7] UIDs valid', b'[UIDNEXT 4] Predicted next UID'])
+
+        await imap_client.select_inbox(server)
+
+        assert imap_client.persistent_max_uid == 0
+        assert imap_client.saved_states == []
+
+    @pytest.mark.asyncio
+    async def test_resync_on_uidvalidity_change(self, imap_client: IMAPClient) -> None:
+        """Тест смены UIDVALIDITY: базовым UID становится UIDNEXT - 1, состояние сохраняется."""
+
+        imap_client.set_uid_state(uid_validity=7, last_uid=120)
+        imap_client.handled_uid = 120
+        server = FakeImapClient([b'[UIDVALIDITY 9] UIDs valid', b'[UIDNEXT 15] Predicted next UID'])
+
+        await imap_client.select_inbox(server)
+
+        assert (imap_client.uid_validity, imap_client.persistent_max_uid, imap_client.handled_uid) == (9, 14, 0)
+        assert imap_client.saved_states == [(9, 14)]
+        assert server.commands == ['SELECT INBOX']
+
+    @pytest.mark.asyncio
+    async def test_resync_without_uidnext(self, imap_client: IMAPClient) -> None:
+        """Тест сервера без UIDNEXT в ответе SELECT: базовый UID берется из UID FETCH *."""
+
+        imap_client.set_uid_state(uid_validity=None, last_uid=0)
+        server = FakeImapClient([b'[UIDVALIDITY 3] UIDs valid'],
+                                [b'12 FETCH (UID 57)', b'FETCH completed.'])
+
+        await imap_client.select_inbox(server)
+
+        assert (imap_client.uid_validity, imap_client.persistent_max_uid) == (3, 57)
+        assert imap_client.saved_states == [(3, 57)]
+        assert server.commands == ['SELECT INBOX', 'UID fetch * (UID)']
+
+
+class TestFilterByHeaders:
+    """Класс для тестирования отбора писем по заголовкам"""
+
+    @pytest.mark.asyncio
+    async def test_undecodable_headers_do_not_stop_batch(self, imap_client: IMAPClient) -> None:
+        """Тест заголовков с неизвестной кодировкой и некорректными байтами: письма проверяются по фильтрам."""
+
+        checked = []
+
+        async def header_filter(from_: str, telegram_id: int, email_username: str, to: str, subject: str) -> str:
+            checked.append(subject)
+            return from_
+
+        imap_client.header_filter = header_filter
+        headers = {
+            1: b'From: a@b.com\r\nSubject: =?unknown-8bit?B?0J/RgNC40LLQtdGC?=\r\n\r\n',
+            2: b'From: a@b.com\r\nSubject: =?utf-8?B?/w==?=\r\n\r\n',
+            3: b'From: a@b.com\r\nSubject: =?utf-8?B?0J/RgNC40LLQtdGC?=\r\n\r\n',
+        }
+
+        uids = await imap_client.filter_by_headers(
+            {uid: BytesHeaderParser().parsebytes(data) for uid, data in headers.items()})
+
+        assert uids == [1, 2, 3]
+        assert checked == ['Привет', '\ufffd', 'Привет']
+
+
+class TestLoginFailure:
+    """Класс для тестирования разбора отказа в авторизации"""
+
+    @pytest.mark.parametrize('lines, temporary', (
+        ([b'[UNAVAILABLE] Temporary authentication failure'], True),
+        ([b'[LIMIT] Too many connections'], True),
+        ([b'[INUSE] Mailbox is locked'], True),
+        (['[SERVERBUG] Internal error'], True),
+        ([b'[AUTHENTICATIONFAILED] Invalid credentials'], False),
+        ([b'LOGIN failed.'], False),
+        ([b'Try later [LIMITED] account'], False),
+    ))
+    def test_temporary_response_codes(self, lines: list, temporary: bool) -> None:
+        """Тест кодов ответа RFC 5530: временный отказ не считается неверным паролем."""
+
+        assert is_temporary_login_failure(aioimaplib.Response('NO', lines)) is temporary
@@ -0,0 +1,81 @@
+from infrastructure.bodystructure import select_parts
+from infrastructure.imap_utils import iter_fetch_items, iter_fetch_messages
+
+STATUS_LINE = b'FETCH completed.'
+
+
+class TestFetchParsing:
+    """Класс для тестирования разбора ответов UID FETCH"""
+
+    def test_reordered_attributes(self) -> None:
+        """Тест ответа, в котором UID идет после литерала секции."""
+
+        lines = [b'1 FETCH (FLAGS (\\Seen $Label) BODY[HEADER.FIELDS (FROM SUBJECT)] {19}',
+                 bytearray(b'From: a@example.com'),
+                 b' UID 7)',
+                 STATUS_LINE]
+
+        messages = list(iter_fetch_messages(lines))
+
+        assert len(messages) == 1
+        assert messages[0].uid == 7
+        assert messages[0].flags == (b'\\Seen', b'$Label')
+        assert messages[0].data == b'From: a@example.com'
+
+    def test_server_push_between_responses(self) -> None:
+        """Тест уведомления EXISTS посреди ответа: оно не ломает разбор соседних писем."""
+
+        lines = [b'1 FETCH (UID 5 BODY[] {5}', bytearray(b'first'), b')',
+                 b'3 EXISTS',
+                 b'2 FETCH (UID 6 BODY[] {6}', bytearray(b'second'), b')',
+                 STATUS_LINE]
+
+        messages = {message.uid: message.data for message in iter_fetch_messages(lines)}
+
+        assert messages == {5: b'first', 6: b'second'}
+
+    def test_quoted_and_nil_bodies(self) -> None:
+        """Тест секций, переданных строкой в кавычках и NIL."""
+
+        lines = [b'1 FETCH (UID 8 BODY[1] "say \\"hi\\"")',
+                 b'2 FETCH (UID 9 BODY[1] NIL)',
+                 STATUS_LINE]
+
+        messages = {message.uid: message.data for message in iter_fetch_messages(lines)}
+
+        assert messages == {8: b'say "hi"', 9: None}
+
+    def test_partial_body_section(self) -> None:
+        """Тест частичной загрузки секции: ключ атрибута содержит смещение BODY[1]<0>."""
+
+        lines = [b'4 FETCH (UID 10 BODY[1]<0> {5}', bytearray(b'hello'), b')', STATUS_LINE]
+
+        [(uid, items)] = iter_fetch_items(lines)
+
+        assert uid == 10
+        assert items[b'BODY[1]<0>'] == b'hello'
+
+    def test_bodystructure_with_literal(self) -> None:
+        """Тест BODYSTRUCTURE, в котором имя вложения со скобками передано литералом."""
+
+        lines = [b'5 FETCH (UID 11 BODYSTRUCTURE (("text" "html" ("charset" "windows-1251") NIL NIL '
+                 b'"quoted-printable" 120 4 NIL NIL NIL NIL)("application" "pdf" ("name" {9}',
+                 bytearray(b'a (1).pdf'),
+                 b') NIL NIL "base64" 4000 NIL ("attachment" NIL) NIL NIL) "mixed" '
+                 b'("boundary" "b1") NIL NIL NIL))',
+                 STATUS_LINE]
+
+        [(uid, items)] = iter_fetch_items(lines)
+        text_part, attachments = select_parts(items[b'BODYSTRUCTURE'])
+
+        assert uid == 11
+        assert text_part.section == '1'
+        assert text_part.charset == 'windows-1251'
+        assert text_part.encoding == 'quoted-printable'
+        assert [(part.section, part.filename) for part in attachments] == [('2', 'a (1).pdf')]
+
+    def test_status_line_is_skipped(self) -> None:
+        """Тест ответа без писем: текст тегированного статуса не считается письмом."""
+
+        assert list(iter_fetch_items([b'1 FETCH (UID 3)'])) == []
+        assert [uid for uid, _ in iter_fetch_items([b'1 FETCH (UID 3)', STATUS_LINE])] == [3]
@@ -2,6 +2,7 @@ import json
 from functools import wraps
 
 from django.core.cache import cache
+from django_redis import get_redis_connection
 
 CACHE_PREFIX = 'decorator_cache:'
 
@@ -19,11 +20,21 @@ class RedisTools:
         """Установка значения по ключу"""
         cache.set(key, value, expire_time)
 
+    @staticmethod
+    def set_many(data: dict[str, str], expire_time: int | None = None) -> None:
+        """Установка нескольких значений одним запросом (pipeline)"""
+        cache.set_many(data, expire_time)
+
     @staticmethod
     def delete_key(key: str) -> None:
         """Удаление значения по ключу"""
         cache.delete(key)
 
+    @staticmethod
+    def publish(channel: str, message: str) -> int:
+        """Публикация сообщения в канал, возвращает число подписчиков"""
+        return get_redis_connection('default').publish(channel, message)
+
     @staticmethod
     def clear_decorator_cache() -> None:
         """Метод очищения кеша связанного с декоратором"""